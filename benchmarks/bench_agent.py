@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Agent-loop benchmark against the local Responses API stand-in.
+
+Serves the real FastAPI app and the stand-in on loopback, then streams many
+openai-mode diagnoses through /api/diagnose/stream at the chosen concurrency.
+Tool calls are answered from the session's recorded tool_results after
+--tool-latency seconds, so the numbers cover the agent loop, tool dispatch and
+SSE encoding without network access or an API key.
+
+    python benchmarks/bench_agent.py --requests 200 --concurrency 50
+    python benchmarks/bench_agent.py --first-event-delay 0 --event-delay 0 --json agent.json
+
+The overhead figure is the median latency minus the time the stand-in and the
+tools spend sleeping by design.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from responses_standin import BackgroundServer, ResponsesStandIn, fill, load_session, target_placeholders
+from diagnostics import agent, main as app_main
+from diagnostics.config import settings
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def _replay_tools(session, tool_latency):
+    results = session.get("tool_results", {})
+
+    def execute_tool(function_name, function_args, prefetch=None):
+        if tool_latency:
+            time.sleep(tool_latency)
+        target = function_args.get("url") or function_args.get("domain") or function_args.get("host") or "example.com"
+        return fill(results.get(function_name, {"error": f"No recorded result for {function_name}"}), target_placeholders(target))
+
+    return execute_tool
+
+async def _run_one(client, base_url, target, stats):
+    started = time.perf_counter()
+    first_byte = None
+    events = 0
+    got_result = False
+    async with client.stream("POST", f"{base_url}/api/diagnose/stream", params={"mode": "openai", "fresh": "true"},
+                             json={"target": target}) as resp:
+        async for line in resp.aiter_lines():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            if line.startswith("data: {"):
+                events += 1
+                got_result = got_result or json.loads(line[6:]).get("type") == "result"
+    stats["latency"].append(time.perf_counter() - started)
+    stats["ttfb"].append(first_byte or 0.0)
+    stats["events"] += events
+    stats["failures"] += 0 if got_result else 1
+
+async def _drive(base_url, requests, concurrency, same_target):
+    stats = {"latency": [], "ttfb": [], "events": 0, "failures": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        async def bounded(i):
+            async with semaphore:
+                target = "bench.example" if same_target else f"site{i}.example"
+                await _run_one(client, base_url, target, stats)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[bounded(i) for i in range(requests)])
+        stats["wall"] = time.perf_counter() - started
+    return stats
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark run_agent_streaming against the Responses API stand-in")
+    parser.add_argument("--session", default="expired_certificate")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--first-event-delay", type=float, default=0.2)
+    parser.add_argument("--event-delay", type=float, default=0.002)
+    parser.add_argument("--chunk-chars", type=int, default=16)
+    parser.add_argument("--tool-latency", type=float, default=0.1, help="Seconds each replayed tool call takes")
+    parser.add_argument("--same-target", action="store_true", help="Diagnose one target so concurrent requests coalesce")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    session = load_session(args.session)
+    standin = ResponsesStandIn(session, args.first_event_delay, args.event_delay, args.chunk_chars)
+
+    settings.OPENAI_API_KEY = "standin"
+    settings.AGENT_PREFETCH = False
+    settings.BROWSER_POOL_ENABLED = False
+    settings.WARMUP_ON_STARTUP = False
+    agent.execute_tool = _replay_tools(session, args.tool_latency)
+
+    print(f"🏁 Agent benchmark: {args.requests} requests, concurrency {args.concurrency}, session '{session['name']}'")
+    print("=" * 50)
+
+    with BackgroundServer(standin.app) as standin_server:
+        settings.OPENAI_BASE_URL = f"{standin_server.url}/v1"
+        with BackgroundServer(app_main.app) as app_server:
+            stats = asyncio.run(_drive(app_server.url, args.requests, args.concurrency, args.same_target))
+
+    floor = standin.scripted_seconds() + (args.tool_latency if session["turns"][0].get("function_calls") else 0)
+    latency = stats["latency"]
+    result = {
+        "session": session["name"],
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "failures": stats["failures"],
+        "throughput_rps": round(args.requests / stats["wall"], 2),
+        "latency_p50_ms": round(statistics.median(latency) * 1000, 1),
+        "latency_p95_ms": round(_percentile(latency, 95) * 1000, 1),
+        "latency_max_ms": round(max(latency) * 1000, 1),
+        "ttfb_p50_ms": round(statistics.median(stats["ttfb"]) * 1000, 1),
+        "scripted_floor_ms": round(floor * 1000, 1),
+        "overhead_p50_ms": round((statistics.median(latency) - floor) * 1000, 1),
+        "sse_events": stats["events"],
+        "standin_requests": standin.requests_served,
+    }
+
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    return 1 if stats["failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the CPU-bound pure functions that run on every diagnosis:
+the HTTP detectors, hosting provider detection (DNS records passed in) and the
+user-friendly conversion, over generated corpora (bodies from 1 KB to 10 MB,
+large DNS record sets, long issue lists).
+
+For each case it reports ops/sec (best of --repeat timed runs of at least
+--min-time seconds) and, from a separate traced call, the peak memory and the
+memory the call still holds on return (its result and any caches).
+
+    python benchmarks/bench_detectors.py --save benchmarks/baselines/detectors.json
+    python benchmarks/bench_detectors.py --compare benchmarks/baselines/detectors.json --threshold 0.2
+    python benchmarks/bench_detectors.py --quick --filter cms
+
+With --compare it exits non-zero when a case is slower than the baseline by
+more than --threshold (a fraction).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics.schemas import Issue
+from diagnostics.tools.fingerprint import fingerprint_body
+from diagnostics.tools.hosting_tools import hosting_provider_detect
+from diagnostics.tools.http_tools import (
+    detect_web_server,
+    detect_programming_language,
+    detect_domain_expired_page,
+    detect_cms_and_plugins,
+)
+from diagnostics.user_friendly import convert_to_user_friendly
+
+KB = 1024
+BODY_SIZES = [1 * KB, 10 * KB, 100 * KB, 1024 * KB, 10 * 1024 * KB]
+RECORD_COUNTS = [10, 100, 1000, 10000]
+ISSUE_COUNTS = [1, 10, 100, 1000, 10000]
+
+# ---------------------------------------------------------------------------
+# Corpora
+# ---------------------------------------------------------------------------
+
+_WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore "
+          "et dolore magna aliqua contact about services pricing blog news careers support").split()
+
+def _filler(rng: random.Random, size: int) -> str:
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 30)))
+        chunk = rng.choice((
+            f"<p>{words}</p>\n",
+            f'<div class="section-{rng.randint(1, 99)}"><span>{words}</span></div>\n',
+            f'<a href="/{rng.choice(_WORDS)}/{rng.randint(1, 9999)}">{words}</a>\n',
+            f'<script src="/static/js/chunk-{rng.randint(1, 999)}.js"></script>\n',
+        ))
+        parts.append(chunk)
+        length += len(chunk)
+    return "".join(parts)[:size]
+
+def make_body(kind: str, size: int, seed: int = 0) -> str:
+    """An HTML page of roughly `size` bytes; markers sit near the end so scans cannot stop early."""
+    rng = random.Random(f"{kind}-{size}-{seed}")
+    if kind == "wordpress":
+        head = '<html><head><meta name="generator" content="WordPress 6.4.2"><link href="/wp-content/themes/astra/style.css">'
+        tail = '<div class="woocommerce">Yoast SEO</div><script src="/wp-content/plugins/elementor/x.js"></script></body></html>'
+    elif kind == "parked":
+        head = "<html><head><title>Domain for sale</title>"
+        tail = '<script>window.onload=function(){window.location.href="/lander"}</script></body></html>'
+    else:
+        head = "<html><head><title>Acme</title>"
+        tail = "</body></html>"
+    return head + "</head><body>" + _filler(rng, max(size - len(head) - len(tail) - 13, 0)) + tail
+
+def make_headers(kind: str) -> Dict[str, str]:
+    if kind == "wordpress":
+        return {"server": "Apache/2.4.57 (Ubuntu)", "x-powered-by": "PHP/8.2.7", "content-type": "text/html; charset=UTF-8"}
+    if kind == "parked":
+        return {"server": "nginx/1.25.3", "content-type": "text/html"}
+    return {"server": "cloudflare", "cf-ray": "8a1b2c3d4e5f-SYD", "content-type": "text/html; charset=utf-8"}
+
+def make_dns_records(count: int, seed: int = 0) -> Dict[str, Any]:
+    """dns_lookup-shaped records, mostly unmatched, with a few provider hits at the end."""
+    rng = random.Random(f"dns-{count}-{seed}")
+    records: Dict[str, List[str]] = {"A": [], "AAAA": [], "CNAME": [], "MX": [], "NS": [], "TXT": []}
+    types = list(records)
+    for i in range(count):
+        rtype = rng.choice(types)
+        if rtype == "A":
+            value = f"198.51.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        elif rtype == "AAAA":
+            value = f"2001:db8::{rng.randint(1, 0xffff):x}"
+        elif rtype == "TXT":
+            value = "v=spf1 " + " ".join(f"include:_spf{rng.randint(1, 99)}.mail{i}.example" for _ in range(rng.randint(1, 6))) + " ~all"
+        else:
+            value = f"host{i}.{rng.choice(_WORDS)}-{rng.randint(1, 999)}.example."
+        records[rtype].append(value)
+    records["NS"].append("ns-123.awsdns-45.com.")
+    records["CNAME"].append("example.herokudns.com.")
+    return {"domain": "example.com", "records": records}
+
+def make_issues(count: int, seed: int = 0) -> List[Issue]:
+    rng = random.Random(f"issues-{count}-{seed}")
+    templates = [
+        ("DNS", "dns lookup error", "NXDOMAIN for example.com"),
+        ("DNS", "dns-a-missing", "Domain not resolving to any A record"),
+        ("HTTP", "http server error", "HTTP 503 from origin"),
+        ("HTTP", "http-unreachable", "Host not reachable: connection refused"),
+        ("TLS", "tls expiring", "Certificate expires in 3 days"),
+        ("TLS", "tls-invalid", "certificate verify failed: self signed certificate"),
+        ("Network", "net-latency", "High latency to origin"),
+        ("Content", "content-blank", "Page appears blank"),
+    ]
+    issues = []
+    for i in range(count):
+        category, issue_id, evidence = rng.choice(templates)
+        issues.append(Issue(id=f"{issue_id}-{i}", category=category, severity=rng.choice(["info", "low", "medium", "high"]),
+                            evidence=evidence, recommended_fix="Check the configuration"))
+    return issues
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+Case = Tuple[str, Callable[[], Any]]
+
+def build_cases(quick: bool) -> List[Case]:
+    cases: List[Case] = []
+    sizes = [s for s in BODY_SIZES if not quick or s <= 1024 * KB]
+    for kind in ("plain", "wordpress", "parked"):
+        headers = make_headers(kind)
+        cases.append((f"detect_web_server[{kind}]", lambda h=headers: detect_web_server(h)))
+        for size in sizes:
+            body = make_body(kind, size)
+            label = f"{kind},{size // KB}KB"
+            url = "https://example.com/"
+            cases.append((f"detect_programming_language[{label}]", lambda h=headers, b=body: detect_programming_language(h, b)))
+            cases.append((f"detect_domain_expired_page[{label}]", lambda b=body, u=url: detect_domain_expired_page(b, u)))
+            cases.append((f"detect_cms_and_plugins[{label}]", lambda b=body: detect_cms_and_plugins(b)))
+
+            def combined(h=headers, b=body, u=url):
+                # What _analyze_response does: one fingerprint shared by every detector
+                fp = fingerprint_body(b)
+                detect_web_server(h)
+                detect_programming_language(h, b, fp)
+                detect_cms_and_plugins(b, fp)
+                detect_domain_expired_page(b, u, fp)
+            cases.append((f"http_detectors_combined[{label}]", combined))
+
+    for count in [c for c in RECORD_COUNTS if not quick or c <= 1000]:
+        records = make_dns_records(count)
+        tls_info = {"issuer": {"organizationName": "Amazon"}, "subject": {"commonName": "example.com"}}
+        cases.append((f"hosting_provider_detect[{count} records]",
+                      lambda r=records, t=tls_info: hosting_provider_detect("example.com", dns_records=r, tls_info=t)))
+
+    for count in [c for c in ISSUE_COUNTS if not quick or c <= 1000]:
+        issues = make_issues(count)
+        cases.append((f"convert_to_user_friendly[{count} issues]", lambda i=issues: convert_to_user_friendly(i)))
+    return cases
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def measure_speed(fn: Callable[[], Any], min_time: float, repeat: int) -> float:
+    """Best ops/sec over `repeat` runs, each long enough to last min_time."""
+    fn()  # warm caches and lazy imports
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        iterations = max(iterations * 2, int(iterations * min_time / max(elapsed, 1e-9)))
+    best = iterations / elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = max(best, iterations / (time.perf_counter() - started))
+    return best
+
+def measure_allocations(fn: Callable[[], Any]) -> Dict[str, int]:
+    """Peak memory allocated during one call, and how much of it is still held afterwards."""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"peak_bytes": max(peak - baseline, 0), "retained_bytes": max(current - baseline, 0)}
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    base_cases = baseline.get("cases", {})
+    print(f"\n📊 Compared with baseline from {baseline.get('created', 'unknown')} ({baseline.get('python', '?')})")
+    for name, result in results.items():
+        base = base_cases.get(name)
+        if not base:
+            continue
+        ratio = result["ops_per_sec"] / base["ops_per_sec"]
+        marker = "✅"
+        if ratio < 1 - threshold:
+            marker = "❌"
+            regressions.append(name)
+        print(f"{marker} {name}: {ratio:.2f}x baseline speed, peak {result['peak_bytes'] / KB:.0f} KB (was {base['peak_bytes'] / KB:.0f} KB)")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the detector and conversion functions")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="Skip the 10 MB bodies and the largest record/issue sets")
+    parser.add_argument("--filter", default=None, help="Only run cases whose name contains this")
+    parser.add_argument("--save", default=None, help="Write results as a baseline JSON file")
+    parser.add_argument("--compare", default=None, help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown fraction before a case counts as a regression")
+    args = parser.parse_args()
+
+    print("🔬 Detector microbenchmarks")
+    print("=" * 50)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, fn in build_cases(args.quick):
+        if args.filter and args.filter not in name:
+            continue
+        ops = measure_speed(fn, args.min_time, args.repeat)
+        allocations = measure_allocations(fn)
+        results[name] = {"ops_per_sec": round(ops, 2), **allocations}
+        print(f"{name:<60} {ops:>12,.1f} ops/s  peak {allocations['peak_bytes'] / KB:>9,.1f} KB  retained {allocations['retained_bytes'] / KB:>7,.1f} KB")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cases": results,
+            }, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
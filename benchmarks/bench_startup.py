@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark: how long `import diagnostics.main` takes in a fresh
+interpreter, and which heavy dependencies it drags in.
+
+Each run is a separate subprocess so nothing is cached between samples.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --budget-ms 600 --json startup.json
+
+Exits non-zero if the median import time exceeds --budget-ms or if any of the
+deferred dependencies is imported eagerly, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Dependencies that must only be imported when a diagnosis first needs them
+DEFERRED = ["openai", "playwright", "cryptography", "httpx", "dns"]
+
+_PROBE = """
+import json, sys, time
+# Site hooks may import some packages at interpreter start; only count new ones
+preloaded = set(sys.modules)
+started = time.perf_counter()
+import diagnostics.main
+import_ms = (time.perf_counter() - started) * 1000
+from diagnostics.warmup import warm_up
+eager = [m for m in {deferred!r} if m in sys.modules and m not in preloaded]
+warmup_ms = warm_up() * 1000 if {warmup!r} else None
+print(json.dumps({{"import_ms": import_ms, "eager": eager, "warmup_ms": warmup_ms}}))
+"""
+
+def _sample(warmup: bool) -> dict:
+    env = dict(os.environ, PYTHONPATH=SRC, LOG_LEVEL="ERROR")
+    code = _PROBE.format(deferred=DEFERRED, warmup=warmup)
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the median import time exceeds this")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    args = parser.parse_args()
+
+    print("⏱️  Startup benchmark: import diagnostics.main")
+    print("=" * 50)
+
+    samples = [_sample(warmup=(i == 0)) for i in range(args.runs)]
+    import_ms = [s["import_ms"] for s in samples]
+    eager = sorted({m for s in samples for m in s["eager"]})
+    result = {
+        "runs": args.runs,
+        "import_ms_min": round(min(import_ms), 1),
+        "import_ms_median": round(statistics.median(import_ms), 1),
+        "import_ms_max": round(max(import_ms), 1),
+        "warmup_ms": round(samples[0]["warmup_ms"], 1),
+        "eager_deferred_modules": eager,
+    }
+
+    print(f"import (min/median/max): {result['import_ms_min']} / {result['import_ms_median']} / {result['import_ms_max']} ms")
+    print(f"warm-up of deferred modules: {result['warmup_ms']} ms")
+
+    failed = False
+    if eager:
+        print(f"❌ Deferred dependencies imported eagerly: {', '.join(eager)}")
+        failed = True
+    else:
+        print("✅ No deferred dependency is imported with the app")
+    if args.budget_ms is not None:
+        if result["import_ms_median"] > args.budget_ms:
+            print(f"❌ Median import time exceeds the {args.budget_ms} ms budget")
+            failed = True
+        else:
+            print(f"✅ Median import time within the {args.budget_ms} ms budget")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
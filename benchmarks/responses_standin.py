@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI Responses API streaming endpoint.
+
+Replays a recorded session (benchmarks/sessions/*.json) as the same SSE event
+sequence the real API produces: response.created, output_item.added,
+function_call_arguments.delta/done, output_text.delta/done, output_item.done
+and response.completed. The first request of a conversation gets the first
+turn (usually tool calls); a request that carries function_call_output items
+gets the next one. "{domain}" and "{url}" in the session are filled in from
+the target named in the agent's prompt.
+
+    python benchmarks/responses_standin.py --port 8001 --first-event-delay 0.8
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=standin ./run.sh
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+SESSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
+
+_TARGET_RE = re.compile(r"diagnose the website at (\S+?)\.?\s")
+
+def load_session(name_or_path: str) -> Dict[str, Any]:
+    path = name_or_path if os.path.exists(name_or_path) else os.path.join(SESSIONS_DIR, f"{name_or_path}.json")
+    with open(path) as f:
+        return json.load(f)
+
+def target_placeholders(target: str) -> Dict[str, str]:
+    is_url = target.startswith("http://") or target.startswith("https://")
+    domain = target.split("://", 1)[1].split("/")[0] if is_url else target
+    return {"{domain}": domain, "{url}": target if is_url else f"https://{domain}"}
+
+def fill(value: Any, placeholders: Dict[str, str]) -> Any:
+    """Substitute placeholders in every string inside value."""
+    if isinstance(value, str):
+        for key, replacement in placeholders.items():
+            value = value.replace(key, replacement)
+        return value
+    if isinstance(value, list):
+        return [fill(v, placeholders) for v in value]
+    if isinstance(value, dict):
+        return {k: fill(v, placeholders) for k, v in value.items()}
+    return value
+
+def _chunks(text: str, size: int) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+class ResponsesStandIn:
+    """
+    Serves POST /v1/responses by replaying one session.
+    first_event_delay models time to first token, event_delay the gap between
+    streamed events, and chunk_chars how much text or JSON each delta carries.
+    """
+
+    def __init__(self, session: Dict[str, Any], first_event_delay: float = 0.5, event_delay: float = 0.005, chunk_chars: int = 16):
+        self.session = session
+        self.first_event_delay = first_event_delay
+        self.event_delay = event_delay
+        self.chunk_chars = max(1, chunk_chars)
+        self.requests_served = 0
+        self.app = Starlette(routes=[
+            Route("/v1/responses", self._responses, methods=["POST"]),
+            Route("/healthz", self._health, methods=["GET"]),
+        ])
+
+    async def _health(self, request: Request) -> JSONResponse:
+        return JSONResponse({"ok": True, "session": self.session.get("name"), "requests_served": self.requests_served})
+
+    async def _responses(self, request: Request):
+        body = await request.json()
+        items = body.get("input") or []
+        if isinstance(items, str):
+            items = [{"role": "user", "content": items}]
+        prompt = " ".join(i.get("content", "") for i in items if isinstance(i, dict) and isinstance(i.get("content"), str))
+        match = _TARGET_RE.search(prompt + " ")
+        placeholders = target_placeholders(match.group(1) if match else "example.com")
+        answered = any(isinstance(i, dict) and i.get("type") == "function_call_output" for i in items)
+        turns = self.session["turns"]
+        turn = fill(turns[min(1 if answered else 0, len(turns) - 1)], placeholders)
+        self.requests_served += 1
+        if not body.get("stream"):
+            return JSONResponse({"error": {"message": "The stand-in only supports stream=true"}}, status_code=400)
+        return StreamingResponse(self._events(turn, body.get("model", "standin")), media_type="text/event-stream")
+
+    async def _events(self, turn: Dict[str, Any], model: str) -> AsyncIterator[str]:
+        sequence = itertools.count()
+        response_id = f"resp_{uuid.uuid4().hex[:24]}"
+        created_at = int(time.time())
+        output: List[Dict[str, Any]] = []
+
+        def event(payload: Dict[str, Any]) -> str:
+            payload["sequence_number"] = next(sequence)
+            return f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+
+        def response(status: str) -> Dict[str, Any]:
+            return {"id": response_id, "object": "response", "created_at": created_at, "model": model,
+                    "status": status, "output": list(output), "parallel_tool_calls": True,
+                    "tool_choice": "auto", "tools": []}
+
+        async def pause() -> None:
+            if self.event_delay:
+                await asyncio.sleep(self.event_delay)
+
+        await asyncio.sleep(self.first_event_delay)
+        yield event({"type": "response.created", "response": response("in_progress")})
+
+        for call in turn.get("function_calls", []):
+            index = len(output)
+            item_id = f"fc_{uuid.uuid4().hex[:24]}"
+            arguments = json.dumps(call.get("arguments", {}))
+            item = {"type": "function_call", "id": item_id, "call_id": f"call_{uuid.uuid4().hex[:24]}",
+                    "name": call["name"], "arguments": "", "status": "in_progress"}
+            yield event({"type": "response.output_item.added", "output_index": index, "item": dict(item)})
+            for delta in _chunks(arguments, self.chunk_chars):
+                await pause()
+                yield event({"type": "response.function_call_arguments.delta", "item_id": item_id,
+                             "output_index": index, "delta": delta})
+            yield event({"type": "response.function_call_arguments.done", "item_id": item_id,
+                         "output_index": index, "arguments": arguments})
+            item.update(arguments=arguments, status="completed")
+            output.append(item)
+            yield event({"type": "response.output_item.done", "output_index": index, "item": item})
+
+        if turn.get("text") is not None:
+            index = len(output)
+            item_id = f"msg_{uuid.uuid4().hex[:24]}"
+            text = turn["text"]
+            item = {"type": "message", "id": item_id, "role": "assistant", "status": "in_progress", "content": []}
+            yield event({"type": "response.output_item.added", "output_index": index, "item": dict(item)})
+            part = {"type": "output_text", "text": "", "annotations": []}
+            yield event({"type": "response.content_part.added", "item_id": item_id, "output_index": index,
+                         "content_index": 0, "part": part})
+            for delta in _chunks(text, self.chunk_chars):
+                await pause()
+                yield event({"type": "response.output_text.delta", "item_id": item_id, "output_index": index,
+                             "content_index": 0, "delta": delta, "logprobs": []})
+            yield event({"type": "response.output_text.done", "item_id": item_id, "output_index": index,
+                         "content_index": 0, "text": text, "logprobs": []})
+            part = {"type": "output_text", "text": text, "annotations": []}
+            yield event({"type": "response.content_part.done", "item_id": item_id, "output_index": index,
+                         "content_index": 0, "part": part})
+            item.update(status="completed", content=[part])
+            output.append(item)
+            yield event({"type": "response.output_item.done", "output_index": index, "item": item})
+
+        yield event({"type": "response.completed", "response": response("completed")})
+
+    def scripted_seconds(self) -> float:
+        """Time the stand-in itself spends sleeping over one full conversation."""
+        total = 0.0
+        for turn in self.session["turns"]:
+            total += self.first_event_delay
+            deltas = sum(len(_chunks(json.dumps(c.get("arguments", {})), self.chunk_chars)) for c in turn.get("function_calls", []))
+            if turn.get("text") is not None:
+                deltas += len(_chunks(turn["text"], self.chunk_chars))
+            total += deltas * self.event_delay
+        return total
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class BackgroundServer:
+    """Runs an ASGI app under uvicorn on a daemon thread (for benchmarks)."""
+
+    def __init__(self, app, port: Optional[int] = None):
+        self.port = port or free_port()
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on", access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "BackgroundServer":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded Responses API session over SSE")
+    parser.add_argument("--session", default="expired_certificate", help="Session name in benchmarks/sessions or a path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-event-delay", type=float, default=0.5, help="Seconds before the first event of each response")
+    parser.add_argument("--event-delay", type=float, default=0.005, help="Seconds between streamed deltas")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="Characters per delta")
+    args = parser.parse_args()
+
+    standin = ResponsesStandIn(load_session(args.session), args.first_event_delay, args.event_delay, args.chunk_chars)
+    print(f"🎭 Replaying '{standin.session['name']}' on http://{args.host}:{args.port}/v1/responses")
+    uvicorn.run(standin.app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
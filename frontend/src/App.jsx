@@ -77,6 +77,11 @@ function App() {
       body: JSON.stringify({ target: normalizedUrl }),
     })
 
+    if (response.status === 429) {
+      const retryAfter = response.headers.get('Retry-After') || 'a few'
+      throw new Error(`The server is busy right now, please try again in ${retryAfter} seconds`)
+    }
+
     if (!response.ok) {
       const errorText = await response.text()
       console.error(`Streaming API error response: ${errorText}`)
@@ -160,6 +165,13 @@ function App() {
             <span>{update.message}</span>
           </div>
         )
+      case 'queued':
+        return (
+          <div key={`queued-${update.resource}-${update.position}`} className="streaming-update status">
+            <Clock size={16} />
+            <span>{update.message}</span>
+          </div>
+        )
       case 'tool_call':
         return (
           <div key={`${update.tool}-${update.message}`} className="streaming-update tool-call">
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator
+from .config import settings
+from .metrics import ADMISSION_REJECTED
+
+# How often a waiter re-checks its queue position when nothing else wakes it
+_POSITION_POLL_SEC = 1.0
+
+class AdmissionRejected(Exception):
+    """The gate's wait queue is full, or a waiter gave up after the queue timeout."""
+
+    def __init__(self, gate: "Gate", reason: str):
+        super().__init__(f"{gate.name} capacity exhausted: {reason}")
+        self.gate = gate
+        self.retry_after = gate.retry_after
+
+class Waiter:
+    """A place in a gate: either holding a slot (granted) or queued for one."""
+
+    def __init__(self):
+        self.granted = threading.Event()
+        self.released = False
+        self._wakeups: list = []
+
+    def _wake(self) -> None:
+        for wake in self._wakeups:
+            wake()
+
+class Gate:
+    """
+    Concurrency limit for one resource (browser pages, outbound probes, LLM
+    calls) with a bounded FIFO wait queue. Slots are handed directly from the
+    releasing holder to the oldest waiter, so a busy gate stays fair. Usable
+    from threads and from the event loop.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._queue: Deque[Waiter] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def saturated(self) -> bool:
+        """True when a new bounded request would be rejected right away."""
+        return self.active >= self.limit and len(self._queue) >= self.max_queue
+
+    def check(self) -> None:
+        """Raise AdmissionRejected if a new bounded request would be turned away."""
+        if self.saturated():
+            ADMISSION_REJECTED.labels(self.name).inc()
+            raise AdmissionRejected(self, f"{len(self._queue)} requests already waiting")
+
+    def enter(self, bounded: bool = True) -> Waiter:
+        """
+        Take a slot or a place in the queue. Bounded requests (client-facing)
+        are rejected when the queue is full; internal callers whose numbers
+        are already capped elsewhere pass bounded=False and always queue.
+        """
+        waiter = Waiter()
+        with self._lock:
+            if self.active < self.limit and not self._queue:
+                self.active += 1
+                waiter.granted.set()
+                return waiter
+            if bounded and len(self._queue) >= self.max_queue:
+                ADMISSION_REJECTED.labels(self.name).inc()
+                raise AdmissionRejected(self, f"{len(self._queue)} requests already waiting")
+            self._queue.append(waiter)
+        return waiter
+
+    def enter_now(self) -> Waiter:
+        """
+        Take a free slot without queueing, or raise AdmissionRejected. For
+        optional work that should only use capacity nobody is waiting for.
+        """
+        with self._lock:
+            if self.active < self.limit and not self._queue:
+                self.active += 1
+                waiter = Waiter()
+                waiter.granted.set()
+                return waiter
+        raise AdmissionRejected(self, "no free slot")
+
+    def position(self, waiter: Waiter) -> int:
+        """1-based place in the queue, or 0 once the waiter holds a slot."""
+        with self._lock:
+            try:
+                return self._queue.index(waiter) + 1
+            except ValueError:
+                return 0
+
+    def release(self, waiter: Waiter) -> None:
+        """Give back a slot, or leave the queue if it was never granted. Safe to call twice."""
+        with self._lock:
+            if waiter.released:
+                return
+            waiter.released = True
+            if not waiter.granted.is_set():
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                return
+            if not self._queue:
+                self.active -= 1
+                return
+            # The slot moves to the successor without active dropping; it is
+            # granted under the lock so a successor timing out now sees it as held
+            successor = self._queue.popleft()
+            successor.granted.set()
+        successor._wake()
+
+    def _timed_out(self, waiter: Waiter) -> AdmissionRejected:
+        self.release(waiter)
+        if waiter.granted.is_set():
+            # Granted at the last moment; hand the slot on rather than leak it
+            return AdmissionRejected(self, "granted after the queue timeout")
+        ADMISSION_REJECTED.labels(self.name).inc()
+        return AdmissionRejected(self, f"no slot within {self.queue_timeout}s")
+
+    def wait(self, waiter: Waiter) -> Iterator[int]:
+        """Block until the waiter holds a slot, yielding its queue position whenever it changes."""
+        deadline = time.monotonic() + self.queue_timeout
+        last = None
+        while not waiter.granted.is_set():
+            position = self.position(waiter)
+            if position and position != last:
+                last = position
+                yield position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._timed_out(waiter)
+            waiter.granted.wait(min(_POSITION_POLL_SEC, remaining))
+
+    async def wait_async(self, waiter: Waiter) -> AsyncIterator[int]:
+        """Async variant of wait() for use on the event loop."""
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        waiter._wakeups.append(lambda: loop.call_soon_threadsafe(woken.set))
+        deadline = time.monotonic() + self.queue_timeout
+        last = None
+        while not waiter.granted.is_set():
+            position = self.position(waiter)
+            if position and position != last:
+                last = position
+                yield position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._timed_out(waiter)
+            try:
+                await asyncio.wait_for(woken.wait(), min(_POSITION_POLL_SEC, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    @contextmanager
+    def slot(self, bounded: bool = True) -> Iterator[None]:
+        """Hold a slot for the duration of the block (blocking wait, positions not reported)."""
+        waiter = self.enter(bounded)
+        try:
+            for _ in self.wait(waiter):
+                pass
+            yield
+        finally:
+            self.release(waiter)
+
+    @asynccontextmanager
+    async def slot_async(self, bounded: bool = True) -> AsyncIterator[None]:
+        waiter = self.enter(bounded)
+        try:
+            async for _ in self.wait_async(waiter):
+                pass
+            yield
+        finally:
+            self.release(waiter)
+
+    def stats(self) -> Dict[str, int]:
+        return {"limit": self.limit, "active": self.active, "queued": len(self._queue)}
+
+def queued_event(gate: Gate, position: int) -> Dict[str, object]:
+    """SSE update for a client waiting on gate."""
+    return {
+        "type": "queued",
+        "resource": gate.name,
+        "position": position,
+        "message": f"Server busy, waiting for a free slot (position {position} in queue)",
+    }
+
+def busy_event(error: AdmissionRejected) -> Dict[str, object]:
+    """SSE error update for a run that could not get a slot."""
+    return {
+        "type": "error",
+        "message": f"The server is busy right now, please try again in {error.retry_after} seconds",
+        "retry_after": error.retry_after,
+    }
+
+def _gate(name: str, limit: int) -> Gate:
+    return Gate(name, limit, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_QUEUE_TIMEOUT, settings.ADMISSION_RETRY_AFTER)
+
+browser_gate = _gate("browser", settings.BROWSER_CONCURRENCY)
+probe_gate = _gate("probes", settings.PROBE_CONCURRENCY)
+llm_gate = _gate("llm", settings.LLM_CONCURRENCY)
+gates = {g.name: g for g in (browser_gate, probe_gate, llm_gate)}
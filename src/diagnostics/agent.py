@@ -1,21 +1,273 @@
 import json
 import logging
-from typing import Dict, Any, List, Generator
-from openai import OpenAI
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Generator, Optional
 from .config import settings
-
-from .tools import dns_lookup, tls_probe, http_check, hosting_provider_detect, take_screenshot_sync
+from . import tools, timing
+from .metrics import PREFETCH_CLAIMS, OPENAI_TOKENS, OPENAI_FIRST_EVENT_SECONDS
+from .offline import parse_target
+from .prefetch import ProbePrefetch
+from .compaction import compact_tool_outputs, compaction_stats
+from .admission import AdmissionRejected, Waiter, Gate, busy_event, queued_event, browser_gate, llm_gate, probe_gate
 
 logger = logging.getLogger(__name__)
 
-def run_agent_streaming(target: str) -> Generator[Dict[str, Any], None, None]:
+# Tool schemas offered to the model (Responses API function tools)
+TOOL_DEFINITIONS: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "name": "dns_lookup",
+        "description": "Lookup DNS records for a domain to check if it resolves",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "domain": {"type": "string"},
+                "record_types": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ["A","AAAA","CNAME","MX","NS","TXT"]},
+                    "default": ["A","AAAA","CNAME","MX","NS","TXT"]
+                }
+            },
+            "required": ["domain"]
+        }
+    },
+    {
+        "type": "function",
+        "name": "http_check",
+        "description": "Fetch a URL and return status, final URL, headers, and sample of body to check if the site is accessible",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "url": {"type": "string"},
+                "method": {"type": "string", "enum": ["GET","HEAD","POST"], "default": "GET"},
+                "follow_redirects": {"type": "boolean", "default": True},
+                "timeout_sec": {"type": "integer", "default": 10}
+            },
+            "required": ["url"]
+        }
+    },
+    {
+        "type": "function",
+        "name": "tls_probe",
+        "description": "Probe a TLS endpoint to get cert details and expiry to check if HTTPS is working",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "host": {"type": "string"},
+                "port": {"type": "integer", "default": 443},
+                "sni": {"type": "boolean", "default": True}
+            },
+            "required": ["host"]
+        }
+    },
+    {
+        "type": "function",
+        "name": "take_screenshot_sync",
+        "description": "Analyze a website for visual issues, rendering problems, JavaScript errors, or broken content using browser automation.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "url": {"type": "string", "description": "The URL to analyze"},
+                "width": {"type": "integer", "default": 1280, "description": "Viewport width"},
+                "height": {"type": "integer", "default": 720, "description": "Viewport height"},
+                "timeout": {"type": "integer", "default": 30000, "description": "Timeout in milliseconds"}
+            },
+            "required": ["url"]
+        }
+    },
+    {
+        "type": "function",
+        "name": "hosting_provider_detect",
+        "description": "Detect hosting provider based on DNS records and TLS certificate information, providing specific instructions and dashboard links",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "domain": {"type": "string"},
+                "dns_records": {
+                    "type": "object",
+                    "description": "DNS records from dns_lookup function (optional)"
+                },
+                "tls_info": {
+                    "type": "object",
+                    "description": "TLS certificate information from tls_probe function (optional)"
+                }
+            },
+            "required": ["domain"]
+        }
+    }
+]
+
+DEFAULT_RECORD_TYPES = ["A", "AAAA", "CNAME", "MX", "NS", "TXT"]
+
+# Map tool names to friendly descriptions
+_FRIENDLY_NAMES = {
+    "dns_lookup": "Checking your site's DNS settings",
+    "http_check": "Checking screenshot of your website",
+    "tls_probe": "Checking SSL certificate status",
+    "take_screenshot_sync": "Analyzing website appearance",
+    "hosting_provider_detect": "Identifying your hosting provider"
+}
+
+# Map tool names to friendly completion messages
+_COMPLETION_MESSAGES = {
+    "dns_lookup": "DNS check completed",
+    "http_check": "Website screenshot analysis completed",
+    "tls_probe": "SSL certificate check completed",
+    "take_screenshot_sync": "Website appearance analysis completed",
+    "hosting_provider_detect": "Hosting provider identification completed"
+}
+
+# Shared by all agent runs; tools are blocking calls (the sync tool wrappers)
+_tool_executor = ThreadPoolExecutor(max_workers=settings.AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+# Separate pool so tool calls waiting on a prefetched probe can never starve it
+_prefetch_executor = ThreadPoolExecutor(max_workers=settings.AGENT_TOOL_WORKERS, thread_name_prefix="agent-prefetch")
+
+def _speculative(probe: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+    # Prefetched probes count against the probe limit but never queue for it:
+    # with no free slot the probe is skipped and the tool call runs it itself
+    def run(**kwargs: Any) -> Dict[str, Any]:
+        slot = probe_gate.enter_now()
+        try:
+            return probe(**kwargs)
+        finally:
+            probe_gate.release(slot)
+    return run
+
+def start_prefetch(target: str) -> ProbePrefetch:
+    """Start the DNS/HTTP/TLS probes the model nearly always asks for."""
+    domain, url = parse_target(target)
+    prefetch = ProbePrefetch(
+        _prefetch_executor,
+        _speculative(tools.dns_lookup),
+        _speculative(tools.http_check),
+        _speculative(tools.tls_probe),
+        DEFAULT_RECORD_TYPES,
+    )
+    prefetch.start(domain, url)
+    return prefetch
+
+def execute_tool(function_name: str, function_args: Dict[str, Any], prefetch: Optional[ProbePrefetch] = None) -> Dict[str, Any]:
+    """Run one tool call from the model and return its JSON-serializable result."""
+    logger.info(f"Handling function call: {function_name} with args: {function_args}")
+    if prefetch is not None:
+        result = prefetch.claim(function_name, function_args)
+        PREFETCH_CLAIMS.labels("miss" if result is None else "hit").inc()
+        if result is not None:
+            timing.annotate(prefetched=True)
+            return result
+    
+    if function_name == "dns_lookup":
+        if "record_types" not in function_args:
+            function_args["record_types"] = DEFAULT_RECORD_TYPES
+        return tools.dns_lookup(**function_args)
+    elif function_name == "hosting_provider_detect":
+        # Automatically get DNS records if not provided
+        if "dns_records" not in function_args:
+            dns_args = {"domain": function_args.get("domain"), "record_types": DEFAULT_RECORD_TYPES}
+            with timing.stage("dns_lookup"):
+                function_args["dns_records"] = execute_tool("dns_lookup", dns_args, prefetch)
+        
+        # Automatically get TLS info if not provided
+        if "tls_info" not in function_args:
+            with timing.stage("tls_probe"):
+                function_args["tls_info"] = execute_tool("tls_probe", {"host": function_args.get("domain")}, prefetch)
+        
+        return tools.hosting_provider_detect(**function_args)
+    elif function_name == "http_check":
+        return tools.http_check(**function_args)
+    elif function_name == "tls_probe":
+        return tools.tls_probe(**function_args)
+    elif function_name == "take_screenshot_sync":
+        return tools.take_screenshot_sync(**function_args)
+    return {"error": f"Unknown tool: {function_name}"}
+
+def _run_tool(waterfall: timing.Waterfall, function_name: str, function_args: Dict[str, Any], prefetch: Optional[ProbePrefetch]) -> Dict[str, Any]:
+    """Worker-thread entry point: execute_tool timed as a stage, with the waterfall active for probe sub-stages."""
+    # Tool names come from the model; keep unknown ones out of the metric labels
+    stage = function_name if function_name in _FRIENDLY_NAMES else "unknown_tool"
+    gate = browser_gate if function_name == "take_screenshot_sync" else probe_gate
+    # The run was already admitted, so its tool calls queue instead of being rejected
+    with gate.slot(bounded=False), timing.activate(waterfall), timing.stage(stage):
+        return execute_tool(function_name, function_args, prefetch)
+
+def _queued_events(gate: Gate, waiter: Waiter) -> Generator[Dict[str, Any], None, None]:
+    """Block until waiter holds a slot on gate, with a queued update per position change."""
+    for position in gate.wait(waiter):
+        yield queued_event(gate, position)
+
+def _finish_model_call(waterfall: timing.Waterfall, span: Dict[str, Any], completed_event: Any) -> None:
+    """Close a model-call stage, recording token usage and time to first event."""
+    call = span["stage"].split(".", 1)[1]
+    usage = getattr(getattr(completed_event, "response", None), "usage", None)
+    for kind in ("input", "output"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(tokens, int):
+            span[f"{kind}_tokens"] = tokens
+            OPENAI_TOKENS.labels(call, kind).inc(tokens)
+    if "first_event_ms" in span:
+        OPENAI_FIRST_EVENT_SECONDS.labels(call).observe((span["first_event_ms"] - span["start_ms"]) / 1000)
+    waterfall.end(span)
+
+def _timing_events(waterfall: timing.Waterfall) -> Generator[Dict[str, Any], None, None]:
+    """One timing update per stage finished since the last call."""
+    for span in waterfall.drain():
+        yield {"type": "timing", **span}
+
+def _collect_tool_result(function_call: Dict[str, Any], future: Future, tool_results: List[Dict[str, Any]]) -> Generator[Dict[str, Any], None, None]:
+    """Turn a finished tool future into a tool_result/tool_error update, storing successes for the follow-up call."""
+    function_name = function_call["name"]
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.error(f"Error executing tool {function_name}: {str(e)}")
+        yield {
+            "type": "tool_error",
+            "tool": function_name,
+            "error": str(e),
+            "message": f"Error in {function_name}: {str(e)}"
+        }
+        return
+    
+    logger.info(f"Function {function_name} executed successfully")
+    
+    # Store tool result for the next API call
+    tool_results.append({
+        "type": "tool_result",
+        "tool_call_id": function_call["call_id"],
+        "name": function_name,
+        "content": json.dumps(result),
+        "result": result,
+        "order": function_call["order"],
+    })
+    
+    yield {
+        "type": "tool_result",
+        "tool": function_name,
+        "result": result,
+        "message": _COMPLETION_MESSAGES.get(function_name, f"Completed {function_name}")
+    }
+
+def _create_client():
+    # The openai package takes a noticeable share of startup time, so it is imported on first use
+    from openai import OpenAI
+    return OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+
+def run_agent_streaming(target: str, llm_slot: Optional[Waiter] = None) -> Generator[Dict[str, Any], None, None]:
     """
     Run the AI agent with streaming updates using OpenAI Responses API.
     Yields real-time updates as the agent thinks and uses tools.
+    llm_slot is a granted llm_gate slot the caller already holds for the first
+    model call; without one the agent queues for it itself.
     """
     logger.info(f"Starting streaming agent diagnosis for target: {target}")
     
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    waterfall = timing.Waterfall()
+    
+    # Overlap the basic probes with the first model round trip; a run that
+    # still has to queue for the model starts them once it is admitted
+    prefetch = start_prefetch(target) if settings.AGENT_PREFETCH and llm_slot is not None else None
+    
+    client = _create_client()
     
     yield {
         "type": "status",
@@ -23,91 +275,6 @@ def run_agent_streaming(target: str) -> Generator[Dict[str, Any], None, None]:
         "step": "initialization"
     }
     
-    # Prepare the tools for the Responses API
-    tools = [
-        {
-            "type": "function",
-            "name": "dns_lookup",
-            "description": "Lookup DNS records for a domain to check if it resolves",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "domain": {"type": "string"},
-                    "record_types": {
-                        "type": "array",
-                        "items": {"type": "string", "enum": ["A","AAAA","CNAME","MX","NS","TXT"]},
-                        "default": ["A","AAAA","CNAME","MX","NS","TXT"]
-                    }
-                },
-                "required": ["domain"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "http_check",
-            "description": "Fetch a URL and return status, final URL, headers, and sample of body to check if the site is accessible",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "url": {"type": "string"},
-                    "method": {"type": "string", "enum": ["GET","HEAD","POST"], "default": "GET"},
-                    "follow_redirects": {"type": "boolean", "default": True},
-                    "timeout_sec": {"type": "integer", "default": 10}
-                },
-                "required": ["url"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "tls_probe",
-            "description": "Probe a TLS endpoint to get cert details and expiry to check if HTTPS is working",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "host": {"type": "string"},
-                    "port": {"type": "integer", "default": 443},
-                    "sni": {"type": "boolean", "default": True}
-                },
-                "required": ["host"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "take_screenshot_sync",
-            "description": "Analyze a website for visual issues, rendering problems, JavaScript errors, or broken content using browser automation.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "url": {"type": "string", "description": "The URL to analyze"},
-                    "width": {"type": "integer", "default": 1280, "description": "Viewport width"},
-                    "height": {"type": "integer", "default": 720, "description": "Viewport height"},
-                    "timeout": {"type": "integer", "default": 30000, "description": "Timeout in milliseconds"}
-                },
-                "required": ["url"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "hosting_provider_detect",
-            "description": "Detect hosting provider based on DNS records and TLS certificate information, providing specific instructions and dashboard links",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "domain": {"type": "string"},
-                    "dns_records": {
-                        "type": "object",
-                        "description": "DNS records from dns_lookup function (optional)"
-                    },
-                    "tls_info": {
-                        "type": "object",
-                        "description": "TLS certificate information from tls_probe function (optional)"
-                    }
-                },
-                "required": ["domain"]
-            }
-        }
-    ]
-    
     # Initial prompt
     initial_message = f"""Please diagnose the website at {target}. 
 
@@ -167,45 +334,44 @@ IMPORTANT:
     }
     
     try:
-        # Create the streaming response
+        if llm_slot is None:
+            llm_slot = llm_gate.enter()
+            yield from _queued_events(llm_gate, llm_slot)
+            prefetch = start_prefetch(target) if settings.AGENT_PREFETCH else None
+        
+        # Create the streaming response; the model stage runs until response.completed
+        model_span = waterfall.begin("openai.initial")
         stream = client.responses.create(
             model="gpt-4o-mini",
             input=[{"role": "user", "content": initial_message}],
-            tools=tools,
+            tools=TOOL_DEFINITIONS,
             stream=True,
         )
         
         # Process the streaming response
-        current_function_call = None
-        function_arguments = ""
+        # Tools run on the worker pool as soon as their arguments are complete,
+        # so the stream keeps being read while they execute
+        function_calls: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[Future, Dict[str, Any]] = {}
+        dispatched = 0
         tool_results = []
         response_output = []
         
         for event in stream:
             event_type = event.type
             logger.debug(f"Received event: {event_type}")
+            waterfall.mark(model_span, "first_event_ms")
             
             if event_type == "response.output_item.added":
                 # Add this item to our response output
                 response_output.append(event.item)
                 
                 if event.item.type == "function_call":
-                    current_function_call = {
-                        "id": event.item.id,
+                    function_calls[event.item.id] = {
                         "call_id": event.item.call_id,
                         "name": event.item.name,
-                        "arguments": ""
                     }
-                    # Map tool names to friendly descriptions
-                    friendly_names = {
-                        "dns_lookup": "Checking your site's DNS settings",
-                        "http_check": "Checking screenshot of your website",
-                        "tls_probe": "Checking SSL certificate status",
-                        "take_screenshot_sync": "Analyzing website appearance",
-                        "hosting_provider_detect": "Identifying your hosting provider"
-                    }
-                    
-                    friendly_name = friendly_names.get(event.item.name, f"Running {event.item.name}...")
+                    friendly_name = _FRIENDLY_NAMES.get(event.item.name, f"Running {event.item.name}...")
                     
                     yield {
                         "type": "tool_call",
@@ -214,95 +380,43 @@ IMPORTANT:
                         "message": friendly_name
                     }
             
-            elif event_type == "response.function_call_arguments.delta":
-                if current_function_call and event.item_id == current_function_call["id"]:
-                    function_arguments += event.delta
-            
             elif event_type == "response.function_call_arguments.done":
-                if current_function_call and event.item_id == current_function_call["id"]:
+                function_call = function_calls.pop(event.item_id, None)
+                if function_call:
                     try:
                         function_args = json.loads(event.arguments)
-                        function_name = current_function_call["name"]
-                        
-                        # Execute the tool
-                        logger.info(f"Handling function call: {function_name} with args: {function_args}")
-                        try:
-                            if function_name == "dns_lookup":
-                                if "record_types" not in function_args:
-                                    function_args["record_types"] = ["A", "AAAA", "CNAME", "MX", "NS", "TXT"]
-                                result = dns_lookup(**function_args)
-                            elif function_name == "hosting_provider_detect":
-                                # Automatically get DNS records if not provided
-                                if "dns_records" not in function_args:
-                                    dns_result = dns_lookup(domain=function_args.get("domain"), record_types=["A", "AAAA", "CNAME", "MX", "NS", "TXT"])
-                                    function_args["dns_records"] = dns_result
-                                
-                                # Automatically get TLS info if not provided
-                                if "tls_info" not in function_args:
-                                    tls_result = tls_probe(host=function_args.get("domain"))
-                                    function_args["tls_info"] = tls_result
-                                
-                                result = hosting_provider_detect(**function_args)
-                            elif function_name == "http_check":
-                                result = http_check(**function_args)
-                            elif function_name == "tls_probe":
-                                result = tls_probe(**function_args)
-                            elif function_name == "take_screenshot_sync":
-                                result = take_screenshot_sync(**function_args)
-                            else:
-                                result = {"error": f"Unknown tool: {function_name}"}
-                            
-                            logger.info(f"Function {function_name} executed successfully")
-                            
-                            # Store tool result for the next API call
-                            tool_results.append({
-                                "type": "tool_result",
-                                "tool_call_id": current_function_call["call_id"],
-                                "content": json.dumps(result)
-                            })
-                            
-                            # Map tool names to friendly completion messages
-                            completion_messages = {
-                                "dns_lookup": "DNS check completed",
-                                "http_check": "Website screenshot analysis completed",
-                                "tls_probe": "SSL certificate check completed",
-                                "take_screenshot_sync": "Website appearance analysis completed",
-                                "hosting_provider_detect": "Hosting provider identification completed"
-                            }
-                            
-                            completion_message = completion_messages.get(function_name, f"Completed {function_name}")
-                            
-                            yield {
-                                "type": "tool_result",
-                                "tool": function_name,
-                                "result": result,
-                                "message": completion_message
-                            }
-                            
-                        except Exception as e:
-                            logger.error(f"Error executing tool {function_name}: {str(e)}")
-                            yield {
-                                "type": "tool_error",
-                                "tool": function_name,
-                                "error": str(e),
-                                "message": f"Error in {function_name}: {str(e)}"
-                            }
-                        
-                        current_function_call = None
-                        function_arguments = ""
-                        
                     except json.JSONDecodeError as e:
                         logger.error(f"Error parsing function arguments: {str(e)}")
                         yield {
                             "type": "tool_error",
-                            "tool": current_function_call["name"],
+                            "tool": function_call["name"],
                             "error": f"Invalid arguments: {str(e)}",
-                            "message": f"Error parsing arguments for {current_function_call['name']}"
+                            "message": f"Error parsing arguments for {function_call['name']}"
                         }
+                    else:
+                        logger.info(f"Dispatching function call: {function_call['name']} with args: {function_args}")
+                        future = _tool_executor.submit(_run_tool, waterfall, function_call["name"], function_args, prefetch)
+                        function_call["order"] = dispatched
+                        dispatched += 1
+                        pending[future] = function_call
+            
+            if event_type == "response.completed":
+                _finish_model_call(waterfall, model_span, event)
+                llm_gate.release(llm_slot)
             
-            elif event_type == "response.completed":
-                # Tool calls are completed, now get the final response
+            # Report tools that finished while the stream was being read
+            for future in [f for f in pending if f.done()]:
+                yield from _collect_tool_result(pending.pop(future), future, tool_results)
+            yield from _timing_events(waterfall)
+            
+            if event_type == "response.completed":
+                # Wait for tools still running, reporting each as it finishes
+                for future in as_completed(list(pending)):
+                    yield from _collect_tool_result(pending.pop(future), future, tool_results)
+                    yield from _timing_events(waterfall)
                 logger.info("Tool calls completed, getting final response")
+                # Keep function_call_output items in the order the model made the calls
+                tool_results.sort(key=lambda r: r["order"])
                 
                 if tool_results:
                     # Create new input with tool results
@@ -313,12 +427,18 @@ IMPORTANT:
                     # Add the response output to our input (this includes the function calls)
                     new_input += response_output
                     
-                    # Add tool results to the conversation
-                    for tool_result in tool_results:
+                    # Add tool results to the conversation, compacted to the token budget;
+                    # the client still gets the complete results in tool_data
+                    outputs = compact_tool_outputs(
+                        [(r["name"], r["result"]) for r in tool_results],
+                        settings.TOOL_OUTPUT_TOKEN_BUDGET,
+                    )
+                    logger.info(f"Compacted tool outputs: {compaction_stats([r['content'] for r in tool_results], outputs)}")
+                    for tool_result, output in zip(tool_results, outputs):
                         new_input.append({
                             "type": "function_call_output",
                             "call_id": tool_result["tool_call_id"],
-                            "output": tool_result["content"]
+                            "output": output
                         })
                     
                     # Get the final response
@@ -328,6 +448,9 @@ IMPORTANT:
                         "step": "generating_report"
                     }
                     
+                    llm_slot = llm_gate.enter(bounded=False)
+                    yield from _queued_events(llm_gate, llm_slot)
+                    model_span = waterfall.begin("openai.final")
                     final_stream = client.responses.create(
                         model="gpt-4o-mini",
                         input=new_input,
@@ -339,6 +462,7 @@ IMPORTANT:
                     for final_event in final_stream:
                         final_event_type = final_event.type
                         logger.debug(f"Final response event: {final_event_type}")
+                        waterfall.mark(model_span, "first_event_ms")
                         
                         if final_event_type == "response.output_text.delta":
                             if final_event.delta:
@@ -352,6 +476,9 @@ IMPORTANT:
                         elif final_event_type == "response.completed":
                             # Final response is complete
                             logger.info("Final response completed")
+                            _finish_model_call(waterfall, model_span, final_event)
+                            llm_gate.release(llm_slot)
+                            yield from _timing_events(waterfall)
                             # Convert tool_results to the format expected by frontend
                             tool_data = {}
                             for i, tool_result in enumerate(tool_results):
@@ -366,7 +493,8 @@ IMPORTANT:
                                     "summary": "AI Analysis Complete",
                                     "details": final_content,
                                     "mode": "openai",
-                                    "tool_data": tool_data
+                                    "tool_data": tool_data,
+                                    "timings": waterfall.as_dict()
                                 }
                             }
                             return  # Exit the generator
@@ -386,14 +514,24 @@ IMPORTANT:
                             "summary": "AI Analysis Complete",
                             "details": "Analysis completed without tool calls",
                             "mode": "openai",
-                            "tool_data": {}  # No tool calls made
+                            "tool_data": {},  # No tool calls made
+                            "timings": waterfall.as_dict()
                         }
                     }
                     return  # Exit the generator
                 
+    except AdmissionRejected as e:
+        logger.warning(f"Agent run not admitted: {str(e)}")
+        yield busy_event(e)
     except Exception as e:
         logger.error(f"Error in streaming response: {str(e)}")
         yield {
             "type": "error",
             "message": f"Streaming error: {str(e)}"
         }
+    finally:
+        if llm_slot is not None:
+            llm_gate.release(llm_slot)
+        # Unclaimed prefetched probes are not needed any more
+        if prefetch is not None:
+            prefetch.discard()
@@ -0,0 +1,180 @@
+import asyncio
+import codecs
+import logging
+import tempfile
+import time
+from typing import IO, Any, AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Tuple, Union
+from .offline import run_offline_diagnosis_async
+from .metrics import DIAGNOSES_IN_FLIGHT, DIAGNOSIS_SECONDS
+from .admission import probe_gate
+from .history import record_report
+
+logger = logging.getLogger(__name__)
+
+# Uploads larger than this are spooled to disk instead of memory
+SPOOL_MAX_MEMORY = 1024 * 1024
+# Longest line accepted from an uploaded target list; longer lines are reported as errors
+MAX_TARGET_LENGTH = 2048
+
+Targets = Union[Iterable[str], AsyncIterable[str]]
+
+class UploadTooLarge(Exception):
+    """An uploaded target list went over the configured byte limit."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload is larger than {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+async def _aiter_targets(targets: Targets) -> AsyncIterator[str]:
+    if hasattr(targets, "__aiter__"):
+        async for target in targets:
+            yield target
+    else:
+        for target in targets:
+            yield target
+
+async def spool_upload(chunks: AsyncIterable[bytes], max_bytes: int) -> IO[bytes]:
+    """
+    Copy an upload into a temporary file (in memory up to SPOOL_MAX_MEMORY).
+    The body has to be consumed before the response starts streaming, since a
+    streaming response may read the ASGI receive channel to watch for disconnects.
+    Raises UploadTooLarge as soon as more than max_bytes have arrived.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+async def iter_file_chunks(f: IO[bytes], chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Read a spooled upload in chunks and close it when done."""
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        f.close()
+
+async def iter_target_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Split an uploaded byte stream into targets, one per line, without buffering
+    the whole upload. Blank lines and lines starting with '#' are skipped.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    skipping = False
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if skipping:
+                # Remainder of an oversized line that was already reported
+                skipping = False
+                continue
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+        if len(pending) > MAX_TARGET_LENGTH:
+            if not skipping:
+                yield pending[:MAX_TARGET_LENGTH + 1]
+            pending = ""
+            skipping = True
+    pending = (pending + decoder.decode(b"", final=True)).strip()
+    if pending and not skipping and not pending.startswith("#"):
+        yield pending
+
+async def _diagnose_one(index: int, target: str) -> Dict[str, Any]:
+    line: Dict[str, Any] = {"index": index, "target": target}
+    if len(target) > MAX_TARGET_LENGTH:
+        line["target"] = target[:64] + "..."
+        line["error"] = f"Target longer than {MAX_TARGET_LENGTH} characters"
+        return line
+    started = time.monotonic()
+    outcome = "error"
+    DIAGNOSES_IN_FLIGHT.labels("batch").inc()
+    try:
+        # Batches are capped by their own concurrency, so they queue rather than get rejected
+        async with probe_gate.slot_async(bounded=False):
+            report = await run_offline_diagnosis_async(target)
+        line["report"] = report.dict()
+        record_report("offline", target, line["report"])
+        outcome = "ok"
+    except Exception as e:
+        logger.error(f"Batch diagnosis failed for {target}: {str(e)}")
+        line["error"] = str(e)
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        DIAGNOSES_IN_FLIGHT.labels("batch").dec()
+        DIAGNOSIS_SECONDS.labels("batch", outcome).observe(time.monotonic() - started)
+    return line
+
+async def diagnose_batch(targets: Targets, concurrency: int = 8) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the offline diagnosis over targets with at most `concurrency` in flight,
+    yielding one result per target in completion order. Targets are pulled
+    lazily and at most `concurrency` finished results wait for the consumer, so
+    memory does not grow with the size of the batch. Closing the generator
+    cancels any diagnoses still running.
+    """
+    concurrency = max(1, concurrency)
+    source = _aiter_targets(targets)
+    source_lock = asyncio.Lock()
+    counter = 0
+    results: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=concurrency)
+
+    async def next_target() -> Optional[Tuple[int, str]]:
+        nonlocal counter
+        # Async generators cannot be advanced by two tasks at once
+        async with source_lock:
+            try:
+                target = await source.__anext__()
+            except StopAsyncIteration:
+                return None
+            counter += 1
+            return counter - 1, target
+
+    async def worker() -> None:
+        # None tells the consumer this worker is done. It is not sent once the
+        # worker is cancelled: the consumer has stopped reading by then, and a
+        # put on the full queue would never return.
+        try:
+            while True:
+                item = await next_target()
+                if item is None:
+                    break
+                await results.put(await _diagnose_one(*item))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await results.put(None)
+            raise
+        await results.put(None)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            line = await results.get()
+            if line is None:
+                running -= 1
+            else:
+                yield line
+        # Surface errors from the target source (e.g. a broken upload)
+        for task in workers:
+            task.result()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
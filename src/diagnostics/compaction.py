@@ -0,0 +1,102 @@
+import copy
+import json
+import math
+from typing import Any, Dict, List, Tuple
+
+# Rough size of a token for JSON/English text; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+# Response headers worth showing the model; security headers are out of scope for the report
+_RELEVANT_HEADERS = {"server", "content-type", "location", "x-powered-by"}
+
+# Successive (max string length, max list length) limits tried until a result fits
+_SHRINK_STEPS = [(512, 20), (256, 10), (128, 6), (64, 3), (32, 2)]
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _select_fields(name: str, result: Any) -> Any:
+    """Drop the parts of a tool result that do not help diagnose a broken site."""
+    if not isinstance(result, dict):
+        return result
+    result = copy.deepcopy(result)
+    if name == "http_check":
+        headers = result.get("headers")
+        if isinstance(headers, dict):
+            result["headers"] = {k: v for k, v in headers.items() if k.lower() in _RELEVANT_HEADERS}
+        result.pop("method", None)
+    elif name == "hosting_provider_detect":
+        # primary_provider already carries the instructions and links for the first match
+        providers = result.get("detected_providers")
+        if isinstance(providers, list):
+            result["detected_providers"] = [
+                {k: p.get(k) for k in ("name", "confidence", "detected_from")}
+                for p in providers if isinstance(p, dict)
+            ]
+        result.pop("total_providers", None)
+    elif name == "take_screenshot_sync":
+        result.pop("readiness", None)
+    return result
+
+def _shrink(value: Any, max_str: int, max_list: int) -> Any:
+    if isinstance(value, str):
+        if len(value) > max_str:
+            return f"{value[:max_str]}...[+{len(value) - max_str} chars]"
+        return value
+    if isinstance(value, list):
+        items = [_shrink(v, max_str, max_list) for v in value[:max_list]]
+        if len(value) > max_list:
+            items.append(f"...[+{len(value) - max_list} more]")
+        return items
+    if isinstance(value, dict):
+        return {k: _shrink(v, max_str, max_list) for k, v in value.items()}
+    return value
+
+def compact_result(name: str, result: Any, budget_tokens: int) -> str:
+    """
+    JSON for one tool result with irrelevant fields removed and long strings
+    and lists truncated (with markers) until it fits budget_tokens. If even the
+    tightest limits do not fit, the JSON text itself is cut off.
+    """
+    selected = _select_fields(name, result)
+    text = json.dumps(selected)
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    for max_str, max_list in _SHRINK_STEPS:
+        text = json.dumps(_shrink(selected, max_str, max_list))
+        if estimate_tokens(text) <= budget_tokens:
+            return text
+    marker = "...[truncated]"
+    limit = max(budget_tokens * CHARS_PER_TOKEN - len(marker), 0)
+    return f"{text[:limit]}{marker}"
+
+def compact_tool_outputs(results: List[Tuple[str, Any]], budget_tokens: int) -> List[str]:
+    """
+    Compact (tool name, result) pairs so that together they fit budget_tokens.
+    Results smaller than an equal share keep their full size and the unused
+    budget goes to the larger ones. A budget of 0 or less disables truncation
+    (field selection still applies).
+    """
+    selected = [json.dumps(_select_fields(name, result)) for name, result in results]
+    if budget_tokens <= 0:
+        return selected
+
+    outputs: List[str] = [""] * len(results)
+    remaining = budget_tokens
+    order = sorted(range(len(results)), key=lambda i: len(selected[i]))
+    for position, i in enumerate(order):
+        share = remaining // (len(order) - position)
+        size = estimate_tokens(selected[i])
+        if size <= share:
+            outputs[i] = selected[i]
+        else:
+            name, result = results[i]
+            outputs[i] = compact_result(name, result, share)
+        remaining -= min(estimate_tokens(outputs[i]), share)
+    return outputs
+
+def compaction_stats(originals: List[str], compacted: List[str]) -> Dict[str, int]:
+    return {
+        "original_tokens": sum(estimate_tokens(t) for t in originals),
+        "compacted_tokens": sum(estimate_tokens(t) for t in compacted),
+    }
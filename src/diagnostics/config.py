@@ -8,8 +8,55 @@ load_dotenv()
 class Settings(BaseModel):
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+    OPENAI_BASE_URL: Optional[str] = os.getenv("OPENAI_BASE_URL") or None
     APP_HOST: str = os.getenv("APP_HOST", "0.0.0.0")
     APP_PORT: int = int(os.getenv("APP_PORT", "8000"))
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
+    DNS_LOOKUP_DEADLINE: float = float(os.getenv("DNS_LOOKUP_DEADLINE", "5"))
+    DNS_CACHE_MAX_ENTRIES: int = int(os.getenv("DNS_CACHE_MAX_ENTRIES", "4096"))
+    DNS_NEGATIVE_TTL: float = float(os.getenv("DNS_NEGATIVE_TTL", "60"))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE: int = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_HTTP2: bool = os.getenv("HTTP_HTTP2", "false").lower() in ("1", "true", "yes")
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", "10"))
+    HTTP_MAX_BODY_BYTES: int = int(os.getenv("HTTP_MAX_BODY_BYTES", "1048576"))
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+    BROWSER_POOL_ENABLED: bool = os.getenv("BROWSER_POOL_ENABLED", "true").lower() in ("1", "true", "yes")
+    BROWSER_MAX_PAGES: int = int(os.getenv("BROWSER_MAX_PAGES", "4"))
+    BROWSER_RECYCLE_AFTER_PAGES: int = int(os.getenv("BROWSER_RECYCLE_AFTER_PAGES", "100"))
+    BROWSER_MAX_RSS_MB: float = float(os.getenv("BROWSER_MAX_RSS_MB", "1024"))
+    BROWSER_RSS_CHECK_INTERVAL: float = float(os.getenv("BROWSER_RSS_CHECK_INTERVAL", "10"))
+    PAGE_READY_QUIET_MS: int = int(os.getenv("PAGE_READY_QUIET_MS", "500"))
+    PAGE_READY_MAX_WAIT_MS: int = int(os.getenv("PAGE_READY_MAX_WAIT_MS", "10000"))
+    PAGE_READY_MAX_INFLIGHT: int = int(os.getenv("PAGE_READY_MAX_INFLIGHT", "2"))
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+    BATCH_MAX_UPLOAD_BYTES: int = int(os.getenv("BATCH_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+    AGENT_TOOL_WORKERS: int = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+    TOOL_OUTPUT_TOKEN_BUDGET: int = int(os.getenv("TOOL_OUTPUT_TOKEN_BUDGET", "6000"))
+    AGENT_PREFETCH: bool = os.getenv("AGENT_PREFETCH", "true").lower() in ("1", "true", "yes")
+    REPORT_CACHE_TTL: float = float(os.getenv("REPORT_CACHE_TTL", "300"))
+    REPORT_CACHE_MAX_BYTES: int = int(os.getenv("REPORT_CACHE_MAX_BYTES", "33554432"))
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    EVENT_LOOP_LAG_INTERVAL: float = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+    BROWSER_CONCURRENCY: int = int(os.getenv("BROWSER_CONCURRENCY", "4"))
+    PROBE_CONCURRENCY: int = int(os.getenv("PROBE_CONCURRENCY", "16"))
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", "8"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "60"))
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+    JOBS_DB_PATH: str = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_QUEUED: int = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETENTION_HOURS: float = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+    JOB_LEASE_SEC: float = float(os.getenv("JOB_LEASE_SEC", "60"))
+    HISTORY_ENABLED: bool = os.getenv("HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+    HISTORY_DB_PATH: str = os.getenv("HISTORY_DB_PATH", "history.sqlite3")
+    HISTORY_BATCH_SIZE: int = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+    HISTORY_FLUSH_INTERVAL: float = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+    HISTORY_MAX_PENDING: int = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+    HISTORY_RETENTION_DAYS: float = float(os.getenv("HISTORY_RETENTION_DAYS", "30"))
 
 settings = Settings()
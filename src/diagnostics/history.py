@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .config import settings
+from .report_cache import normalize_target
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    domain TEXT NOT NULL,
+    target TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    summary TEXT,
+    issue_count INTEGER NOT NULL,
+    total_ms REAL,
+    report TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_by_domain ON reports (domain, created_at);
+CREATE INDEX IF NOT EXISTS reports_by_time ON reports (created_at);
+CREATE TABLE IF NOT EXISTS report_issues (
+    report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    domain TEXT NOT NULL,
+    category TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    issue_id TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS issues_by_category ON report_issues (category, created_at, domain);
+CREATE INDEX IF NOT EXISTS issues_by_report ON report_issues (report_id);
+"""
+
+_SUMMARY_FIELDS = "id, domain, target, mode, created_at, summary, issue_count, total_ms"
+
+def domain_of(target: str) -> str:
+    """Host name a target is filed under (lowercase, no port)."""
+    return urlsplit(normalize_target(target)).hostname or target.strip().lower()
+
+class _Entry:
+    __slots__ = ("mode", "target", "data", "created_at")
+
+    def __init__(self, mode: str, target: str, data: Dict[str, Any], created_at: float):
+        self.mode = mode
+        self.target = target
+        self.data = data
+        self.created_at = created_at
+
+class ReportHistory:
+    """
+    Finished diagnoses (report, raw probe samples and stage timings) kept in
+    SQLite, indexed by domain and time, with the issue categories of each
+    report in a side table so "which domains had TLS issues" stays an index
+    scan.
+
+    record() only appends to an in-memory buffer; a background thread writes
+    the buffer in batches of up to batch_size rows per transaction, so
+    persistence never blocks a diagnosis. When writes fall behind by more
+    than max_pending reports the oldest unwritten ones are dropped (and
+    counted). The database is opened on first use.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0, max_pending: int = 10000, retention_days: float = 30):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self.retention_days = retention_days
+        self.written = 0
+        self.dropped = 0
+        self._pending: Deque[_Entry] = deque()
+        self._cond = threading.Condition()
+        self._writing = 0
+        self._flush_waiters = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._db_lock:
+            if self._conn is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                # WAL with NORMAL sync stays durable across application crashes and keeps batch commits cheap
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA foreign_keys=ON")
+                conn.executescript(_SCHEMA)
+                self._conn = conn
+            return self._conn
+
+    def record(self, mode: str, target: str, data: Dict[str, Any]) -> None:
+        """Queue a finished result for writing; never blocks on the database."""
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append(_Entry(mode, target, data, time.time()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="report-history", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _writer(self) -> None:
+        last_purge = 0.0
+        while True:
+            with self._cond:
+                # Wait for a full batch, the flush interval, flush() or close(), whichever comes first
+                self._cond.wait_for(
+                    lambda: self._closed or (self._flush_waiters and self._pending) or len(self._pending) >= self.batch_size,
+                    self.flush_interval,
+                )
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._writing = len(batch)
+                closing = self._closed and not self._pending
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.error(f"Could not write {len(batch)} report(s) to history: {str(e)}")
+                    with self._cond:
+                        self.dropped += len(batch)
+            with self._cond:
+                self._writing = 0
+                self._cond.notify_all()
+            if self.retention_days > 0 and time.monotonic() - last_purge > 3600:
+                last_purge = time.monotonic()
+                try:
+                    self.purge(time.time() - self.retention_days * 86400)
+                except Exception as e:
+                    logger.error(f"Could not purge report history: {str(e)}")
+            if closing:
+                self._shut_down()
+                return
+
+    def _shut_down(self) -> None:
+        # Runs on the writer thread itself, so the connection is never closed under a write
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        with self._cond:
+            self._closed = False
+            self._thread = None
+            self._cond.notify_all()
+
+    def _write(self, batch: List[_Entry]) -> None:
+        conn = self._connect()
+        with self._db_lock, conn:
+            for entry in batch:
+                data = entry.data
+                issues = data.get("issues") or []
+                timings = (data.get("artifacts") or {}).get("timings") or data.get("timings") or {}
+                domain = domain_of(entry.target)
+                report_id = conn.execute(
+                    "INSERT INTO reports (domain, target, mode, created_at, summary, issue_count, total_ms, report) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (domain, entry.target, entry.mode, entry.created_at, data.get("summary"), len(issues),
+                     timings.get("total_ms"), json.dumps(data, default=str)),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO report_issues (report_id, domain, category, severity, issue_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(report_id, domain, i.get("category"), i.get("severity"), str(i.get("id")), entry.created_at) for i in issues],
+                )
+        with self._cond:
+            self.written += len(batch)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything recorded so far is written; False on timeout."""
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+            finally:
+                self._flush_waiters -= 1
+
+    def close(self, timeout: float = 5) -> None:
+        """
+        Write what is pending and stop the writer thread; a later record() starts a new one.
+        The writer closes the database on its way out, so if it is still busy
+        after timeout seconds it is left to finish (and close) on its own.
+        """
+        with self._cond:
+            thread = self._thread
+            if thread is not None:
+                self._closed = True
+                self._cond.notify_all()
+        if thread is None:
+            with self._db_lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Report history writer still busy after {timeout}s; it will close the database when done")
+
+    def _query(self, sql: str, params: Tuple) -> List[sqlite3.Row]:
+        if self._conn is None and not os.path.exists(self.path):
+            return []
+        conn = self._connect()
+        with self._db_lock:
+            return conn.execute(sql, params).fetchall()
+
+    def recent(self, domain: str, limit: int = 20, include_report: bool = True) -> List[Dict[str, Any]]:
+        """The latest reports for a domain (or any target on it), newest first."""
+        fields = f"{_SUMMARY_FIELDS}, report" if include_report else _SUMMARY_FIELDS
+        rows = self._query(
+            f"SELECT {fields} FROM reports WHERE domain = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+            (domain_of(domain), limit),
+        )
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            if include_report:
+                entry["report"] = json.loads(entry["report"])
+            entries.append(entry)
+        return entries
+
+    def domains_with_issues(self, category: str, since: float, severity: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Domains with at least one issue of category reported since the given timestamp, most recent first."""
+        sql = ("SELECT domain, COUNT(DISTINCT report_id) AS reports, MAX(created_at) AS last_seen "
+               "FROM report_issues WHERE category = ? AND created_at >= ?")
+        params: Tuple = (category, since)
+        if severity:
+            sql += " AND severity = ?"
+            params += (severity,)
+        sql += " GROUP BY domain ORDER BY last_seen DESC"
+        return [dict(row) for row in self._query(sql, params)]
+
+    def purge(self, older_than: float) -> int:
+        """Delete reports recorded before the given timestamp."""
+        conn = self._connect()
+        with self._db_lock, conn:
+            return conn.execute("DELETE FROM reports WHERE created_at < ?", (older_than,)).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"pending": len(self._pending) + self._writing, "written": self.written, "dropped": self.dropped}
+
+report_history = ReportHistory(
+    settings.HISTORY_DB_PATH,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+    max_pending=settings.HISTORY_MAX_PENDING,
+    retention_days=settings.HISTORY_RETENTION_DAYS,
+)
+
+def record_report(mode: str, target: str, data: Dict[str, Any]) -> None:
+    """Keep a finished result in the history, if enabled."""
+    if settings.HISTORY_ENABLED:
+        report_history.record(mode, target, data)
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from .singleflight import Event, EventLog
+
+logger = logging.getLogger(__name__)
+
+# Idle workers re-check the queue this often, so jobs queued by other processes are picked up
+_IDLE_POLL_SEC = 1.0
+# Attached streams poll a job running in another process at this interval
+_REMOTE_POLL_SEC = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    target TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+# Columns added after the first release, created on databases that predate them
+_ADDED_COLUMNS = {"owner": "TEXT", "lease_expires_at": "REAL"}
+
+_FIELDS = "id, mode, target, status, created_at, started_at, finished_at, attempts, result, error, owner, lease_expires_at"
+
+class JobStore:
+    """
+    SQLite-backed job table: the durable queue and the store for finished
+    results. Calls are blocking and serialized on one connection; async code
+    runs them with asyncio.to_thread.
+
+    Each store has its own owner id. A claimed job records that owner and a
+    lease the owner keeps renewing with heartbeat(); only jobs whose lease
+    has run out are taken back by recover(), so several processes can share
+    one database without stealing each other's running jobs.
+    """
+
+    def __init__(self, path: str, lease_sec: float = 60):
+        self.path = path
+        self.lease_sec = lease_sec
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL lets readers in other processes work while a worker writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _row(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def add(self, mode: str, target: str) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, mode, target, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, mode, target, time.time()),
+            )
+            return self._row(self._conn.execute(f"SELECT {_FIELDS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._row(self._conn.execute(f"SELECT {_FIELDS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running under this store's lease and return it."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"""UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, owner = ?, lease_expires_at = ?
+                    WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)
+                    RETURNING {_FIELDS}""",
+                (now, self.owner, now + self.lease_sec),
+            ).fetchone()
+        return self._row(row)
+
+    def heartbeat(self) -> int:
+        """Extend the lease on every job this store is running."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + self.lease_sec, self.owner),
+            ).rowcount
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> bool:
+        """Store the outcome; False if the job is no longer ours (its lease ran out and it was taken back)."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?, owner = NULL, lease_expires_at = NULL "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                ("failed" if error else "done", time.time(), json.dumps(result) if result is not None else None, error, job_id, self.owner),
+            ).rowcount > 0
+
+    def requeue(self, job_id: str, refund: bool = False) -> None:
+        """Put a job this store is running back in the queue; refund=True does not count the attempt."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, attempts = attempts - ?, owner = NULL, lease_expires_at = NULL "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                (1 if refund else 0, job_id, self.owner),
+            )
+
+    def recover(self, max_attempts: int) -> int:
+        """
+        Requeue running jobs whose lease has expired (their process stopped
+        mid-run), or fail them once they have used max_attempts. Jobs whose
+        owner is still renewing its lease are left alone.
+        """
+        now = time.time()
+        expired = "status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Interrupted too many times', owner = NULL, lease_expires_at = NULL "
+                f"WHERE {expired} AND attempts >= ?",
+                (now, now, max_attempts),
+            )
+            return self._conn.execute(
+                f"UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_expires_at = NULL WHERE {expired}",
+                (now,),
+            ).rowcount
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs that completed before the given timestamp."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (older_than,)
+            ).rowcount
+
+Runner = Callable[[str], AsyncIterator[Event]]
+
+class JobQueue:
+    """
+    Background diagnoses. Submitted jobs go to the SQLite store; a pool of
+    worker tasks claims them oldest first and runs them with the runner for
+    their mode (the same event producers the SSE endpoint uses), so a job
+    survives the client disconnecting and its result survives a restart.
+    While a job runs in this process its events can be followed live.
+
+    The database is only opened once a job is submitted, or at start() if it
+    already exists, so deployments that never use jobs create no file.
+    While open, the lease on running jobs is renewed every lease_sec / 3 and
+    jobs whose lease ran out in another process are put back in the queue.
+    """
+
+    def __init__(self, path: str, workers: int, runners: Dict[str, Runner], max_attempts: int = 3, retention_sec: float = 7 * 86400, lease_sec: float = 60):
+        self.path = path
+        self.workers = max(1, workers)
+        self.runners = runners
+        self.max_attempts = max_attempts
+        self.retention_sec = retention_sec
+        self.lease_sec = lease_sec
+        self.store: Optional[JobStore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running: Dict[str, EventLog] = {}
+        self._open_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Resume work left in an existing database (call from the app lifespan)."""
+        if os.path.exists(self.path):
+            await self._ensure_started()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    async def _ensure_started(self) -> JobStore:
+        async with self._open_lock:
+            if self.store is None:
+                store = await asyncio.to_thread(JobStore, self.path, self.lease_sec)
+                recovered = await asyncio.to_thread(store.recover, self.max_attempts)
+                purged = await asyncio.to_thread(store.purge, time.time() - self.retention_sec)
+                if recovered or purged:
+                    logger.info(f"Job store {self.path}: requeued {recovered} interrupted job(s), purged {purged} old job(s)")
+                self.store = store
+                self._wakeup = asyncio.Event()
+                self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+                self._tasks.append(asyncio.create_task(self._keep_leases()))
+        return self.store
+
+    async def submit(self, mode: str, target: str) -> Dict[str, Any]:
+        if mode not in self.runners:
+            raise ValueError(f"Unknown mode: {mode}")
+        store = await self._ensure_started()
+        job = await asyncio.to_thread(store.add, mode, target)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self.store is None:
+            if not os.path.exists(self.path):
+                return None
+            await self._ensure_started()
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def queued(self) -> int:
+        if self.store is None:
+            return 0
+        return await asyncio.to_thread(self.store.count, "queued")
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim)
+            except sqlite3.Error as e:
+                logger.error(f"Job worker {number} could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), _IDLE_POLL_SEC)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _keep_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_sec / 3)
+            try:
+                await asyncio.to_thread(self.store.heartbeat)
+                recovered = await asyncio.to_thread(self.store.recover, self.max_attempts)
+            except sqlite3.Error as e:
+                logger.error(f"Could not renew job leases: {str(e)}")
+                continue
+            if recovered:
+                logger.info(f"Requeued {recovered} job(s) whose lease expired")
+                self._wakeup.set()
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        log = self._running[job["id"]] = EventLog()
+        result: Optional[Dict[str, Any]] = None
+        error: Optional[str] = None
+        busy_for = 0
+        logger.info(f"Running {job['mode']} job {job['id']} for {job['target']} (attempt {job['attempts']})")
+        try:
+            async for event in self.runners[job["mode"]](job["target"]):
+                log.publish(event)
+                if event.get("type") == "result":
+                    result = event.get("data")
+                elif event.get("type") == "error" and event.get("retry_after"):
+                    # Rejected by admission control: the job is not at fault, run it again later
+                    busy_for = event["retry_after"]
+                elif event.get("type") == "error":
+                    error = event.get("message") or "Diagnosis failed"
+            if result is None and error is None and not busy_for:
+                error = "Diagnosis finished without a result"
+        except asyncio.CancelledError:
+            # Shutting down mid-run: leave the job for the next start
+            await asyncio.to_thread(self.store.requeue, job["id"])
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            error = str(e)
+        finally:
+            self._running.pop(job["id"], None)
+            log.finish()
+        if busy_for and result is None and error is None:
+            await asyncio.to_thread(self.store.requeue, job["id"], True)
+            await asyncio.sleep(busy_for)
+            return
+        if not await asyncio.to_thread(self.store.finish, job["id"], result if error is None else None, error):
+            logger.warning(f"Job {job['id']} lost its lease before finishing; its outcome was discarded")
+
+    async def follow(self, job_id: str) -> AsyncIterator[Event]:
+        """
+        Events for a job: live (with replay) while it runs in this process,
+        otherwise status updates until it finishes, then its result or error.
+        """
+        last_status = None
+        while True:
+            log = self._running.get(job_id)
+            if log is not None:
+                async for event in log.follow():
+                    # The stored outcome is sent below, once it is committed
+                    if event.get("type") not in ("result", "error"):
+                        yield event
+            job = await self.get(job_id)
+            if job is None:
+                yield {"type": "error", "message": "Job not found"}
+                return
+            if job["status"] == "done":
+                yield {"type": "result", "data": job["result"], "job_id": job_id}
+                return
+            if job["status"] == "failed":
+                yield {"type": "error", "message": job["error"], "job_id": job_id}
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield {"type": "status", "message": f"Job {job['status']}", "step": f"job_{job['status']}", "job_id": job_id}
+            if log is None:
+                await asyncio.sleep(_REMOTE_POLL_SEC)
@@ -1,13 +1,27 @@
+import asyncio
 import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from .schemas import DiagnoseRequest, DiagnosticReport
+from starlette.concurrency import iterate_in_threadpool
+from .schemas import DiagnoseRequest, DiagnosticReport, BatchDiagnoseRequest
 from pydantic import BaseModel
-from .offline import run_offline_diagnosis
+from typing import Optional
+from .offline import run_offline_diagnosis_async
 from .agent import run_agent_streaming
+from .report_cache import report_cache, normalize_target
+from .singleflight import diagnosis_flights
+from .batch import UploadTooLarge, diagnose_batch, iter_target_lines, iter_file_chunks, spool_upload
+from .warmup import warm_up
+from . import timing
+from .jobs import JobQueue
+from .history import record_report, report_history
+from .admission import AdmissionRejected, Waiter, busy_event, queued_event, llm_gate, probe_gate
+from .metrics import registry, monitor_event_loop_lag, DIAGNOSES_IN_FLIGHT, DIAGNOSIS_SECONDS, STREAMS_OPEN
 
 from .config import settings
 import json
@@ -22,7 +36,43 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, log_level, logging.ERROR))
 
-app = FastAPI(title="BrokenSite", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Imported here rather than at module level so importing the app stays cheap
+    from .tools.http_client import close_http_clients, aclose_http_clients
+    from .tools.browser_pool import browser_pool
+    
+    warmup_task = None
+    if settings.WARMUP_ON_STARTUP:
+        # Runs in the background so the server starts accepting requests right away
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    
+    lag_task = None
+    if settings.EVENT_LOOP_LAG_INTERVAL > 0:
+        lag_task = asyncio.create_task(monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL))
+    
+    if settings.BROWSER_POOL_ENABLED:
+        try:
+            await browser_pool.start()
+        except Exception as e:
+            # Screenshots fall back to launching a browser per call
+            logger.warning(f"Browser pool could not start: {str(e)}")
+    # Resume background jobs left queued or interrupted by the previous run
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    # Write reports still buffered for the history
+    await asyncio.to_thread(report_history.close)
+    if lag_task is not None:
+        lag_task.cancel()
+    if warmup_task is not None:
+        await warmup_task
+    await browser_pool.stop()
+    # Release pooled keep-alive connections on shutdown
+    close_http_clients()
+    await aclose_http_clients()
+
+app = FastAPI(title="BrokenSite", version="0.1.0", lifespan=lifespan)
 
 # Mount static files for the frontend
 frontend_path = Path(__file__).parent.parent.parent / "frontend" / "dist"
@@ -68,6 +118,13 @@ async def root():
 def health():
     return {"ok": True}
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus text-format metrics for this process"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/favicon.svg")
 async def favicon():
     """Serve the favicon"""
@@ -90,57 +147,264 @@ def test_api():
 
 
 
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Content-Type": "text/event-stream",
+}
+
+def _cached_stream(data, mode: str):
+    """Replay a cached result as a short SSE stream."""
+    message = f"Serving cached report ({data.get('cache_age_sec', 0)}s old)"
+    yield f"data: {json.dumps({'type': 'status', 'message': message, 'step': 'cached'})}\n\n"
+    if mode == "openai" and data.get("details"):
+        # The frontend builds the markdown report from text_content events
+        yield f"data: {json.dumps({'type': 'text_content', 'content': data['details'], 'message': 'AI is analyzing...'})}\n\n"
+    yield f"data: {json.dumps({'type': 'result', 'data': data, 'cached': True})}\n\n"
+    yield "data: [DONE]\n\n"
+
+async def _offline_events(target: str, slot: Optional[Waiter] = None):
+    # Offline probes are async-native, so this stream runs on the event loop
+    # instead of holding a threadpool thread for the whole diagnosis
+    yield {'type': 'status', 'message': 'Starting offline diagnosis...'}
+    task = None
+    try:
+        # While the probe limit is reached, wait here and report the queue position.
+        # The caller may have reserved the place already.
+        slot = slot or probe_gate.enter()
+        async for position in probe_gate.wait_async(slot):
+            yield queued_event(probe_gate, position)
+        # Stages are streamed as timing events as they finish; None marks the end of the run
+        spans: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        waterfall = timing.Waterfall(listener=lambda span: loop.call_soon_threadsafe(spans.put_nowait, span))
+        with timing.activate(waterfall):
+            task = asyncio.create_task(run_offline_diagnosis_async(target))
+        task.add_done_callback(lambda _: spans.put_nowait(None))
+        while (span := await spans.get()) is not None:
+            yield {'type': 'timing', **span}
+        result = task.result()
+        data = result.dict()
+        report_cache.put("offline", target, data)
+        record_report("offline", target, data)
+        yield {'type': 'status', 'message': 'Offline diagnosis completed'}
+        yield {'type': 'result', 'data': data}
+    except AdmissionRejected as e:
+        yield busy_event(e)
+    except Exception as e:
+        yield {'type': 'error', 'message': str(e)}
+    finally:
+        if task is not None:
+            task.cancel()
+        if slot is not None:
+            probe_gate.release(slot)
+
+async def _agent_events(target: str, slot: Optional[Waiter] = None):
+    # The agent is a blocking generator; each step runs on the threadpool
+    try:
+        # Queue for the first model call here rather than in a threadpool thread
+        slot = slot or llm_gate.enter()
+        async for position in llm_gate.wait_async(slot):
+            yield queued_event(llm_gate, position)
+        async for update in iterate_in_threadpool(run_agent_streaming(target, llm_slot=slot)):
+            if update.get("type") == "result":
+                report_cache.put("openai", target, update["data"])
+                record_report("openai", target, update["data"])
+            yield update
+    except AdmissionRejected as e:
+        yield busy_event(e)
+    except Exception as e:
+        logger.error(f"Error in streaming diagnosis: {str(e)}")
+        yield {'type': 'error', 'message': str(e)}
+    finally:
+        if slot is not None:
+            llm_gate.release(slot)
+
+async def _measured(mode: str, events):
+    """Track one diagnosis run in the in-flight gauge and the per-mode duration histogram."""
+    started = time.monotonic()
+    outcome = "cancelled"
+    DIAGNOSES_IN_FLIGHT.labels(mode).inc()
+    try:
+        async for update in events:
+            if update.get("type") in ("result", "error"):
+                outcome = "ok" if update["type"] == "result" else "error"
+            yield update
+    finally:
+        DIAGNOSES_IN_FLIGHT.labels(mode).dec()
+        DIAGNOSIS_SECONDS.labels(mode, outcome).observe(time.monotonic() - started)
+
 @app.post("/api/diagnose/stream")
-def diagnose_streaming(req: DiagnoseRequest, mode: str = "openai"):
+async def diagnose_streaming(req: DiagnoseRequest, mode: str = "openai", fresh: bool = False):
     """Stream diagnosis updates in real-time using Server-Sent Events.
     Provides live updates as the AI agent thinks and uses tools.
+    Recent reports for the same target and mode are served from the report
+    cache unless fresh=true, and concurrent requests for the same target and
+    mode share one running diagnosis (later ones replay its events so far).
+    New runs wait in a bounded queue (reported as queued events) while the
+    model-call or probe limit is reached; once the queue is full they get 429.
     """
     logger.info(f"Starting streaming diagnosis for target: {req.target} with mode: {mode}")
+    cache_mode = "openai" if mode == "openai" else "offline"
     
-    if mode != "openai":
-        # For offline mode, return a simple stream with the result
-        def offline_stream():
-            yield f"data: {json.dumps({'type': 'status', 'message': 'Starting offline diagnosis...'})}\n\n"
-            
-            try:
-                result = run_offline_diagnosis(req.target)
-                yield f"data: {json.dumps({'type': 'status', 'message': 'Offline diagnosis completed'})}\n\n"
-                yield f"data: {json.dumps({'type': 'result', 'data': result.dict()})}\n\n"
-            except Exception as e:
-                yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-            
-            yield "data: [DONE]\n\n"
-        
-        return StreamingResponse(
-            offline_stream(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/event-stream",
-            }
-        )
-    
-    # For OpenAI mode, use the streaming agent
-    if not settings.OPENAI_API_KEY:
+    if mode == "openai" and not settings.OPENAI_API_KEY:
         raise HTTPException(status_code=400, detail="OPENAI_API_KEY is required for streaming diagnosis")
     
-    def streaming_response():
+    if not fresh:
+        cached = report_cache.get(cache_mode, req.target)
+        if cached is not None:
+            logger.info(f"Serving cached {cache_mode} report for target: {req.target}")
+            return StreamingResponse(_cached_stream(cached, cache_mode), media_type="text/plain", headers=_SSE_HEADERS)
+    
+    events = _agent_events if cache_mode == "openai" else _offline_events
+    key = (cache_mode, normalize_target(req.target))
+    
+    # Joining a run in progress costs nothing; a new run takes its slot (or
+    # place in the queue) now, so a full queue is always answered with 429
+    gate = llm_gate if cache_mode == "openai" else probe_gate
+    slot = None
+    if not diagnosis_flights.in_flight(key):
+        try:
+            slot = gate.enter()
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    started = False
+    
+    def start():
+        nonlocal started
+        started = True
+        return _measured(cache_mode, events(req.target, slot))
+    
+    async def streaming_response():
+        STREAMS_OPEN.labels("diagnose").inc()
         try:
-            for update in run_agent_streaming(req.target):
+            # The run's producer releases the slot when it finishes; on_done covers
+            # a run cancelled before its producer ever started
+            on_done = (lambda: gate.release(slot)) if slot is not None else None
+            async for update in diagnosis_flights.subscribe(key, start, on_done=on_done):
                 yield f"data: {json.dumps(update)}\n\n"
-        except Exception as e:
-            logger.error(f"Error in streaming diagnosis: {str(e)}")
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield "data: [DONE]\n\n"
         finally:
+            STREAMS_OPEN.labels("diagnose").dec()
+            # A run for the same target started in the meantime and was joined instead
+            if slot is not None and not started:
+                gate.release(slot)
+    
+    return StreamingResponse(streaming_response(), media_type="text/plain", headers=_SSE_HEADERS)
+
+# Background jobs reuse the streaming producers, so they share the cache and admission limits
+job_queue = JobQueue(
+    settings.JOBS_DB_PATH,
+    settings.JOB_WORKERS,
+    {
+        "offline": lambda target: _measured("offline", _offline_events(target)),
+        "openai": lambda target: _measured("openai", _agent_events(target)),
+    },
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retention_sec=settings.JOB_RETENTION_HOURS * 3600,
+    lease_sec=settings.JOB_LEASE_SEC,
+)
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(req: DiagnoseRequest, mode: str = "openai"):
+    """Queue a diagnosis to run in the background.
+    Returns the job record; poll GET /api/jobs/{id} or attach to
+    GET /api/jobs/{id}/stream. Jobs and their results survive restarts.
+    """
+    mode = "openai" if mode == "openai" else "offline"
+    if mode == "openai" and not settings.OPENAI_API_KEY:
+        raise HTTPException(status_code=400, detail="OPENAI_API_KEY is required for AI diagnosis")
+    if await job_queue.queued() >= settings.JOB_MAX_QUEUED:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{settings.JOB_MAX_QUEUED} jobs already queued",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+        )
+    job = await job_queue.submit(mode, req.target)
+    logger.info(f"Queued {mode} job {job['id']} for target: {req.target}")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, plus the report once it is done (or the error if it failed)."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """Follow a job as Server-Sent Events.
+    A job running in this process replays its events so far, then streams
+    live; otherwise job status updates are sent until the result arrives.
+    """
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def streaming_response():
+        STREAMS_OPEN.labels("job").inc()
+        try:
+            async for update in job_queue.follow(job_id):
+                yield f"data: {json.dumps(update)}\n\n"
             yield "data: [DONE]\n\n"
+        finally:
+            STREAMS_OPEN.labels("job").dec()
+    
+    return StreamingResponse(streaming_response(), media_type="text/plain", headers=_SSE_HEADERS)
+
+@app.get("/api/history")
+async def history(domain: str, limit: int = 20, full: bool = True):
+    """Most recent stored reports for a domain, newest first.
+    full=false leaves out the report bodies (summary, issue count and total time only).
+    """
+    limit = max(1, min(limit, 500))
+    return await asyncio.to_thread(report_history.recent, domain, limit, full)
+
+@app.get("/api/history/issues")
+async def history_issues(category: str, hours: float = 24, severity: Optional[str] = None):
+    """Domains with at least one issue of a category (DNS, TLS, HTTP, Network, Content) in the last `hours`."""
+    since = time.time() - hours * 3600
+    domains = await asyncio.to_thread(report_history.domains_with_issues, category, since, severity)
+    return {"category": category, "hours": hours, "domains": domains}
+
+def _batch_concurrency(requested: Optional[int]) -> int:
+    return max(1, min(requested or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY))
+
+def _ndjson_response(targets, concurrency: int) -> StreamingResponse:
+    async def ndjson_stream():
+        STREAMS_OPEN.labels("batch").inc()
+        try:
+            async for line in diagnose_batch(targets, concurrency):
+                yield json.dumps(line) + "\n"
+        finally:
+            STREAMS_OPEN.labels("batch").dec()
     
     return StreamingResponse(
-        streaming_response(),
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
-        }
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"},
     )
+
+@app.post("/api/diagnose/batch")
+async def diagnose_batch_json(req: BatchDiagnoseRequest):
+    """Run offline diagnoses for a list of targets.
+    Streams one NDJSON line per target ({index, target, report|error}) as each finishes.
+    """
+    logger.info(f"Starting batch diagnosis for {len(req.targets)} targets")
+    return _ndjson_response(req.targets, _batch_concurrency(req.concurrency))
+
+@app.post("/api/diagnose/batch/upload")
+async def diagnose_batch_upload(request: Request, concurrency: Optional[int] = None):
+    """Run offline diagnoses for an uploaded text file (raw request body) with one target per line.
+    The upload is spooled to a temporary file and targets are read from it lazily.
+    """
+    logger.info("Starting batch diagnosis from uploaded target list")
+    max_bytes = settings.BATCH_MAX_UPLOAD_BYTES
+    declared = request.headers.get("content-length")
+    try:
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        upload = await spool_upload(request.stream(), max_bytes)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return _ndjson_response(iter_target_lines(iter_file_chunks(upload)), _batch_concurrency(concurrency))
@@ -0,0 +1,309 @@
+import asyncio
+import bisect
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers cached DNS answers up to slow model calls and page loads
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        name = f"{name}{{{label_text}}}"
+    if value == float("inf"):
+        return f"{name} +Inf"
+    return f"{name} {int(value) if float(value).is_integer() else value}"
+
+class _Metric:
+    """
+    A named metric with one series per label combination.
+    Series are created under the metric's lock the first time a label
+    combination is seen; after that each update only takes that series' own
+    lock, so unrelated series never contend.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(v) for v in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        for key, series in list(self._series.items()):
+            out.extend(series.samples(self.name, dict(zip(self.labelnames, key))))
+        return out
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self, name: str, labels: Dict[str, str]) -> List[Sample]:
+        return [(name, labels, self.value)]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+class _HistogramValue:
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def samples(self, name: str, labels: Dict[str, str]) -> List[Sample]:
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        out: List[Sample] = []
+        cumulative = 0
+        for bound, count in zip(self._bounds + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            out.append((f"{name}_bucket", {**labels, "le": le}, cumulative))
+        out.append((f"{name}_sum", labels, total))
+        out.append((f"{name}_count", labels, cumulative))
+        return out
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+class _Callback:
+    """A metric whose samples are read at scrape time, costing nothing on the hot path."""
+
+    def __init__(self, name: str, documentation: str, type: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self._collect = collect
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, labels, value) for labels, value in self._collect()]
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, type: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> _Callback:
+        return self.register(_Callback(name, documentation, type, collect))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A failing collector must not take the whole scrape down
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(_format_sample(name, labels, value) for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "brokensite_stage_duration_seconds",
+    "Duration of diagnosis stages: tool calls, probes and their sub-stages, and model calls",
+    ["stage"],
+)
+DIAGNOSIS_SECONDS = registry.histogram(
+    "brokensite_diagnosis_duration_seconds",
+    "Wall-clock time of a complete diagnosis run",
+    ["mode", "outcome"],
+)
+DIAGNOSES_IN_FLIGHT = registry.gauge(
+    "brokensite_diagnoses_in_flight",
+    "Diagnosis runs currently executing (coalesced requests share one run)",
+    ["mode"],
+)
+STREAMS_OPEN = registry.gauge(
+    "brokensite_streams_open",
+    "Streaming responses (SSE and NDJSON) currently being sent",
+    ["endpoint"],
+)
+PREFETCH_CLAIMS = registry.counter(
+    "brokensite_prefetch_claims_total",
+    "Agent tool calls answered from a prefetched probe (hit) or run live (miss)",
+    ["result"],
+)
+OPENAI_TOKENS = registry.counter(
+    "brokensite_openai_tokens_total",
+    "Tokens reported by the Responses API usage block",
+    ["call", "kind"],
+)
+OPENAI_FIRST_EVENT_SECONDS = registry.histogram(
+    "brokensite_openai_first_event_seconds",
+    "Time from responses.create to the first streamed event",
+    ["call"],
+)
+BROWSER_PAGES = registry.counter(
+    "brokensite_browser_pages_total",
+    "Pages opened in Chromium, by whether the shared browser pool served them",
+    ["source"],
+)
+BROWSER_PAGES_OPEN = registry.gauge(
+    "brokensite_browser_pages_open",
+    "Chromium pages currently open",
+)
+ADMISSION_REJECTED = registry.counter(
+    "brokensite_admission_rejected_total",
+    "Requests turned away because a resource's wait queue was full or the wait timed out",
+    ["resource"],
+)
+EVENT_LOOP_LAG = registry.gauge(
+    "brokensite_event_loop_lag_seconds",
+    "How late the most recent event-loop lag probe woke up",
+)
+
+def _loaded(module: str) -> Optional[Any]:
+    # Scrapes must not import the tool layer (and its heavy dependencies) on their own
+    return sys.modules.get(module)
+
+def _cache_stats() -> Dict[str, Dict[str, int]]:
+    from .report_cache import report_cache
+    caches = {"report": report_cache.stats()}
+    dns_cache_module = _loaded("diagnostics.tools.dns_cache")
+    if dns_cache_module is not None:
+        caches["dns"] = dns_cache_module.dns_cache.stats()
+    return caches
+
+def _collect_cache_lookups():
+    for cache, stats in _cache_stats().items():
+        yield {"cache": cache, "result": "hit"}, stats["hits"]
+        yield {"cache": cache, "result": "miss"}, stats["misses"]
+
+def _collect_cache_hit_ratio():
+    for cache, stats in _cache_stats().items():
+        lookups = stats["hits"] + stats["misses"]
+        yield {"cache": cache}, (stats["hits"] / lookups) if lookups else 0.0
+
+def _collect_cache_entries():
+    for cache, stats in _cache_stats().items():
+        yield {"cache": cache}, stats["entries"]
+
+def _collect_flights():
+    from .singleflight import diagnosis_flights
+    stats = diagnosis_flights.stats()
+    yield {"result": "started"}, stats["started"]
+    yield {"result": "coalesced"}, stats["coalesced"]
+
+def _collect_browser_recycles():
+    pool_module = _loaded("diagnostics.tools.browser_pool")
+    if pool_module is not None:
+        yield {}, pool_module.browser_pool.recycles
+
+def _collect_history_writes():
+    history_module = _loaded("diagnostics.history")
+    if history_module is not None:
+        stats = history_module.report_history.stats()
+        yield {"result": "written"}, stats["written"]
+        yield {"result": "dropped"}, stats["dropped"]
+
+def _collect_admission(stat: str):
+    def collect():
+        from .admission import gates
+        for name, gate in gates.items():
+            yield {"resource": name}, gate.stats()[stat]
+    return collect
+
+registry.callback("brokensite_cache_lookups_total", "Cache lookups by result", "counter", _collect_cache_lookups)
+registry.callback("brokensite_cache_hit_ratio", "Share of cache lookups served from the cache since startup", "gauge", _collect_cache_hit_ratio)
+registry.callback("brokensite_cache_entries", "Entries currently cached", "gauge", _collect_cache_entries)
+registry.callback("brokensite_diagnosis_requests_total", "Streaming diagnosis requests that started a run or joined one", "counter", _collect_flights)
+registry.callback("brokensite_browser_pool_recycles_total", "Pooled Chromium processes replaced after too many pages or too much memory", "counter", _collect_browser_recycles)
+registry.callback("brokensite_history_writes_total", "Reports written to the history store, or dropped before they could be", "counter", _collect_history_writes)
+registry.callback("brokensite_admission_active", "Slots in use per admission-controlled resource", "gauge", _collect_admission("active"))
+registry.callback("brokensite_admission_queued", "Requests waiting for a slot per admission-controlled resource", "gauge", _collect_admission("queued"))
+registry.callback("brokensite_admission_limit", "Configured concurrency limit per admission-controlled resource", "gauge", _collect_admission("limit"))
+
+async def monitor_event_loop_lag(interval: float) -> None:
+    """Sleep for interval seconds in a loop and record how late each wake-up is."""
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.set(max(0.0, time.monotonic() - started - interval))
@@ -1,32 +1,95 @@
+import asyncio
 import logging
-from typing import Dict, Any, List
-from .tools import dns_lookup, tls_probe, http_check
+from typing import Dict, Any, List, Optional, Tuple
 from .schemas import DiagnosticReport, Issue
+from . import timing
 
 logger = logging.getLogger(__name__)
 
-def run_offline_diagnosis(target: str) -> DiagnosticReport:
-    logger.info(f"Starting offline diagnosis for target: {target}")
-    
+def parse_target(target: str) -> Tuple[str, str]:
+    """Split a diagnosis target into (domain, url); bare domains are probed over https."""
     # heuristic: if target includes scheme, treat as URL; else domain
     is_url = target.startswith("http://") or target.startswith("https://")
     domain = target.split("://", 1)[1].split("/")[0] if is_url else target
-    
-    logger.info(f"Parsed target - is_url: {is_url}, domain: {domain}")
+    url = target if is_url else f"https://{domain}"
+    return domain, url
 
-    issues: List[Issue] = []
+def run_offline_diagnosis(target: str, concurrent: bool = True) -> DiagnosticReport:
+    from .tools.runtime import run_sync
+    return run_sync(run_offline_diagnosis_async(target, concurrent))
 
-    logger.info("Running DNS lookup...")
-    dns = dns_lookup(domain, ["A","AAAA","CNAME","MX","NS","TXT"])
-    logger.info("DNS lookup completed")
-    
-    logger.info("Running HTTP check...")
-    http = http_check(target if is_url else f"https://{domain}")
-    logger.info("HTTP check completed")
+async def run_offline_diagnosis_async(target: str, concurrent: bool = True) -> DiagnosticReport:
+    """
+    Run the deterministic DNS/HTTP/TLS checks and build a report.
+    With concurrent=True the independent probes run at the same time, so the
+    wall-clock time is bounded by the slowest probe rather than their sum.
+    Each stage is timed on the active waterfall (a new one if none is active)
+    and the waterfall is attached to the report as artifacts.timings.
+    """
+    logger.info(f"Starting offline diagnosis for target: {target}")
+    # Probe modules load their network/crypto dependencies, so import them on first use
+    from .tools import dns_lookup_async, tls_probe_async, http_check_async
+    from .tools.dns_cache import addresses_from_records
     
-    logger.info("Running TLS probe...")
-    tls = tls_probe(domain, 443, sni=True)
-    logger.info("TLS probe completed")
+    domain, url = parse_target(target)
+    logger.info(f"Parsed target - domain: {domain}, url: {url}")
+
+    with timing.activate(timing.current() or timing.Waterfall()) as waterfall:
+        # A/AAAA are queried once and shared: the DNS probe reports them and the
+        # HTTP/TLS probes connect to the answers without re-resolving. If there
+        # are none (lookup failed or timed out) those probes resolve as usual.
+        address_lookup = asyncio.ensure_future(waterfall.timed("resolve_addresses", dns_lookup_async(domain, ["A", "AAAA"])))
+
+        async def lookup_dns() -> Dict[str, Any]:
+            addresses, others = await asyncio.gather(
+                asyncio.shield(address_lookup),
+                dns_lookup_async(domain, ["CNAME", "MX", "NS", "TXT"]),
+            )
+            return {"domain": domain, "records": {**addresses["records"], **others["records"]}}
+
+        async def pinned_addresses() -> Optional[List[str]]:
+            return addresses_from_records(await asyncio.shield(address_lookup)) or None
+
+        async def check_http() -> Dict[str, Any]:
+            addresses = await pinned_addresses()
+            return await waterfall.timed("http_check", http_check_async(url, addresses=addresses))
+
+        async def probe_tls() -> Dict[str, Any]:
+            addresses = await pinned_addresses()
+            return await waterfall.timed("tls_probe", tls_probe_async(domain, 443, sni=True, addresses=addresses))
+
+        try:
+            if concurrent:
+                logger.info("Running DNS lookup, HTTP check and TLS probe concurrently...")
+                dns, http, tls = await asyncio.gather(
+                    waterfall.timed("dns_lookup", lookup_dns()),
+                    check_http(),
+                    probe_tls(),
+                )
+                logger.info("Concurrent probes completed")
+            else:
+                logger.info("Running DNS lookup...")
+                dns = await waterfall.timed("dns_lookup", lookup_dns())
+                logger.info("DNS lookup completed")
+                
+                logger.info("Running HTTP check...")
+                http = await check_http()
+                logger.info("HTTP check completed")
+                
+                logger.info("Running TLS probe...")
+                tls = await probe_tls()
+                logger.info("TLS probe completed")
+        finally:
+            address_lookup.cancel()
+
+        with waterfall.stage("build_report"):
+            report = build_offline_report(dns, http, tls)
+        report.artifacts.timings = waterfall.as_dict()
+    return report
+
+def build_offline_report(dns: Dict[str, Any], http: Dict[str, Any], tls: Dict[str, Any]) -> DiagnosticReport:
+    """Turn raw probe results into issues and a DiagnosticReport."""
+    issues: List[Issue] = []
 
     # Basic findings
     if isinstance(dns["records"].get("A"), dict) and "error" in dns["records"]["A"]:
@@ -0,0 +1,89 @@
+import copy
+import logging
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List, Optional
+from .report_cache import normalize_target
+from .admission import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+def _normalize_host(host: Any) -> str:
+    return str(host or "").strip().rstrip(".").lower()
+
+class ProbePrefetch:
+    """
+    Speculatively runs the DNS, HTTP and TLS probes for a target while the
+    model is still deciding which tools to call. A tool call whose arguments
+    match a prefetched probe (same host/URL, default options) is answered from
+    it; anything never claimed is dropped by discard().
+    """
+
+    def __init__(self, executor: Executor, dns_lookup: Callable, http_check: Callable, tls_probe: Callable, record_types: List[str]):
+        self._executor = executor
+        self._dns_lookup = dns_lookup
+        self._http_check = http_check
+        self._tls_probe = tls_probe
+        self._record_types = list(record_types)
+        self._domain = ""
+        self._url = ""
+        self._futures: Dict[str, Future] = {}
+        self.hits = 0
+
+    def start(self, domain: str, url: str) -> None:
+        self._domain = _normalize_host(domain)
+        self._url = normalize_target(url)
+        logger.info(f"Prefetching DNS, HTTP and TLS probes for {domain}")
+        self._futures = {
+            "dns_lookup": self._executor.submit(self._dns_lookup, domain=domain, record_types=self._record_types),
+            "http_check": self._executor.submit(self._http_check, url=url),
+            "tls_probe": self._executor.submit(self._tls_probe, host=domain),
+        }
+
+    def _matches(self, name: str, args: Dict[str, Any]) -> bool:
+        if name == "dns_lookup":
+            record_types = args.get("record_types") or self._record_types
+            return (_normalize_host(args.get("domain")) == self._domain
+                    and set(r.upper() for r in record_types) <= set(self._record_types))
+        if name == "http_check":
+            return (normalize_target(str(args.get("url", ""))) == self._url
+                    and str(args.get("method", "GET")).upper() == "GET"
+                    and args.get("follow_redirects", True) is True
+                    and args.get("timeout_sec", 10) == 10)
+        if name == "tls_probe":
+            return (_normalize_host(args.get("host")) == self._domain
+                    and args.get("port", 443) == 443
+                    and args.get("sni", True) is True)
+        return False
+
+    def claim(self, name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Result of the prefetched probe matching this tool call, waiting for it
+        if it is still running. Returns None when there is no match or the
+        probe failed, in which case the caller runs the tool itself.
+        """
+        future = self._futures.get(name)
+        if future is None or future.cancelled() or not self._matches(name, args):
+            return None
+        try:
+            result = future.result()
+        except AdmissionRejected:
+            # Skipped for want of a free probe slot
+            logger.info(f"Prefetched {name} was skipped, running it live")
+            return None
+        except Exception as e:
+            logger.warning(f"Prefetched {name} failed, running it again: {str(e)}")
+            return None
+        self.hits += 1
+        # Several tool calls may share one probe, so each gets its own copy
+        result = copy.deepcopy(result)
+        if name == "dns_lookup" and args.get("record_types"):
+            wanted = set(r.upper() for r in args["record_types"])
+            result["records"] = {r: v for r, v in result.get("records", {}).items() if r in wanted}
+        logger.info(f"Answered {name} from prefetched probe")
+        return result
+
+    def discard(self) -> None:
+        """Drop unclaimed probes; ones not yet started are cancelled."""
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+from .config import settings
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_target(target: str) -> str:
+    """
+    Canonical form of a target for cache keys: bare domains become https URLs,
+    scheme and host are lowercased, default ports and a lone trailing slash are
+    dropped. Path and query are kept as given.
+    """
+    target = target.strip()
+    if "://" not in target:
+        target = f"https://{target}"
+    parts = urlsplit(target)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, _DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    path = "" if parts.path == "/" else parts.path
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
+
+class ReportCache:
+    """
+    Finished diagnosis results keyed by (mode, normalized target).
+    Entries expire after ttl seconds, and least recently used entries are
+    evicted once the serialized results exceed max_bytes in total.
+    """
+
+    def __init__(self, ttl: float = 300, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Results are kept serialized so their size is exact and hits get a private copy
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mode: str, target: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result data with its age in seconds as `cache_age_sec`, or None."""
+        key = (mode, normalize_target(target))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, payload = entry
+            if stored_at + self.ttl <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        data = json.loads(payload)
+        data["cache_age_sec"] = round(now - stored_at, 1)
+        return data
+
+    def put(self, mode: str, target: str, data: Dict[str, Any]) -> None:
+        if self.ttl <= 0 or self.max_bytes <= 0:
+            return
+        payload = json.dumps(data)
+        size = len(payload.encode())
+        if size > self.max_bytes:
+            return
+        key = (mode, normalize_target(target))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic(), payload)
+            self.bytes_used += size
+            while self.bytes_used > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= len(entry[1].encode())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes_used = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.bytes_used, "hits": self.hits, "misses": self.misses}
+
+report_cache = ReportCache(
+    ttl=settings.REPORT_CACHE_TTL,
+    max_bytes=settings.REPORT_CACHE_MAX_BYTES,
+)
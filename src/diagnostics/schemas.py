@@ -4,6 +4,10 @@ from typing import List, Optional, Literal, Dict, Any
 class DiagnoseRequest(BaseModel):
     target: str = Field(..., description="URL or domain to diagnose")
 
+class BatchDiagnoseRequest(BaseModel):
+    targets: List[str] = Field(..., description="URLs or domains to diagnose")
+    concurrency: Optional[int] = Field(None, ge=1, description="Diagnoses to run at once (capped by the server)")
+
 IssueCategory = Literal["DNS","TLS","HTTP","Network","Content"]
 
 class Issue(BaseModel):
@@ -17,6 +21,7 @@ class Issue(BaseModel):
 class Artifact(BaseModel):
     screenshots: List[str] = []
     raw_samples: Dict[str, Any] = {}
+    timings: Dict[str, Any] = {}  # Stage waterfall: {"total_ms", "stages": [{stage, start_ms, end_ms, duration_ms}]}
 
 class DiagnosticReport(BaseModel):
     summary: str
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+
+class EventLog:
+    """Events emitted by one producer so far; any number of readers can follow it from the start."""
+
+    def __init__(self):
+        self.events: List[Event] = []
+        self.done = False
+        self._wakeup = asyncio.Event()
+
+    def publish(self, event: Event) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        # Swap in a fresh Event so waiters woken now do not spin on a set flag
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    async def wait(self) -> None:
+        await self._wakeup.wait()
+
+    async def follow(self) -> AsyncIterator[Event]:
+        """Every event from the start, then live events until the producer finishes."""
+        position = 0
+        while True:
+            if position < len(self.events):
+                event = self.events[position]
+                position += 1
+                yield event
+            elif self.done:
+                return
+            else:
+                await self.wait()
+
+class _Flight(EventLog):
+    """One running producer plus every event it has emitted so far."""
+
+    def __init__(self):
+        super().__init__()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+class SingleFlight:
+    """
+    De-duplicates concurrent event streams by key. The first subscriber for a
+    key starts the producer; later subscribers attach to the same run and get
+    every event from the start, then live events as they arrive. A run is
+    forgotten as soon as it finishes and cancelled if every subscriber leaves.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def subscribe(
+        self,
+        key: Hashable,
+        start: Callable[[], AsyncIterator[Event]],
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> AsyncIterator[Event]:
+        """
+        Follow the run for key, starting it if there is none. on_done, if this
+        call starts the run, is called once the run is over, even if it was
+        cancelled before the producer got to run at all.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._run(key, flight, start()))
+            if on_done is not None:
+                flight.task.add_done_callback(lambda _: on_done())
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Joining in-flight diagnosis for {key} ({len(flight.events)} events to replay)")
+        flight.subscribers += 1
+        try:
+            async for event in flight.follow():
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                logger.info(f"No subscribers left for {key}, cancelling diagnosis")
+                # Forget the run now so a request arriving while it winds down starts a fresh one
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key: Hashable, flight: _Flight, events: AsyncIterator[Event]) -> None:
+        try:
+            async for event in events:
+                flight.publish(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Diagnosis for {key} failed: {str(e)}")
+            flight.publish({"type": "error", "message": str(e)})
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.finish()
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
+
+diagnosis_flights = SingleFlight()
@@ -0,0 +1,113 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+from .metrics import STAGE_SECONDS
+
+T = TypeVar("T")
+
+class Waterfall:
+    """
+    Per-stage timing for one diagnosis.
+    Stages are recorded with monotonic start and end offsets (ms) from when the
+    waterfall was created. Stages may finish on any thread; listener, if given,
+    is called with each finished stage.
+    """
+
+    def __init__(self, listener: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.origin = time.monotonic()
+        self._listener = listener
+        self._lock = threading.Lock()
+        self._finished: List[Dict[str, Any]] = []
+        self._drained = 0
+
+    def _offset_ms(self, at: float) -> float:
+        return round((at - self.origin) * 1000, 1)
+
+    def begin(self, name: str, **attrs: Any) -> Dict[str, Any]:
+        """Open a stage; callers may add attributes to the returned span until end()."""
+        span = {"stage": name, **attrs}
+        span["_started"] = time.monotonic()
+        span["start_ms"] = self._offset_ms(span["_started"])
+        return span
+
+    def mark(self, span: Dict[str, Any], key: str) -> None:
+        """Record the current offset under key, once (e.g. first_event_ms)."""
+        if key not in span:
+            span[key] = self._offset_ms(time.monotonic())
+
+    def end(self, span: Dict[str, Any]) -> None:
+        ended = time.monotonic()
+        span["end_ms"] = self._offset_ms(ended)
+        duration = ended - span.pop("_started")
+        span["duration_ms"] = round(duration * 1000, 1)
+        STAGE_SECONDS.labels(span["stage"]).observe(duration)
+        with self._lock:
+            self._finished.append(span)
+        if self._listener is not None:
+            self._listener(dict(span))
+
+    @contextmanager
+    def stage(self, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        span = self.begin(name, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = type(e).__name__
+            raise
+        finally:
+            self.end(span)
+
+    async def timed(self, name: str, awaitable: Awaitable[T], **attrs: Any) -> T:
+        with self.stage(name, **attrs):
+            return await awaitable
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Stages finished since the previous drain()."""
+        with self._lock:
+            spans = self._finished[self._drained:]
+            self._drained = len(self._finished)
+        return [dict(s) for s in spans]
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = sorted((dict(s) for s in self._finished), key=lambda s: (s["start_ms"], s["end_ms"]))
+        return {"total_ms": self._offset_ms(time.monotonic()), "stages": stages}
+
+# The waterfall of the diagnosis running in this context, so probes can add
+# sub-stages without it being passed through every tool signature
+_current: ContextVar[Optional[Waterfall]] = ContextVar("diagnostics_waterfall", default=None)
+_open_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("diagnostics_open_span", default=None)
+
+def current() -> Optional[Waterfall]:
+    return _current.get()
+
+@contextmanager
+def activate(waterfall: Waterfall) -> Iterator[Waterfall]:
+    """Make waterfall the target of stage() in this context (and tasks started from it)."""
+    token = _current.set(waterfall)
+    try:
+        yield waterfall
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def stage(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Time a stage on the active waterfall; a no-op outside a diagnosis."""
+    waterfall = _current.get()
+    if waterfall is None:
+        yield {}
+        return
+    with waterfall.stage(name, **attrs) as span:
+        token = _open_span.set(span)
+        try:
+            yield span
+        finally:
+            _open_span.reset(token)
+
+def annotate(**attrs: Any) -> None:
+    """Add attributes to the innermost open stage(), if any."""
+    span = _open_span.get()
+    if span is not None:
+        span.update(attrs)
@@ -1,13 +1,32 @@
-from .dns_tools import dns_lookup
-from .tls_tools import tls_probe
-from .http_tools import http_check
-from .hosting_tools import hosting_provider_detect
-from .screenshot_tools import take_screenshot_sync
-
-__all__ = [
-    "dns_lookup",
-    "tls_probe",
-    "http_check",
-    "hosting_provider_detect",
-    "take_screenshot_sync",
-]
+import importlib
+from typing import Any, Dict, List
+
+# Tool functions and the submodule that defines each. The submodules pull in
+# httpx, dnspython, cryptography and Playwright, so they are imported on first
+# attribute access instead of with the package.
+_TOOL_MODULES: Dict[str, str] = {
+    "dns_lookup": "dns_tools",
+    "dns_lookup_async": "dns_tools",
+    "tls_probe": "tls_tools",
+    "tls_probe_async": "tls_tools",
+    "http_check": "http_tools",
+    "http_check_async": "http_tools",
+    "hosting_provider_detect": "hosting_tools",
+    "hosting_provider_detect_async": "hosting_tools",
+    "take_screenshot": "screenshot_tools",
+    "take_screenshot_sync": "screenshot_tools",
+}
+
+__all__ = list(_TOOL_MODULES)
+
+def __getattr__(name: str) -> Any:
+    module = _TOOL_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Cache on the package so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
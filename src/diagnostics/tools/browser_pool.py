@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Passed to each pooled Chromium so its browser process can be found in /proc;
+# Chromium ignores switches it does not know
+_MARKER_SWITCH = "--brokensite-pool-browser"
+
+def _find_browser_pid(marker: str) -> Optional[int]:
+    """
+    PID of the topmost process whose command line contains marker (the
+    browser process, should Chromium copy the switch to its helpers), or None.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    needle = marker.encode()
+    matches: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                if needle not in f.read():
+                    continue
+            with open(f"/proc/{entry}/stat") as f:
+                matches[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    roots = [pid for pid, parent in matches.items() if parent not in matches]
+    return min(roots) if roots else None
+
+def _children_by_parent() -> Dict[int, List[int]]:
+    """One pass over /proc: parent PID -> child PIDs."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so split after its closing paren
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+def _process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """
+    Resident memory of root_pid and its descendants, in MB. Reads /proc, so it
+    returns None on platforms without it (or once root_pid has exited).
+    """
+    if not os.path.isdir(f"/proc/{root_pid}"):
+        return None
+    children = _children_by_parent()
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    frontier = [root_pid]
+    while frontier:
+        pid = frontier.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        frontier.extend(children.get(pid, ()))
+    return total / (1024 * 1024)
+
+class BrowserPool:
+    """
+    Long-lived Playwright driver and Chromium process shared by screenshot calls.
+    Every caller gets its own BrowserContext, concurrent pages are capped, and
+    the browser is replaced after recycle_after_pages pages or once the current
+    Chromium's process tree uses more than max_rss_mb (measured off the event
+    loop, at most every rss_check_interval seconds). A replaced browser is
+    closed when its last context finishes.
+    """
+
+    def __init__(self, max_pages: int = 4, recycle_after_pages: int = 100, max_rss_mb: float = 1024, rss_check_interval: float = 10):
+        self.max_pages = max_pages
+        self.recycle_after_pages = recycle_after_pages
+        self.max_rss_mb = max_rss_mb
+        self.rss_check_interval = rss_check_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        # Per-browser bookkeeping: pages served, contexts still open, marker and PID
+        self._usage: Dict[Browser, Dict[str, Any]] = {}
+        self._rss_checked_at = 0.0
+        self._retired: set = set()
+        self.pages_served = 0
+        self.recycles = 0
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    def owns_current_loop(self) -> bool:
+        """True when called from the event loop the pool was started on."""
+        try:
+            return self.started and asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright = await async_playwright().start()
+        try:
+            self._browser = await self._launch()
+        except Exception:
+            await self._playwright.stop()
+            self._playwright = None
+            raise
+        logger.info(f"Browser pool started (max_pages={self.max_pages})")
+
+    async def stop(self) -> None:
+        if not self.started:
+            return
+        for browser in list(self._usage):
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"Error closing pooled browser: {str(e)}")
+        self._usage.clear()
+        self._retired.clear()
+        self._browser = None
+        await self._playwright.stop()
+        self._playwright = None
+        self._loop = None
+        logger.info("Browser pool stopped")
+
+    async def _launch(self) -> Browser:
+        marker = uuid.uuid4().hex
+        browser = await self._playwright.chromium.launch(headless=True, args=[f"{_MARKER_SWITCH}={marker}"])
+        self._usage[browser] = {"pages": 0, "active": 0, "marker": marker, "pid": None}
+        self._rss_checked_at = time.monotonic()
+        return browser
+
+    def _browser_rss_mb(self, browser: Browser) -> Optional[float]:
+        # Runs in a worker thread; only this browser's own process tree counts,
+        # not retired browsers still draining or one-off screenshot browsers
+        usage = self._usage[browser]
+        if usage["pid"] is None:
+            usage["pid"] = _find_browser_pid(usage["marker"])
+        if usage["pid"] is None:
+            return None
+        return _process_tree_rss_mb(usage["pid"])
+
+    async def _needs_recycle(self, browser: Browser) -> bool:
+        if not browser.is_connected():
+            return True
+        if self.recycle_after_pages and self._usage[browser]["pages"] >= self.recycle_after_pages:
+            return True
+        if self.max_rss_mb and time.monotonic() - self._rss_checked_at >= self.rss_check_interval:
+            self._rss_checked_at = time.monotonic()
+            rss = await asyncio.to_thread(self._browser_rss_mb, browser)
+            if rss is not None and rss > self.max_rss_mb:
+                logger.info(f"Chromium RSS {rss:.0f} MB exceeds {self.max_rss_mb} MB, recycling browser")
+                return True
+        return False
+
+    async def _acquire_browser(self) -> Browser:
+        async with self._lock:
+            if self._browser is None or await self._needs_recycle(self._browser):
+                old = self._browser
+                self._browser = await self._launch()
+                if old is not None:
+                    self.recycles += 1
+                    self._retired.add(old)
+                    await self._close_if_idle(old)
+            usage = self._usage[self._browser]
+            usage["pages"] += 1
+            usage["active"] += 1
+            self.pages_served += 1
+            return self._browser
+
+    async def _close_if_idle(self, browser: Browser) -> None:
+        if browser in self._retired and self._usage[browser]["active"] == 0:
+            self._retired.discard(browser)
+            self._usage.pop(browser, None)
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"Error closing retired browser: {str(e)}")
+
+    @asynccontextmanager
+    async def context(self, **context_options: Any) -> AsyncIterator[BrowserContext]:
+        """Yield an isolated BrowserContext; waits while max_pages are already open."""
+        if not self.owns_current_loop():
+            raise RuntimeError("BrowserPool.context() must be used on the loop the pool was started on")
+        async with self._semaphore:
+            browser = await self._acquire_browser()
+            try:
+                context = await browser.new_context(**context_options)
+                try:
+                    yield context
+                finally:
+                    await context.close()
+            finally:
+                self._usage[browser]["active"] -= 1
+                await self._close_if_idle(browser)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "pages_served": self.pages_served,
+            "recycles": self.recycles,
+            "browsers": len(self._usage),
+            "active_contexts": sum(u["active"] for u in self._usage.values()),
+        }
+
+browser_pool = BrowserPool(
+    max_pages=settings.BROWSER_MAX_PAGES,
+    recycle_after_pages=settings.BROWSER_RECYCLE_AFTER_PAGES,
+    max_rss_mb=settings.BROWSER_MAX_RSS_MB,
+    rss_check_interval=settings.BROWSER_RSS_CHECK_INTERVAL,
+)
@@ -0,0 +1,108 @@
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import settings
+
+def _normalize(name: str) -> str:
+    return name.strip().rstrip(".").lower()
+
+def is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+class DNSCache:
+    """
+    Process-wide cache of DNS answers shared by the tool layer.
+    Positive answers live for the record TTL (clamped to max_ttl), negative
+    answers (NXDOMAIN / no data) for negative_ttl, and the least recently used
+    entry is evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int = 4096, negative_ttl: float = 60, max_ttl: float = 3600):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, rtype: str) -> Optional[Any]:
+        """Return the cached answer (a list of records or an error dict), or None on a miss."""
+        key = (_normalize(name), rtype.upper())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, name: str, rtype: str, value: Any, ttl: float) -> None:
+        ttl = min(max(ttl, 0), self.max_ttl)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        key = (_normalize(name), rtype.upper())
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put_negative(self, name: str, rtype: str, value: Any) -> None:
+        self.put(name, rtype, value, self.negative_ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+dns_cache = DNSCache(
+    max_entries=settings.DNS_CACHE_MAX_ENTRIES,
+    negative_ttl=settings.DNS_NEGATIVE_TTL,
+)
+
+def cached_addresses(host: str) -> List[str]:
+    """
+    Addresses for host taken only from the cache (A first, then AAAA).
+    IP literals are returned as-is; an empty list means the caller should
+    fall back to the system resolver.
+    """
+    if is_ip_address(host):
+        return [host.strip("[]")]
+    addresses: List[str] = []
+    for rtype in ("A", "AAAA"):
+        records = dns_cache.get(host, rtype)
+        if isinstance(records, list):
+            addresses.extend(records)
+    return addresses
+
+def addresses_from_records(dns_records: Optional[Dict[str, Any]]) -> List[str]:
+    """Extract A/AAAA addresses from a dns_lookup result."""
+    if not dns_records:
+        return []
+    addresses: List[str] = []
+    for rtype in ("A", "AAAA"):
+        records = dns_records.get("records", {}).get(rtype)
+        if isinstance(records, list):
+            addresses.extend(r for r in records if isinstance(r, str))
+    return addresses
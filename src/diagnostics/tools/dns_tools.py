@@ -1,17 +1,74 @@
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional
+import dns.asyncresolver
+import dns.rdatatype
 import dns.resolver
+from ..config import settings
+from .dns_cache import dns_cache, cached_addresses, addresses_from_records
+from .runtime import run_sync
 
-def _safe_query(domain: str, rtype: str):
+def _negative_ttl(answers) -> float:
+    """TTL for an empty answer, taken from the SOA in the authority section when present."""
+    for rrset in getattr(answers.response, "authority", []):
+        if rrset.rdtype == dns.rdatatype.SOA and len(rrset):
+            return min(rrset.ttl, rrset[0].minimum)
+    return dns_cache.negative_ttl
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else dict(value)
+
+async def _safe_query_async(domain: str, rtype: str, lifetime: float):
+    cached = dns_cache.get(domain, rtype)
+    if cached is not None:
+        return _copy(cached)
     try:
-        answers = dns.resolver.resolve(domain, rtype, raise_on_no_answer=False)
-        return [a.to_text() for a in answers] if answers else []
+        answers = await dns.asyncresolver.resolve(domain, rtype, raise_on_no_answer=False, lifetime=lifetime)
+        if answers.rrset is not None:
+            records = [a.to_text() for a in answers]
+            dns_cache.put(domain, rtype, records, answers.rrset.ttl)
+        else:
+            records = []
+            dns_cache.put(domain, rtype, records, _negative_ttl(answers))
+        return _copy(records)
+    except dns.resolver.NXDOMAIN as e:
+        error = {"error": str(e)}
+        dns_cache.put_negative(domain, rtype, error)
+        return _copy(error)
     except Exception as e:
         return {"error": str(e)}
 
-def dns_lookup(domain: str, record_types: List[str]) -> Dict[str, Any]:
+async def dns_lookup_async(domain: str, record_types: List[str], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Query all record types at once with the async resolver.
+    The whole lookup shares one deadline; record types that have not answered
+    by then are reported as timed out instead of stacking per-query waits.
+    Answers are served from and stored in the shared DNS cache.
+    """
+    deadline = settings.DNS_LOOKUP_DEADLINE if deadline is None else deadline
     data: Dict[str, Any] = {"domain": domain, "records": {}}
-    for r in record_types:
-        data["records"][r] = _safe_query(domain, r)
+    tasks = {
+        r: asyncio.ensure_future(_safe_query_async(domain, r, deadline))
+        for r in record_types
+    }
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+    for r, task in tasks.items():
+        if task.done():
+            data["records"][r] = task.result()
+        else:
+            task.cancel()
+            data["records"][r] = {"error": f"DNS lookup deadline of {deadline}s exceeded"}
     return data
 
+def dns_lookup(domain: str, record_types: List[str]) -> Dict[str, Any]:
+    return run_sync(dns_lookup_async(domain, record_types))
+
+async def resolve_addresses_async(host: str) -> List[str]:
+    """Resolve host to A/AAAA addresses through the shared cache."""
+    addresses = cached_addresses(host)
+    if addresses:
+        return addresses
+    return addresses_from_records(await dns_lookup_async(host, ["A", "AAAA"]))
 
+def resolve_addresses(host: str) -> List[str]:
+    return run_sync(resolve_addresses_async(host))
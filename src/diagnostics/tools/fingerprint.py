@@ -0,0 +1,75 @@
+from typing import Dict, FrozenSet
+
+# Every lowercase literal the http_tools detectors look for in a page body.
+# Detectors may only ask about patterns listed here (Fingerprint.has enforces it).
+BODY_PATTERNS: FrozenSet[str] = frozenset([
+    # Frameworks / static site generators (detect_programming_language)
+    "wordpress", "laravel", "drupal", "joomla", "magento",
+    "django", "flask", "fastapi",
+    "express", "next.js", "nextjs", "react",
+    "rails", "spring",
+    "jekyll", "hugo", "gatsby",
+    # Parking / expired domain pages (detect_domain_expired_page)
+    "landing page", "domain expired", "parking-lander", "wsimg.com/parking-lander",
+    "window.lander_system", "window.lander_system = \"pw\"",
+    "window.location.href=\"/lander\"", "window.onload=function(){window.location.href=\"/lander\"}",
+    "namecheap", "domain parking", "expired domain",
+    "google", "domains", "parking", "googleadservices",
+    "cloudflare", "1101",
+    "domain has expired", "domain is expired", "parking page", "domain for sale",
+    "buy this domain", "domain auction", "domain marketplace", "domain broker", "domain registrar",
+    # CMS and plugins (detect_cms_and_plugins)
+    "wp-content", "wp-includes",
+    "woocommerce", "yoast", "yoast seo", "contact-form-7", "wpcf7", "jetpack", "elementor",
+])
+
+class Fingerprint:
+    """
+    A page body lowercased once, plus the set of known patterns found in it.
+    Patterns are searched on first use and the answer is memoized, so every
+    pattern costs at most one C-level substring scan per body no matter how
+    many detectors ask about it, and patterns no detector reaches cost nothing.
+    (A single-pass Python or large-alternation regex matcher measured slower
+    than this for the pattern count involved.)
+    """
+
+    __slots__ = ("body", "lowered", "length", "_checked", "_checked_exact")
+
+    def __init__(self, body: str):
+        self.body = body
+        self.lowered = body.lower()
+        self.length = len(body)
+        self._checked: Dict[str, bool] = {}
+        self._checked_exact: Dict[str, bool] = {}
+
+    def has(self, *patterns: str) -> bool:
+        """True if any of the given patterns occurs in the body."""
+        for pattern in patterns:
+            found = self._checked.get(pattern)
+            if found is None:
+                if pattern not in BODY_PATTERNS:
+                    raise ValueError(f"Pattern {pattern!r} is not registered in BODY_PATTERNS")
+                found = self._checked[pattern] = pattern in self.lowered
+            if found:
+                return True
+        return False
+
+    def has_exact(self, *patterns: str) -> bool:
+        """Like has(), but matched case-sensitively against the original body."""
+        for pattern in patterns:
+            found = self._checked_exact.get(pattern)
+            if found is None:
+                if pattern not in BODY_PATTERNS:
+                    raise ValueError(f"Pattern {pattern!r} is not registered in BODY_PATTERNS")
+                found = self._checked_exact[pattern] = pattern in self.body
+            if found:
+                return True
+        return False
+
+    @property
+    def matches(self) -> FrozenSet[str]:
+        """All registered patterns present in the body (forces a full scan)."""
+        return frozenset(p for p in BODY_PATTERNS if self.has(p))
+
+def fingerprint_body(body: str) -> Fingerprint:
+    return Fingerprint(body)
@@ -1,238 +1,258 @@
-from typing import Dict, Any, List
-import socket
+from typing import Dict, Any, List, Pattern, Tuple
 import re
+from .dns_cache import addresses_from_records
+from .dns_tools import resolve_addresses_async
+from .runtime import run_sync
 
-def hosting_provider_detect(domain: str, dns_records: Dict[str, Any] = None, tls_info: Dict[str, Any] = None) -> Dict[str, Any]:
+PROVIDERS: Dict[str, Dict[str, Any]] = {
+    "godaddy": {
+        "name": "GoDaddy",
+        "indicators": [
+            r"godaddy\.com",
+            r"secureserver\.net",
+            r"gdns\.net",
+            r"gdns\.com",
+            r"godaddysites\.com"
+        ],
+        "dashboard_url": "https://sso.godaddy.com/",
+        "instructions": "Log into your GoDaddy account and go to the DNS management section to update your records.",
+        "support_url": "https://www.godaddy.com/help"
+    },
+    "cloudflare": {
+        "name": "Cloudflare",
+        "indicators": [
+            r"cloudflare\.com",
+            r"cloudflare\.net",
+            r"1\.1\.1\.1",
+            r"1\.0\.0\.1"
+        ],
+        "dashboard_url": "https://dash.cloudflare.com/",
+        "instructions": "Access your Cloudflare dashboard and go to the DNS section to manage your records.",
+        "support_url": "https://support.cloudflare.com/"
+    },
+    "aws": {
+        "name": "Amazon Web Services (AWS)",
+        "indicators": [
+            r"amazonaws\.com",
+            r"route53\.amazonaws\.com",
+            r"elasticbeanstalk\.com",
+            r"cloudfront\.net"
+        ],
+        "dashboard_url": "https://console.aws.amazon.com/",
+        "instructions": "Log into AWS Console and navigate to Route 53 for DNS management.",
+        "support_url": "https://aws.amazon.com/support/",
+        "certificate_management": {
+            "acm": {
+                "name": "AWS Certificate Manager (ACM)",
+                "detection": {
+                    "issuer_patterns": [
+                        r"Amazon",
+                        r"Amazon Web Services",
+                        r"ACM"
+                    ],
+                    "subject_patterns": [
+                        r"Amazon",
+                        r"ACM"
+                    ]
+                },
+                "instructions": "1) Log into AWS Console at https://console.aws.amazon.com/, 2) Navigate to Certificate Manager (ACM), 3) Find your certificate and click 'Renew' or 'Request Certificate', 4) Follow the validation process",
+                "dashboard_url": "https://console.aws.amazon.com/acm/"
+            },
+            "certbot": {
+                "name": "Certbot (Let's Encrypt)",
+                "detection": {
+                    "issuer_patterns": [
+                        r"Let's Encrypt",
+                        r"Let's Encrypt Authority",
+                        r"ISRG"
+                    ],
+                    "subject_patterns": [
+                        r"Let's Encrypt"
+                    ]
+                },
+                "instructions": "Your certificate is managed by Certbot (Let's Encrypt). To renew: 1) SSH into your EC2 instance, 2) Run 'sudo certbot renew' to renew all certificates, 3) Or run 'sudo certbot renew --cert-name your-domain.com' for a specific certificate, 4) Restart your web server if needed (sudo systemctl reload nginx/apache2)",
+                "dashboard_url": None,
+                "support_url": "https://certbot.eff.org/instructions"
+            }
+        }
+    },
+    "google": {
+        "name": "Google Cloud Platform",
+        "indicators": [
+            r"googleapis\.com",
+            r"googleusercontent\.com",
+            r"googlehosted\.com"
+        ],
+        "dashboard_url": "https://console.cloud.google.com/",
+        "instructions": "Access Google Cloud Console and go to Cloud DNS to manage your records.",
+        "support_url": "https://cloud.google.com/support"
+    },
+    "namecheap": {
+        "name": "Namecheap",
+        "indicators": [
+            r"namecheap\.com",
+            r"registrar-servers\.com"
+        ],
+        "dashboard_url": "https://ap.www.namecheap.com/",
+        "instructions": "Log into your Namecheap account and go to Domain List > Manage > Advanced DNS.",
+        "support_url": "https://www.namecheap.com/support/"
+    },
+    "hostgator": {
+        "name": "HostGator",
+        "indicators": [
+            r"hostgator\.com",
+            r"hostgator\.net"
+        ],
+        "dashboard_url": "https://portal.hostgator.com/",
+        "instructions": "Access your HostGator control panel and navigate to DNS Zone Editor.",
+        "support_url": "https://www.hostgator.com/support"
+    },
+    "bluehost": {
+        "name": "Bluehost",
+        "indicators": [
+            r"bluehost\.com",
+            r"bluehost\.net"
+        ],
+        "dashboard_url": "https://my.bluehost.com/",
+        "instructions": "Log into your Bluehost control panel and go to the DNS Zone Editor.",
+        "support_url": "https://www.bluehost.com/support"
+    },
+    "dreamhost": {
+        "name": "DreamHost",
+        "indicators": [
+            r"dreamhost\.com",
+            r"dreamhosters\.com"
+        ],
+        "dashboard_url": "https://panel.dreamhost.com/",
+        "instructions": "Access your DreamHost panel and navigate to Domains > DNS.",
+        "support_url": "https://help.dreamhost.com/"
+    },
+    "digitalocean": {
+        "name": "DigitalOcean",
+        "indicators": [
+            r"digitalocean\.com",
+            r"ondigitalocean\.app"
+        ],
+        "dashboard_url": "https://cloud.digitalocean.com/",
+        "instructions": "Log into DigitalOcean and go to Networking > Domains to manage DNS.",
+        "support_url": "https://www.digitalocean.com/support"
+    },
+    "vercel": {
+        "name": "Vercel",
+        "indicators": [
+            r"vercel\.app",
+            r"vercel\.com"
+        ],
+        "dashboard_url": "https://vercel.com/dashboard",
+        "instructions": "Access your Vercel dashboard and go to your project's Domains section.",
+        "support_url": "https://vercel.com/support"
+    },
+    "netlify": {
+        "name": "Netlify",
+        "indicators": [
+            r"netlify\.app",
+            r"netlify\.com"
+        ],
+        "dashboard_url": "https://app.netlify.com/",
+        "instructions": "Log into Netlify and go to your site's Domain management section.",
+        "support_url": "https://docs.netlify.com/"
+    }
+}
+
+def _compile_indicator_index(providers: Dict[str, Dict[str, Any]]) -> Tuple[Pattern, Dict[str, str]]:
+    """
+    Fold every provider's indicators into one case-insensitive alternation with a
+    named group per provider, so a record is matched against all providers in a
+    single scan. Returns the pattern and a group-name -> provider id map.
+    """
+    groups: Dict[str, str] = {}
+    alternatives = []
+    for i, (provider_id, info) in enumerate(providers.items()):
+        group = f"p{i}"
+        groups[group] = provider_id
+        alternatives.append(f"(?P<{group}>{'|'.join(info['indicators'])})")
+    return re.compile("|".join(alternatives), re.IGNORECASE), groups
+
+_INDICATOR_RE, _INDICATOR_GROUPS = _compile_indicator_index(PROVIDERS)
+_PROVIDER_ORDER = {provider_id: i for i, provider_id in enumerate(PROVIDERS)}
+
+# Certificate-management detection patterns, compiled once per provider
+_CERT_PATTERNS: Dict[str, Dict[str, Tuple[Pattern, Pattern]]] = {
+    provider_id: {
+        cert_type: (
+            re.compile("|".join(cert_info["detection"]["issuer_patterns"]), re.IGNORECASE),
+            re.compile("|".join(cert_info["detection"]["subject_patterns"]), re.IGNORECASE),
+        )
+        for cert_type, cert_info in info["certificate_management"].items()
+    }
+    for provider_id, info in PROVIDERS.items()
+    if "certificate_management" in info
+}
+
+def match_providers(value: str) -> List[str]:
+    """Provider ids whose indicators occur in value, in PROVIDERS order."""
+    # finditer reports non-overlapping matches; no provider's indicator overlaps another's
+    found = {_INDICATOR_GROUPS[m.lastgroup] for m in _INDICATOR_RE.finditer(value)}
+    return sorted(found, key=_PROVIDER_ORDER.__getitem__)
+
+async def hosting_provider_detect_async(domain: str, dns_records: Dict[str, Any] = None, tls_info: Dict[str, Any] = None) -> Dict[str, Any]:
     """
     Detect hosting provider based on DNS records, IP addresses, and TLS certificate information.
     Returns provider info with specific instructions and dashboard links, including certificate management.
     """
-    
-    providers = {
-        "godaddy": {
-            "name": "GoDaddy",
-            "indicators": [
-                r"godaddy\.com",
-                r"secureserver\.net",
-                r"gdns\.net",
-                r"gdns\.com",
-                r"godaddysites\.com"
-            ],
-            "dashboard_url": "https://sso.godaddy.com/",
-            "instructions": "Log into your GoDaddy account and go to the DNS management section to update your records.",
-            "support_url": "https://www.godaddy.com/help"
-        },
-        "cloudflare": {
-            "name": "Cloudflare",
-            "indicators": [
-                r"cloudflare\.com",
-                r"cloudflare\.net",
-                r"1\.1\.1\.1",
-                r"1\.0\.0\.1"
-            ],
-            "dashboard_url": "https://dash.cloudflare.com/",
-            "instructions": "Access your Cloudflare dashboard and go to the DNS section to manage your records.",
-            "support_url": "https://support.cloudflare.com/"
-        },
-        "aws": {
-            "name": "Amazon Web Services (AWS)",
-            "indicators": [
-                r"amazonaws\.com",
-                r"route53\.amazonaws\.com",
-                r"elasticbeanstalk\.com",
-                r"cloudfront\.net"
-            ],
-            "dashboard_url": "https://console.aws.amazon.com/",
-            "instructions": "Log into AWS Console and navigate to Route 53 for DNS management.",
-            "support_url": "https://aws.amazon.com/support/",
-            "certificate_management": {
-                "acm": {
-                    "name": "AWS Certificate Manager (ACM)",
-                    "detection": {
-                        "issuer_patterns": [
-                            r"Amazon",
-                            r"Amazon Web Services",
-                            r"ACM"
-                        ],
-                        "subject_patterns": [
-                            r"Amazon",
-                            r"ACM"
-                        ]
-                    },
-                    "instructions": "1) Log into AWS Console at https://console.aws.amazon.com/, 2) Navigate to Certificate Manager (ACM), 3) Find your certificate and click 'Renew' or 'Request Certificate', 4) Follow the validation process",
-                    "dashboard_url": "https://console.aws.amazon.com/acm/"
-                },
-                "certbot": {
-                    "name": "Certbot (Let's Encrypt)",
-                    "detection": {
-                        "issuer_patterns": [
-                            r"Let's Encrypt",
-                            r"Let's Encrypt Authority",
-                            r"ISRG"
-                        ],
-                        "subject_patterns": [
-                            r"Let's Encrypt"
-                        ]
-                    },
-                    "instructions": "Your certificate is managed by Certbot (Let's Encrypt). To renew: 1) SSH into your EC2 instance, 2) Run 'sudo certbot renew' to renew all certificates, 3) Or run 'sudo certbot renew --cert-name your-domain.com' for a specific certificate, 4) Restart your web server if needed (sudo systemctl reload nginx/apache2)",
-                    "dashboard_url": None,
-                    "support_url": "https://certbot.eff.org/instructions"
-                }
-            }
-        },
-        "google": {
-            "name": "Google Cloud Platform",
-            "indicators": [
-                r"googleapis\.com",
-                r"googleusercontent\.com",
-                r"googlehosted\.com"
-            ],
-            "dashboard_url": "https://console.cloud.google.com/",
-            "instructions": "Access Google Cloud Console and go to Cloud DNS to manage your records.",
-            "support_url": "https://cloud.google.com/support"
-        },
-        "namecheap": {
-            "name": "Namecheap",
-            "indicators": [
-                r"namecheap\.com",
-                r"registrar-servers\.com"
-            ],
-            "dashboard_url": "https://ap.www.namecheap.com/",
-            "instructions": "Log into your Namecheap account and go to Domain List > Manage > Advanced DNS.",
-            "support_url": "https://www.namecheap.com/support/"
-        },
-        "hostgator": {
-            "name": "HostGator",
-            "indicators": [
-                r"hostgator\.com",
-                r"hostgator\.net"
-            ],
-            "dashboard_url": "https://portal.hostgator.com/",
-            "instructions": "Access your HostGator control panel and navigate to DNS Zone Editor.",
-            "support_url": "https://www.hostgator.com/support"
-        },
-        "bluehost": {
-            "name": "Bluehost",
-            "indicators": [
-                r"bluehost\.com",
-                r"bluehost\.net"
-            ],
-            "dashboard_url": "https://my.bluehost.com/",
-            "instructions": "Log into your Bluehost control panel and go to the DNS Zone Editor.",
-            "support_url": "https://www.bluehost.com/support"
-        },
-        "dreamhost": {
-            "name": "DreamHost",
-            "indicators": [
-                r"dreamhost\.com",
-                r"dreamhosters\.com"
-            ],
-            "dashboard_url": "https://panel.dreamhost.com/",
-            "instructions": "Access your DreamHost panel and navigate to Domains > DNS.",
-            "support_url": "https://help.dreamhost.com/"
-        },
-        "digitalocean": {
-            "name": "DigitalOcean",
-            "indicators": [
-                r"digitalocean\.com",
-                r"ondigitalocean\.app"
-            ],
-            "dashboard_url": "https://cloud.digitalocean.com/",
-            "instructions": "Log into DigitalOcean and go to Networking > Domains to manage DNS.",
-            "support_url": "https://www.digitalocean.com/support"
-        },
-        "vercel": {
-            "name": "Vercel",
-            "indicators": [
-                r"vercel\.app",
-                r"vercel\.com"
-            ],
-            "dashboard_url": "https://vercel.com/dashboard",
-            "instructions": "Access your Vercel dashboard and go to your project's Domains section.",
-            "support_url": "https://vercel.com/support"
-        },
-        "netlify": {
-            "name": "Netlify",
-            "indicators": [
-                r"netlify\.app",
-                r"netlify\.com"
-            ],
-            "dashboard_url": "https://app.netlify.com/",
-            "instructions": "Log into Netlify and go to your site's Domain management section.",
-            "support_url": "https://docs.netlify.com/"
-        }
+    # Reuse addresses from the supplied DNS records or the shared cache
+    ip_addresses = addresses_from_records(dns_records)
+    if not ip_addresses:
+        try:
+            ip_addresses = await resolve_addresses_async(domain)
+        except Exception:
+            ip_addresses = []
+    return _detect_hosting_provider(domain, dns_records, tls_info, ip_addresses)
+
+def hosting_provider_detect(domain: str, dns_records: Dict[str, Any] = None, tls_info: Dict[str, Any] = None) -> Dict[str, Any]:
+    return run_sync(hosting_provider_detect_async(domain, dns_records, tls_info))
+
+def _provider_entry(provider_id: str, confidence: str, detected_from: str) -> Dict[str, Any]:
+    provider_info = PROVIDERS[provider_id]
+    return {
+        "id": provider_id,
+        "name": provider_info["name"],
+        "confidence": confidence,
+        "detected_from": detected_from,
+        "dashboard_url": provider_info["dashboard_url"],
+        "instructions": provider_info["instructions"],
+        "support_url": provider_info["support_url"]
     }
-    
+
+def _detect_hosting_provider(domain: str, dns_records: Dict[str, Any], tls_info: Dict[str, Any], ip_addresses: List[str]) -> Dict[str, Any]:
     detected_providers = []
+    seen = set()
     
-    # Check DNS records if provided
+    # Check DNS records (including nameservers) if provided
     if dns_records:
         for record_type, records in dns_records.get("records", {}).items():
             if isinstance(records, list):
                 for record in records:
                     if isinstance(record, str):
-                        for provider_id, provider_info in providers.items():
-                            for indicator in provider_info["indicators"]:
-                                if re.search(indicator, record, re.IGNORECASE):
-                                    if provider_id not in [p["id"] for p in detected_providers]:
-                                        detected_providers.append({
-                                            "id": provider_id,
-                                            "name": provider_info["name"],
-                                            "confidence": "high",
-                                            "detected_from": f"DNS {record_type} record",
-                                            "dashboard_url": provider_info["dashboard_url"],
-                                            "instructions": provider_info["instructions"],
-                                            "support_url": provider_info["support_url"]
-                                        })
+                        for provider_id in match_providers(record):
+                            if provider_id not in seen:
+                                seen.add(provider_id)
+                                detected_providers.append(_provider_entry(provider_id, "high", f"DNS {record_type} record"))
     
-    # Check nameservers specifically
-    if dns_records and "NS" in dns_records.get("records", {}):
-        ns_records = dns_records["records"]["NS"]
-        if isinstance(ns_records, list):
-            for ns_record in ns_records:
-                if isinstance(ns_record, str):
-                    for provider_id, provider_info in providers.items():
-                        for indicator in provider_info["indicators"]:
-                            if re.search(indicator, ns_record, re.IGNORECASE):
-                                if provider_id not in [p["id"] for p in detected_providers]:
-                                    detected_providers.append({
-                                        "id": provider_id,
-                                        "name": provider_info["name"],
-                                        "confidence": "high",
-                                        "detected_from": "nameserver",
-                                        "dashboard_url": provider_info["dashboard_url"],
-                                        "instructions": provider_info["instructions"],
-                                        "support_url": provider_info["support_url"]
-                                    })
-    
-    # Try to resolve domain and check IP-based detection
-    try:
-        ip_addresses = socket.gethostbyname_ex(domain)[2]
-        for ip in ip_addresses:
-            for provider_id, provider_info in providers.items():
-                for indicator in provider_info["indicators"]:
-                    if re.search(indicator, ip, re.IGNORECASE):
-                        if provider_id not in [p["id"] for p in detected_providers]:
-                            detected_providers.append({
-                                "id": provider_id,
-                                "name": provider_info["name"],
-                                "confidence": "medium",
-                                "detected_from": f"IP address {ip}",
-                                "dashboard_url": provider_info["dashboard_url"],
-                                "instructions": provider_info["instructions"],
-                                "support_url": provider_info["support_url"]
-                            })
-    except Exception:
-        pass
+    # Check IP-based detection
+    for ip in ip_addresses:
+        for provider_id in match_providers(ip):
+            if provider_id not in seen:
+                seen.add(provider_id)
+                detected_providers.append(_provider_entry(provider_id, "medium", f"IP address {ip}"))
     
     # Detect certificate management method if TLS info is provided
     certificate_management = None
     if tls_info and detected_providers:
-        primary_provider = detected_providers[0]
-        provider_id = primary_provider["id"]
+        provider_id = detected_providers[0]["id"]
         
-        if provider_id in providers and "certificate_management" in providers[provider_id]:
-            cert_management_options = providers[provider_id]["certificate_management"]
+        if provider_id in _CERT_PATTERNS:
+            cert_management_options = PROVIDERS[provider_id]["certificate_management"]
             
             # Check certificate issuer and subject (now dictionaries)
             issuer = tls_info.get("issuer", {})
@@ -242,18 +262,9 @@ def hosting_provider_detect(domain: str, dns_records: Dict[str, Any] = None, tls
             issuer_str = " ".join(str(v) for v in issuer.values()) if isinstance(issuer, dict) else str(issuer)
             subject_str = " ".join(str(v) for v in subject.values()) if isinstance(subject, dict) else str(subject)
             
-            for cert_type, cert_info in cert_management_options.items():
-                detection = cert_info["detection"]
-                
-                # Check issuer patterns
-                issuer_match = any(re.search(pattern, issuer_str, re.IGNORECASE) 
-                                  for pattern in detection["issuer_patterns"])
-                
-                # Check subject patterns
-                subject_match = any(re.search(pattern, subject_str, re.IGNORECASE) 
-                                   for pattern in detection["subject_patterns"])
-                
-                if issuer_match or subject_match:
+            for cert_type, (issuer_re, subject_re) in _CERT_PATTERNS[provider_id].items():
+                if issuer_re.search(issuer_str) or subject_re.search(subject_str):
+                    cert_info = cert_management_options[cert_type]
                     certificate_management = {
                         "type": cert_type,
                         "name": cert_info["name"],
@@ -263,21 +274,6 @@ def hosting_provider_detect(domain: str, dns_records: Dict[str, Any] = None, tls
                     }
                     break
     
-    # If no specific provider detected, check for common patterns
-    if not detected_providers:
-        # Check for common hosting patterns
-        common_patterns = {
-            "shared_hosting": {
-                "name": "Shared Hosting Provider",
-                "indicators": [r"cpanel", r"plesk", r"webmail"],
-                "instructions": "Contact your hosting provider's support for DNS management assistance.",
-                "support_url": "https://www.google.com/search?q=hosting+provider+support"
-            }
-        }
-        
-        # This would require additional HTTP checks to detect cPanel/Plesk
-        # For now, we'll return a generic response
-    
     return {
         "domain": domain,
         "detected_providers": detected_providers,
@@ -0,0 +1,140 @@
+import asyncio
+import importlib.util
+import logging
+import threading
+import weakref
+from contextvars import ContextVar
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, List, Optional
+import httpx
+import httpcore
+from ..config import settings
+from .dns_cache import cached_addresses
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "DiagBot/1.0"
+
+# Per-call address pins (host -> addresses) set by probes and read by the network backend.
+pinned_addresses: ContextVar[Dict[str, List[str]]] = ContextVar("pinned_addresses", default={})
+
+class PinnedBackend(httpcore.SyncBackend):
+    """
+    Network backend that connects to addresses already resolved by dns_lookup
+    instead of re-resolving the hostname. TLS SNI and certificate checks still
+    use the hostname from the URL, since httpcore passes it separately.
+    """
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = pinned_addresses.get().get(host) or cached_addresses(host)
+        last_error = None
+        for address in addresses:
+            try:
+                return super().connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        if last_error is not None:
+            raise last_error
+        return super().connect_tcp(host, port, timeout, local_address, socket_options)
+
+class AsyncPinnedBackend(httpcore.AnyIOBackend):
+    """Async counterpart of PinnedBackend."""
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = pinned_addresses.get().get(host) or cached_addresses(host)
+        last_error = None
+        for address in addresses:
+            try:
+                return await super().connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        if last_error is not None:
+            raise last_error
+        return await super().connect_tcp(host, port, timeout, local_address, socket_options)
+
+def pinned_transport(**kwargs) -> httpx.HTTPTransport:
+    transport = httpx.HTTPTransport(**kwargs)
+    # httpx does not expose httpcore's network_backend option, so swap it in on the pool it built.
+    pool = getattr(transport, "_pool", None)
+    if isinstance(pool, httpcore.ConnectionPool):
+        pool._network_backend = PinnedBackend()
+    return transport
+
+def async_pinned_transport(**kwargs) -> httpx.AsyncHTTPTransport:
+    transport = httpx.AsyncHTTPTransport(**kwargs)
+    pool = getattr(transport, "_pool", None)
+    if isinstance(pool, httpcore.AsyncConnectionPool):
+        pool._network_backend = AsyncPinnedBackend()
+    return transport
+
+def _http2_enabled() -> bool:
+    if not settings.HTTP_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+def _no_cookies() -> CookieJar:
+    # The client is shared across diagnoses, so never carry cookies from one target to the next
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+# Async connections are bound to the loop that opened them, so keep one client per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def get_http_client() -> httpx.Client:
+    """
+    Return the app-wide pooled client, creating it on first use.
+    Connections are kept alive between probes; callers pass per-request
+    follow_redirects/timeout overrides to client.request/stream.
+    """
+    global _client
+    if _client is not None and not _client.is_closed:
+        return _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                transport=pinned_transport(limits=_limits(), http2=_http2_enabled()),
+                headers={"User-Agent": USER_AGENT},
+                cookies=_no_cookies(),
+                timeout=settings.HTTP_TIMEOUT,
+            )
+            logger.info(f"Created pooled HTTP client (max_connections={settings.HTTP_MAX_CONNECTIONS})")
+    return _client
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the pooled async client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            transport=async_pinned_transport(limits=_limits(), http2=_http2_enabled()),
+            headers={"User-Agent": USER_AGENT},
+            cookies=_no_cookies(),
+            timeout=settings.HTTP_TIMEOUT,
+        )
+        _async_clients[loop] = client
+    return client
+
+def close_http_clients() -> None:
+    """Close the sync pooled client; called on app shutdown."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+async def aclose_http_clients() -> None:
+    """Close the async pooled client of the running event loop, if one was created."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -1,6 +1,22 @@
+import codecs
 import httpx
 import re
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from ..config import settings
+from .. import timing
+from .fingerprint import Fingerprint, fingerprint_body
+from .http_client import get_http_client, get_async_http_client, pinned_addresses
+
+_SERVER_VERSION_RES = {
+    "Apache": re.compile(r'apache[/\s](\d+\.\d+)', re.IGNORECASE),
+    "Nginx": re.compile(r'nginx[/\s](\d+\.\d+)', re.IGNORECASE),
+    "IIS": re.compile(r'iis[/\s](\d+)', re.IGNORECASE),
+}
+_WP_VERSION_RE = re.compile(r'<meta name="generator" content="WordPress ([^"]+)"', re.IGNORECASE)
+_WP_THEME_RE = re.compile(r'wp-content/themes/([^/"]+)', re.IGNORECASE)
+_DRUPAL_VERSION_RE = re.compile(r'Drupal ([0-9.]+)', re.IGNORECASE)
+_JOOMLA_VERSION_RE = re.compile(r'Joomla! ([0-9.]+)', re.IGNORECASE)
+_MAGENTO_VERSION_RE = re.compile(r'Magento/([0-9.]+)', re.IGNORECASE)
 
 def detect_web_server(headers: Dict[str, str]) -> Dict[str, Any]:
     """Detect web server from headers and other indicators"""
@@ -10,30 +26,28 @@ def detect_web_server(headers: Dict[str, str]) -> Dict[str, Any]:
     server_header = headers.get("server", "").lower()
     if "apache" in server_header:
         server_info["type"] = "Apache"
-        # Extract version if present
-        version_match = re.search(r'apache[/\s](\d+\.\d+)', server_header, re.IGNORECASE)
-        if version_match:
-            server_info["version"] = version_match.group(1)
     elif "nginx" in server_header:
         server_info["type"] = "Nginx"
-        version_match = re.search(r'nginx[/\s](\d+\.\d+)', server_header, re.IGNORECASE)
-        if version_match:
-            server_info["version"] = version_match.group(1)
     elif "iis" in server_header or "microsoft" in server_header:
         server_info["type"] = "IIS"
-        version_match = re.search(r'iis[/\s](\d+)', server_header, re.IGNORECASE)
-        if version_match:
-            server_info["version"] = version_match.group(1)
     elif "cloudflare" in server_header:
         server_info["type"] = "Cloudflare"
     elif "cloudfront" in server_header:
         server_info["type"] = "CloudFront"
     
+    # Extract version if present
+    version_re = _SERVER_VERSION_RES.get(server_info["type"])
+    if version_re:
+        version_match = version_re.search(server_header)
+        if version_match:
+            server_info["version"] = version_match.group(1)
+    
     return server_info
 
-def detect_programming_language(headers: Dict[str, str], body: str) -> Dict[str, Any]:
+def detect_programming_language(headers: Dict[str, str], body: str, fp: Optional[Fingerprint] = None) -> Dict[str, Any]:
     """Detect programming language and framework from headers and body"""
     lang_info = {"language": "unknown", "framework": "unknown", "details": ""}
+    fp = fp or fingerprint_body(body)
     
     # Check headers for language indicators
     content_type = headers.get("content-type", "").lower()
@@ -43,47 +57,47 @@ def detect_programming_language(headers: Dict[str, str], body: str) -> Dict[str,
     if "php" in x_powered_by or "php" in content_type:
         lang_info["language"] = "PHP"
         # Detect common PHP frameworks
-        if "wordpress" in body.lower():
+        if fp.has("wordpress"):
             lang_info["framework"] = "WordPress"
-        elif "laravel" in body.lower() or "laravel" in x_powered_by:
+        elif fp.has("laravel") or "laravel" in x_powered_by:
             lang_info["framework"] = "Laravel"
-        elif "drupal" in body.lower():
+        elif fp.has("drupal"):
             lang_info["framework"] = "Drupal"
-        elif "joomla" in body.lower():
+        elif fp.has("joomla"):
             lang_info["framework"] = "Joomla"
-        elif "magento" in body.lower():
+        elif fp.has("magento"):
             lang_info["framework"] = "Magento"
     
     # Python detection
     elif "python" in x_powered_by or "django" in x_powered_by or "flask" in x_powered_by:
         lang_info["language"] = "Python"
-        if "django" in x_powered_by or "django" in body.lower():
+        if "django" in x_powered_by or fp.has("django"):
             lang_info["framework"] = "Django"
-        elif "flask" in x_powered_by or "flask" in body.lower():
+        elif "flask" in x_powered_by or fp.has("flask"):
             lang_info["framework"] = "Flask"
-        elif "fastapi" in body.lower():
+        elif fp.has("fastapi"):
             lang_info["framework"] = "FastAPI"
     
     # Node.js detection
     elif "node" in x_powered_by or "express" in x_powered_by:
         lang_info["language"] = "JavaScript (Node.js)"
-        if "express" in x_powered_by or "express" in body.lower():
+        if "express" in x_powered_by or fp.has("express"):
             lang_info["framework"] = "Express.js"
-        elif "next.js" in body.lower() or "nextjs" in body.lower():
+        elif fp.has("next.js", "nextjs"):
             lang_info["framework"] = "Next.js"
-        elif "react" in body.lower():
+        elif fp.has("react"):
             lang_info["framework"] = "React"
     
     # Ruby detection
     elif "ruby" in x_powered_by or "rails" in x_powered_by:
         lang_info["language"] = "Ruby"
-        if "rails" in x_powered_by or "rails" in body.lower():
+        if "rails" in x_powered_by or fp.has("rails"):
             lang_info["framework"] = "Ruby on Rails"
     
     # Java detection
     elif "java" in x_powered_by or "tomcat" in x_powered_by or "jboss" in x_powered_by:
         lang_info["language"] = "Java"
-        if "spring" in x_powered_by or "spring" in body.lower():
+        if "spring" in x_powered_by or fp.has("spring"):
             lang_info["framework"] = "Spring"
         elif "tomcat" in x_powered_by:
             lang_info["framework"] = "Apache Tomcat"
@@ -95,15 +109,15 @@ def detect_programming_language(headers: Dict[str, str], body: str) -> Dict[str,
             lang_info["framework"] = "ASP.NET"
     
     # Static site detection
-    elif "static" in content_type or len(body) < 1000:
+    elif "static" in content_type or fp.length < 1000:
         # Check for common static site generators
-        if "jekyll" in body.lower():
+        if fp.has("jekyll"):
             lang_info["language"] = "Static (Jekyll)"
             lang_info["framework"] = "Jekyll"
-        elif "hugo" in body.lower():
+        elif fp.has("hugo"):
             lang_info["language"] = "Static (Hugo)"
             lang_info["framework"] = "Hugo"
-        elif "gatsby" in body.lower():
+        elif fp.has("gatsby"):
             lang_info["language"] = "Static (Gatsby)"
             lang_info["framework"] = "Gatsby"
         else:
@@ -111,63 +125,64 @@ def detect_programming_language(headers: Dict[str, str], body: str) -> Dict[str,
     
     return lang_info
 
-def detect_domain_expired_page(body: str, url: str) -> Dict[str, Any]:
+def detect_domain_expired_page(body: str, url: str, fp: Optional[Fingerprint] = None) -> Dict[str, Any]:
     """Detect domain expired/parking pages from HTML body and URL"""
     expired_info = {"is_expired_page": False, "provider": "unknown", "details": ""}
-    
-    body_lower = body.lower()
+    fp = fp or fingerprint_body(body)
+    url_lower = url.lower()
     
     # GoDaddy expired domain detection
-    if ("lander" in url.lower() or "/lander" in url.lower()) and (
-        "landing page" in body_lower or 
-        "domain expired" in body_lower or
-        "parking-lander" in body_lower or
-        "wsimg.com/parking-lander" in body_lower or
-        "window.lander_system" in body_lower or
-        "window.lander_system = \"pw\"" in body_lower
+    if "lander" in url_lower and fp.has(
+        "landing page",
+        "domain expired",
+        "parking-lander",
+        "wsimg.com/parking-lander",
+        "window.lander_system",
+        "window.lander_system = \"pw\"",
     ):
         expired_info["is_expired_page"] = True
         expired_info["provider"] = "GoDaddy"
         expired_info["details"] = "Domain has expired and is showing GoDaddy parking page"
     
-    # GoDaddy redirect page detection (initial expired domain page)
-    elif "window.location.href=\"/lander\"" in body or "window.onload=function(){window.location.href=\"/lander\"}" in body:
+    # GoDaddy redirect page detection (initial expired domain page); the
+    # snippet is JavaScript, so it is matched case-sensitively
+    elif fp.has_exact("window.location.href=\"/lander\"", "window.onload=function(){window.location.href=\"/lander\"}"):
         expired_info["is_expired_page"] = True
         expired_info["provider"] = "GoDaddy"
         expired_info["details"] = "Domain has expired and is redirecting to GoDaddy parking page"
     
     # Namecheap expired domain detection
-    elif ("parking" in url.lower() or "expired" in url.lower()) and (
-        "namecheap" in body_lower or
-        "domain parking" in body_lower or
-        "expired domain" in body_lower
+    elif ("parking" in url_lower or "expired" in url_lower) and fp.has(
+        "namecheap",
+        "domain parking",
+        "expired domain",
     ):
         expired_info["is_expired_page"] = True
         expired_info["provider"] = "Namecheap"
         expired_info["details"] = "Domain has expired and is showing Namecheap parking page"
     
     # Google Domains expired detection
-    elif ("google" in body_lower and "domains" in body_lower) and (
-        "domain expired" in body_lower or
-        "parking" in body_lower or
-        "googleadservices" in body_lower
+    elif (fp.has("google") and fp.has("domains")) and fp.has(
+        "domain expired",
+        "parking",
+        "googleadservices",
     ):
         expired_info["is_expired_page"] = True
         expired_info["provider"] = "Google Domains"
         expired_info["details"] = "Domain has expired and is showing Google Domains parking page"
     
     # Cloudflare expired domain detection
-    elif ("cloudflare" in body_lower) and (
-        "domain expired" in body_lower or
-        "parking" in body_lower or
-        "1101" in body_lower  # Cloudflare error code for expired domains
+    elif fp.has("cloudflare") and fp.has(
+        "domain expired",
+        "parking",
+        "1101",  # Cloudflare error code for expired domains
     ):
         expired_info["is_expired_page"] = True
         expired_info["provider"] = "Cloudflare"
         expired_info["details"] = "Domain has expired and is showing Cloudflare parking page"
     
     # Generic expired domain patterns
-    elif any(pattern in body_lower for pattern in [
+    elif fp.has(
         "domain expired",
         "domain has expired", 
         "domain is expired",
@@ -176,116 +191,228 @@ def detect_domain_expired_page(body: str, url: str) -> Dict[str, Any]:
         "parking page",
         "domain for sale",
         "buy this domain",
-        "domain auction"
-    ]):
+        "domain auction",
+    ):
         expired_info["is_expired_page"] = True
         expired_info["provider"] = "Generic"
         expired_info["details"] = "Domain appears to be expired or parked"
     
     # Check for common parking page indicators
-    elif any(indicator in body_lower for indicator in [
+    elif fp.has(
         "parking-lander",
         "domain parking",
         "domain auction",
         "domain marketplace",
         "domain broker",
-        "domain registrar"
-    ]):
+        "domain registrar",
+    ):
         expired_info["is_expired_page"] = True
         expired_info["provider"] = "Unknown"
         expired_info["details"] = "Domain appears to be parked or expired"
     
     return expired_info
 
-def detect_cms_and_plugins(body: str) -> Dict[str, Any]:
+def detect_cms_and_plugins(body: str, fp: Optional[Fingerprint] = None) -> Dict[str, Any]:
     """Detect CMS and plugins from HTML body"""
     cms_info = {"cms": "unknown", "plugins": [], "themes": [], "details": ""}
-    
-    body_lower = body.lower()
+    fp = fp or fingerprint_body(body)
     
     # WordPress detection
-    if "wp-content" in body_lower or "wp-includes" in body_lower or "wordpress" in body_lower:
+    if fp.has("wp-content", "wp-includes", "wordpress"):
         cms_info["cms"] = "WordPress"
         
         # Detect WordPress version
-        wp_version_match = re.search(r'<meta name="generator" content="WordPress ([^"]+)"', body, re.IGNORECASE)
+        wp_version_match = _WP_VERSION_RE.search(body)
         if wp_version_match:
             cms_info["version"] = wp_version_match.group(1)
         
         # Detect common plugins
         plugins = []
-        if "woocommerce" in body_lower:
+        if fp.has("woocommerce"):
             plugins.append("WooCommerce")
-        if "yoast" in body_lower or "yoast seo" in body_lower:
+        if fp.has("yoast", "yoast seo"):
             plugins.append("Yoast SEO")
-        if "contact-form-7" in body_lower or "wpcf7" in body_lower:
+        if fp.has("contact-form-7", "wpcf7"):
             plugins.append("Contact Form 7")
-        if "jetpack" in body_lower:
+        if fp.has("jetpack"):
             plugins.append("Jetpack")
-        if "elementor" in body_lower:
+        if fp.has("elementor"):
             plugins.append("Elementor")
         cms_info["plugins"] = plugins
         
         # Detect theme
-        theme_match = re.search(r'wp-content/themes/([^/"]+)', body, re.IGNORECASE)
+        theme_match = _WP_THEME_RE.search(body)
         if theme_match:
             cms_info["themes"] = [theme_match.group(1)]
     
     # Drupal detection
-    elif "drupal" in body_lower:
+    elif fp.has("drupal"):
         cms_info["cms"] = "Drupal"
-        drupal_version_match = re.search(r'Drupal ([0-9.]+)', body, re.IGNORECASE)
+        drupal_version_match = _DRUPAL_VERSION_RE.search(body)
         if drupal_version_match:
             cms_info["version"] = drupal_version_match.group(1)
     
     # Joomla detection
-    elif "joomla" in body_lower:
+    elif fp.has("joomla"):
         cms_info["cms"] = "Joomla"
-        joomla_version_match = re.search(r'Joomla! ([0-9.]+)', body, re.IGNORECASE)
+        joomla_version_match = _JOOMLA_VERSION_RE.search(body)
         if joomla_version_match:
             cms_info["version"] = joomla_version_match.group(1)
     
     # Magento detection
-    elif "magento" in body_lower:
+    elif fp.has("magento"):
         cms_info["cms"] = "Magento"
-        magento_version_match = re.search(r'Magento/([0-9.]+)', body, re.IGNORECASE)
+        magento_version_match = _MAGENTO_VERSION_RE.search(body)
         if magento_version_match:
             cms_info["version"] = magento_version_match.group(1)
     
     return cms_info
 
-def http_check(url: str, method: str = "GET", follow_redirects: bool = True, timeout_sec: int = 10) -> Dict[str, Any]:
+# Body snippets that settle detect_domain_expired_page no matter what follows,
+# keyed by whether the URL contains "lander" (which decides the first branch)
+_LANDER_PAGE_PATTERNS: Tuple[str, ...] = (
+    "landing page",
+    "domain expired",
+    "parking-lander",
+    "wsimg.com/parking-lander",
+    "window.lander_system",
+)
+_LANDER_REDIRECT_PATTERNS: Tuple[str, ...] = ("window.location.href=\"/lander\"",)
+
+class _BodyReader:
+    """
+    Decodes a streamed body into a prefix of at most max_bytes, watching each
+    chunk (plus enough of the previous one to catch split snippets) for a
+    parking-page verdict that more bytes could not change.
+    """
+
+    def __init__(self, resp: httpx.Response, max_bytes: int):
+        encoding = resp.encoding or "utf-8"
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = "utf-8"
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._max_bytes = max_bytes
+        self._parts: List[str] = []
+        self._tail = ""
+        if "lander" in str(resp.url).lower():
+            self._stop_patterns = _LANDER_PAGE_PATTERNS
+            self._stop_reason = "godaddy_parking_page"
+        else:
+            self._stop_patterns = _LANDER_REDIRECT_PATTERNS
+            self._stop_reason = "godaddy_lander_redirect"
+        self._overlap = max(len(p) for p in self._stop_patterns) - 1
+        self.bytes_read = 0
+        self.truncated = False
+        self.stopped_early: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume a chunk; returns False once reading should stop."""
+        remaining = self._max_bytes - self.bytes_read
+        # Truncated only when bytes are actually dropped; a body exactly at the cap is complete
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+            self.truncated = True
+        self.bytes_read += len(chunk)
+        text = self._decoder.decode(chunk)
+        self._parts.append(text)
+        window = self._tail + text.lower()
+        if any(p in window for p in self._stop_patterns):
+            self.stopped_early = self._stop_reason
+            return False
+        self._tail = window[-self._overlap:] if self._overlap else ""
+        return not self.truncated
+
+    def text(self) -> str:
+        self._parts.append(self._decoder.decode(b"", final=True))
+        return "".join(self._parts)
+
+    def record(self, out: Dict[str, Any]) -> None:
+        out["body_bytes_read"] = self.bytes_read
+        out["body_truncated"] = self.truncated
+        out["body_stopped_early"] = self.stopped_early
+
+def _analyze_response(out: Dict[str, Any], resp: httpx.Response, url: str, body_text: str) -> None:
+    out["status_code"] = resp.status_code
+    out["final_url"] = str(resp.url)
+    out["redirected"] = (str(resp.url) != url)
+    
+    # Get all headers for analysis
+    all_headers = {k: v for k, v in resp.headers.items()}
+    out["headers"] = {k: v for k, v in all_headers.items() if k.lower() in [
+        "server","content-type","location","strict-transport-security",
+        "x-frame-options","x-content-type-options","content-security-policy","referrer-policy",
+        "x-powered-by"
+    ]}
+    
+    out["body_sample"] = body_text[:512]
+    
+    # Lowercase and scan the body once; every detector reads the same match set
+    fp = fingerprint_body(body_text)
+    
+    # Detect web server
+    out["web_server"] = detect_web_server(all_headers)
+    
+    # Detect programming language and framework
+    out["technology"] = detect_programming_language(all_headers, body_text, fp)
+    
+    # Detect CMS and plugins
+    out["cms_info"] = detect_cms_and_plugins(body_text, fp)
+    
+    # Detect domain expired/parking pages
+    out["domain_status"] = detect_domain_expired_page(body_text, str(resp.url), fp)
+
+async def http_check_async(url: str, method: str = "GET", follow_redirects: bool = True, timeout_sec: int = 10, addresses: Optional[List[str]] = None) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"url": url, "method": method}
+    token = None
+    try:
+        if addresses:
+            token = pinned_addresses.set({httpx.URL(url).host: list(addresses)})
+        client = get_async_http_client()
+        async with client.stream(method, url, follow_redirects=follow_redirects, timeout=timeout_sec) as resp:
+            reader = _BodyReader(resp, settings.HTTP_MAX_BODY_BYTES)
+            # Time to the response headers is the gap before this stage starts
+            with timing.stage("http_check.body"):
+                async for chunk in resp.aiter_bytes():
+                    if not reader.feed(chunk):
+                        break
+        reader.record(out)
+        with timing.stage("http_check.analyze"):
+            _analyze_response(out, resp, url, reader.text())
+    except Exception as e:
+        out["error"] = str(e)
+    finally:
+        if token is not None:
+            pinned_addresses.reset(token)
+    return out
+
+def http_check(url: str, method: str = "GET", follow_redirects: bool = True, timeout_sec: int = 10, addresses: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Synchronous variant of http_check_async. It uses the sync pooled client
+    rather than wrapping the coroutine, because async connections are bound to
+    the event loop that opened them and would not be reused across calls.
+    """
     out: Dict[str, Any] = {"url": url, "method": method}
+    token = None
     try:
-        with httpx.Client(follow_redirects=follow_redirects, timeout=timeout_sec) as client:
-            resp = client.request(method, url, headers={"User-Agent": "DiagBot/1.0"})
-            out["status_code"] = resp.status_code
-            out["final_url"] = str(resp.url)
-            out["redirected"] = (str(resp.url) != url)
-            
-            # Get all headers for analysis
-            all_headers = {k: v for k, v in resp.headers.items()}
-            out["headers"] = {k: v for k, v in all_headers.items() if k.lower() in [
-                "server","content-type","location","strict-transport-security",
-                "x-frame-options","x-content-type-options","content-security-policy","referrer-policy",
-                "x-powered-by"
-            ]}
-            
-            body_text = resp.text
-            out["body_sample"] = body_text[:512]
-            
-            # Detect web server
-            out["web_server"] = detect_web_server(all_headers)
-            
-            # Detect programming language and framework
-            out["technology"] = detect_programming_language(all_headers, body_text)
-            
-            # Detect CMS and plugins
-            out["cms_info"] = detect_cms_and_plugins(body_text)
-            
-            # Detect domain expired/parking pages
-            out["domain_status"] = detect_domain_expired_page(body_text, str(resp.url))
-            
+        if addresses:
+            token = pinned_addresses.set({httpx.URL(url).host: list(addresses)})
+        # Shared keep-alive pool; redirects and timeout are per-call overrides
+        client = get_http_client()
+        # Closing the stream early drops the connection instead of draining the rest
+        with client.stream(method, url, follow_redirects=follow_redirects, timeout=timeout_sec) as resp:
+            reader = _BodyReader(resp, settings.HTTP_MAX_BODY_BYTES)
+            with timing.stage("http_check.body"):
+                for chunk in resp.iter_bytes():
+                    if not reader.feed(chunk):
+                        break
+        reader.record(out)
+        with timing.stage("http_check.analyze"):
+            _analyze_response(out, resp, url, reader.text())
     except Exception as e:
         out["error"] = str(e)
+    finally:
+        if token is not None:
+            pinned_addresses.reset(token)
     return out
@@ -0,0 +1,29 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, TypeVar
+from .http_client import aclose_http_clients
+
+T = TypeVar("T")
+
+async def _run_and_cleanup(coro: Awaitable[T]) -> T:
+    try:
+        return await coro
+    finally:
+        # Pooled async connections cannot outlive the temporary loop
+        await aclose_http_clients()
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    Run an async tool to completion from synchronous code.
+    Works from plain threads and from inside a running event loop (where
+    asyncio.run would fail) by running the coroutine on a helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_run_and_cleanup(coro))
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-sync") as pool:
+        # Carry context variables (such as the active timing waterfall) to the helper thread
+        context = contextvars.copy_context()
+        return pool.submit(context.run, asyncio.run, _run_and_cleanup(coro)).result()
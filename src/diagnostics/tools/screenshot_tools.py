@@ -1,45 +1,40 @@
 import asyncio
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any
 from playwright.async_api import async_playwright
+from ..config import settings
+from ..metrics import BROWSER_PAGES, BROWSER_PAGES_OPEN
+from .browser_pool import browser_pool
+from .runtime import run_sync
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 
 async def take_screenshot(url: str, width: int = 1280, height: int = 720, timeout: int = 30000) -> Dict[str, Any]:
     """
     Analyze a website using Playwright to detect visual issues.
     Returns analysis of potential visual issues without screenshots to avoid context overflow.
+    Uses an isolated context from the shared browser pool when it is running on
+    this loop, otherwise launches a one-off browser.
     """
     result: Dict[str, Any] = {"url": url, "success": False}
+    context_options = {
+        "viewport": {'width': width, 'height': height},
+        "user_agent": USER_AGENT,
+    }
     
     try:
-        async with async_playwright() as p:
-            # Launch browser
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                viewport={'width': width, 'height': height},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            )
-            
-            page = await context.new_page()
-            
-            # Set timeout
-            page.set_default_timeout(timeout)
-            
-            # Navigate to URL
-            response = await page.goto(url, wait_until='networkidle')
-            
-            if response:
-                result["status_code"] = response.status
-                result["final_url"] = response.url
-                
-                # Wait a bit for any dynamic content to load
-                await page.wait_for_timeout(2000)
-                
-                # Analyze page for potential issues (no screenshot to avoid context overflow)
-                analysis = await analyze_page_visual_issues(page)
-                result["visual_analysis"] = analysis
-                
-                result["success"] = True
-                
-            await browser.close()
+        if browser_pool.owns_current_loop():
+            async with browser_pool.context(**context_options) as context:
+                await _analyze_counted(context, url, timeout, result, "pool")
+        else:
+            async with async_playwright() as p:
+                # Launch browser
+                browser = await p.chromium.launch(headless=True)
+                try:
+                    context = await browser.new_context(**context_options)
+                    await _analyze_counted(context, url, timeout, result, "one_off")
+                finally:
+                    await browser.close()
             
     except Exception as e:
         result["error"] = str(e)
@@ -47,6 +42,106 @@ async def take_screenshot(url: str, width: int = 1280, height: int = 720, timeou
     
     return result
 
+# Records the time of the last DOM mutation so readiness can be judged from Python
+_MUTATION_TRACKER_JS = """
+(() => {
+    window.__diagLastMutation = performance.now();
+    const observe = () => {
+        new MutationObserver(() => { window.__diagLastMutation = performance.now(); })
+            .observe(document, { childList: true, subtree: true, attributes: true, characterData: true });
+    };
+    if (document.documentElement) { observe(); } else { document.addEventListener('readystatechange', observe, { once: true }); }
+})();
+"""
+
+class _NetworkTracker:
+    """Counts outstanding requests and remembers when network activity last changed."""
+
+    def __init__(self, page):
+        self.inflight = 0
+        self.last_activity = time.monotonic()
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+
+    def _started(self, request) -> None:
+        self.inflight += 1
+        self.last_activity = time.monotonic()
+
+    def _finished(self, request) -> None:
+        self.inflight = max(0, self.inflight - 1)
+        self.last_activity = time.monotonic()
+
+async def wait_for_page_ready(page, tracker: _NetworkTracker, quiet_ms: int, max_wait_ms: int, max_inflight: int) -> Dict[str, Any]:
+    """
+    Wait until the DOM and the network have both been quiet for quiet_ms, or
+    until max_wait_ms has passed. Up to max_inflight requests may stay open so
+    long-polling and analytics beacons do not block readiness forever.
+    Returns which condition ended the wait.
+    """
+    started = time.monotonic()
+    deadline = started + max_wait_ms / 1000
+    quiet = quiet_ms / 1000
+    condition = "max_wait"
+    while True:
+        now = time.monotonic()
+        network_quiet = tracker.inflight <= max_inflight and now - tracker.last_activity >= quiet
+        if network_quiet:
+            try:
+                since_mutation_ms = await page.evaluate("() => performance.now() - (window.__diagLastMutation || 0)")
+            except Exception:
+                # The page navigated (e.g. a client-side redirect); keep waiting
+                since_mutation_ms = 0
+            if since_mutation_ms >= quiet_ms:
+                condition = "settled"
+                break
+        if now >= deadline:
+            break
+        await asyncio.sleep(min(0.1, max(0.0, deadline - now)))
+    return {
+        "condition": condition,
+        "waited_ms": int((time.monotonic() - started) * 1000),
+        "inflight_requests": tracker.inflight,
+    }
+
+async def _analyze_url(context, url: str, timeout: int, result: Dict[str, Any]) -> None:
+    page = await context.new_page()
+    
+    # Set timeout
+    page.set_default_timeout(timeout)
+    await page.add_init_script(_MUTATION_TRACKER_JS)
+    tracker = _NetworkTracker(page)
+    
+    # Navigate to URL; readiness is judged below instead of waiting for networkidle
+    response = await page.goto(url, wait_until='domcontentloaded')
+    
+    if response:
+        result["status_code"] = response.status
+        result["final_url"] = response.url
+        
+        # Wait for dynamic content to settle, capped so busy pages cannot stall us
+        result["readiness"] = await wait_for_page_ready(
+            page,
+            tracker,
+            quiet_ms=settings.PAGE_READY_QUIET_MS,
+            max_wait_ms=min(settings.PAGE_READY_MAX_WAIT_MS, timeout),
+            max_inflight=settings.PAGE_READY_MAX_INFLIGHT,
+        )
+        
+        # Analyze page for potential issues (no screenshot to avoid context overflow)
+        analysis = await analyze_page_visual_issues(page)
+        result["visual_analysis"] = analysis
+        
+        result["success"] = True
+
+async def _analyze_counted(context, url: str, timeout: int, result: Dict[str, Any], source: str) -> None:
+    BROWSER_PAGES.labels(source).inc()
+    BROWSER_PAGES_OPEN.inc()
+    try:
+        await _analyze_url(context, url, timeout, result)
+    finally:
+        BROWSER_PAGES_OPEN.dec()
+
 async def analyze_page_visual_issues(page) -> Dict[str, Any]:
     """Analyze the page for potential visual issues"""
     analysis = {
@@ -191,6 +286,11 @@ async def analyze_page_visual_issues(page) -> Dict[str, Any]:
 def take_screenshot_sync(url: str, width: int = 1280, height: int = 720, timeout: int = 30000) -> Dict[str, Any]:
     """
     Synchronous wrapper for the async screenshot function.
-    This is what the agent will call.
+    This is what the agent will call; it is safe to use from inside a running event loop.
+    When the browser pool is running, the work is handed to the pool's loop.
     """
-    return asyncio.run(take_screenshot(url, width, height, timeout))
+    coro = take_screenshot(url, width, height, timeout)
+    pool_loop = browser_pool.loop
+    if browser_pool.started and pool_loop is not None and pool_loop.is_running() and not browser_pool.owns_current_loop():
+        return asyncio.run_coroutine_threadsafe(coro, pool_loop).result()
+    return run_sync(coro)
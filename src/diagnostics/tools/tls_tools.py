@@ -1,77 +1,130 @@
-import socket, ssl, datetime
-from typing import Dict, Any
+import asyncio, ssl, datetime, ipaddress, warnings
+from typing import Dict, Any, List, Optional
+import certifi
+from cryptography import x509
+from cryptography.x509.verification import PolicyBuilder, Store, DNSName, IPAddress
+from .dns_cache import cached_addresses, is_ip_address
+from .runtime import run_sync
+from .. import timing
 
-def tls_probe(host: str, port: int = 443, sni: bool = True) -> Dict[str, Any]:
+_trust_store: Optional[Store] = None
+
+def _get_trust_store() -> Store:
+    """Load the certifi CA bundle once and reuse it for every verification."""
+    global _trust_store
+    if _trust_store is None:
+        with open(certifi.where(), "rb") as f, warnings.catch_warnings():
+            # Some bundled roots have non-RFC 5280 serials; they are still valid anchors
+            warnings.simplefilter("ignore")
+            _trust_store = Store(x509.load_pem_x509_certificates(f.read()))
+    return _trust_store
+
+async def _open_tls(host: str, port: int, sni: bool, addresses: Optional[List[str]], ctx: ssl.SSLContext, timeout: float):
+    """Open a TLS connection to pinned/cached addresses for host, falling back to the system resolver."""
+    # An empty server_hostname disables SNI; None would default it to the connect address
+    server_hostname = host if sni else ""
+    targets = addresses or cached_addresses(host) or [host]
+    last_error: Optional[Exception] = None
+    for address in targets:
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_connection(address, port, ssl=ctx, server_hostname=server_hostname),
+                timeout=timeout,
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            last_error = e
+    raise last_error
+
+def _peer_chain_der(ssock) -> List[bytes]:
+    """DER certificates the server sent (leaf first), or [] if the runtime cannot expose them."""
+    getter = getattr(ssock, "get_unverified_chain", None)  # Python 3.13+
+    if getter is not None:
+        return list(getter() or [])
+    getter = getattr(getattr(ssock, "_sslobj", None), "get_unverified_chain", None)
+    if getter is None:
+        return []
+    return [cert.public_bytes(ssl._ssl.ENCODING_DER) for cert in getter() or []]
+
+def _name_to_dict(name: x509.Name) -> Dict[str, Any]:
+    return {attr.oid._name: attr.value for attr in name}
+
+def _verify_chain(host: str, leaf: x509.Certificate, intermediates: List[x509.Certificate]) -> Optional[str]:
+    """Verify the chain and hostname against the trust store; returns an error message or None."""
+    if is_ip_address(host):
+        subject = IPAddress(ipaddress.ip_address(host.strip("[]")))
+    else:
+        subject = DNSName(host)
+    verifier = PolicyBuilder().store(_get_trust_store()).build_server_verifier(subject)
+    try:
+        verifier.verify(leaf, intermediates)
+    except Exception as e:
+        return str(e)
+    return None
+
+def describe_certificate(host: str, chain_der: List[bytes]) -> Dict[str, Any]:
+    """Parse the leaf certificate and verify the presented chain locally."""
+    info: Dict[str, Any] = {}
+    leaf = x509.load_der_x509_certificate(chain_der[0])
+    info["subject"] = _name_to_dict(leaf.subject)
+    info["issuer"] = _name_to_dict(leaf.issuer)
+    not_after = leaf.not_valid_after_utc
+    info["not_after"] = not_after.isoformat()
+    info["days_until_expiry"] = (not_after - datetime.datetime.now(datetime.timezone.utc)).days
+    info["chain_length"] = len(chain_der)
+
+    intermediates = [x509.load_der_x509_certificate(der) for der in chain_der[1:]]
+    error = _verify_chain(host, leaf, intermediates)
+    info["verified"] = error is None
+    if error:
+        info["verification_error"] = error
+    return info
+
+def _insecure_context() -> ssl.SSLContext:
     ctx = ssl.create_default_context()
     # Disable certificate verification to allow extraction of expired certificates
     ctx.check_hostname = False
     ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+def _add_certificate_info(result: Dict[str, Any], host: str, chain_der: List[bytes]) -> None:
+    if chain_der:
+        try:
+            result.update(describe_certificate(host, chain_der))
+        except Exception as e:
+            result["warning"] = f"Error parsing certificate: {str(e)}"
+    else:
+        result["warning"] = "No certificate returned"
+
+async def tls_probe_async(host: str, port: int = 443, sni: bool = True, addresses: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Probe a TLS endpoint with a single unverified handshake.
+    The certificate (and chain, where the runtime exposes it) is taken from that
+    connection, parsed with cryptography and verified locally, so expired or
+    untrusted certificates are still reported without a second connection.
+    """
     result: Dict[str, Any] = {"host": host, "port": port}
 
     try:
-        with socket.create_connection((host, port), timeout=10) as sock:
-            with ctx.wrap_socket(sock, server_hostname=(host if sni else None)) as ssock:
-                result["tls_version"] = ssock.version()
-                
-                # Try to get certificate info - first try with verification enabled for better parsing
-                try:
-                    # Create a new context with verification for parsing
-                    parse_ctx = ssl.create_default_context()
-                    parse_ctx.check_hostname = False
-                    parse_ctx.verify_mode = ssl.CERT_REQUIRED
-                    
-                    with socket.create_connection((host, port), timeout=10) as parse_sock:
-                        with parse_ctx.wrap_socket(parse_sock, server_hostname=(host if sni else None)) as parse_ssock:
-                            cert = parse_ssock.getpeercert()
-                            if cert:
-                                result["subject"] = dict(x[0] for x in cert.get("subject", []))
-                                result["issuer"] = dict(x[0] for x in cert.get("issuer", []))
-                                not_after = cert.get("notAfter")
-                                result["not_after"] = not_after
-                                if not_after:
-                                    # Convert to ISO date
-                                    dt = datetime.datetime.strptime(not_after, "%b %d %H:%M:%S %Y %Z")
-                                    result["days_until_expiry"] = (dt - datetime.datetime.utcnow()).days
-                            else:
-                                result["warning"] = "No certificate returned"
-                except ssl.SSLCertVerificationError:
-                    # Certificate verification failed (likely expired), try binary format
-                    cert_bin = ssock.getpeercert(binary_form=True)
-                    if cert_bin:
-                        cert = ssl.DER_cert_to_PEM_cert(cert_bin)
-                        # Parse the PEM certificate
-                        from cryptography import x509
-                        from cryptography.hazmat.backends import default_backend
-                        
-                        try:
-                            cert_obj = x509.load_pem_x509_certificate(cert.encode(), default_backend())
-                            
-                            # Extract subject
-                            subject_dict = {}
-                            for name in cert_obj.subject:
-                                subject_dict[name.oid._name] = name.value
-                            result["subject"] = subject_dict
-                            
-                            # Extract issuer
-                            issuer_dict = {}
-                            for name in cert_obj.issuer:
-                                issuer_dict[name.oid._name] = name.value
-                            result["issuer"] = issuer_dict
-                            
-                            # Extract expiry date
-                            not_after = cert_obj.not_valid_after
-                            result["not_after"] = not_after.isoformat()
-                            result["days_until_expiry"] = (not_after - datetime.datetime.now(not_after.tzinfo)).days
-                            
-                        except ImportError:
-                            # Fallback if cryptography library is not available
-                            result["warning"] = "Certificate found but cryptography library not available for parsing"
-                        except Exception as e:
-                            result["warning"] = f"Error parsing certificate: {str(e)}"
-                    else:
-                        result["warning"] = "No certificate returned"
-                except Exception as e:
-                    result["warning"] = f"Error getting certificate: {str(e)}"
+        with timing.stage("tls_probe.handshake"):
+            reader, writer = await _open_tls(host, port, sni, addresses, _insecure_context(), timeout=10)
+        try:
+            ssl_object = writer.get_extra_info("ssl_object")
+            result["tls_version"] = ssl_object.version()
+            chain_der = _peer_chain_der(ssl_object)
+            if not chain_der:
+                cert_bin = ssl_object.getpeercert(binary_form=True)
+                chain_der = [cert_bin] if cert_bin else []
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+        with timing.stage("tls_probe.verify"):
+            _add_certificate_info(result, host, chain_der)
     except Exception as e:
-        result["error"] = str(e)
+        result["error"] = str(e) or type(e).__name__
     return result
+
+def tls_probe(host: str, port: int = 443, sni: bool = True, addresses: Optional[List[str]] = None) -> Dict[str, Any]:
+    return run_sync(tls_probe_async(host, port, sni, addresses))
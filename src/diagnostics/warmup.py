@@ -0,0 +1,36 @@
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Modules deferred at import time, in the order a diagnosis first touches them
+_DEFERRED_MODULES = [
+    "diagnostics.tools.dns_tools",
+    "diagnostics.tools.http_tools",
+    "diagnostics.tools.tls_tools",
+    "diagnostics.tools.hosting_tools",
+    "diagnostics.tools.screenshot_tools",
+    "openai",
+]
+
+def warm_up() -> float:
+    """
+    Import the lazily loaded tool modules and the OpenAI SDK, and load the
+    TLS trust store, so the first diagnosis does not pay for them.
+    Blocking; returns the seconds spent.
+    """
+    started = time.perf_counter()
+    for name in _DEFERRED_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Warm-up could not import {name}: {str(e)}")
+    try:
+        from .tools.tls_tools import _get_trust_store
+        _get_trust_store()
+    except Exception as e:
+        logger.warning(f"Warm-up could not load the TLS trust store: {str(e)}")
+    elapsed = time.perf_counter() - started
+    logger.info(f"Warm-up finished in {elapsed:.2f}s")
+    return elapsed
@@ -0,0 +1,23 @@
+"""
+Shared pytest setup: keep the app's SQLite stores (report history, job
+queue) in a temporary directory so test runs never write to the working tree
+"""
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics import history, main
+
+@pytest.fixture(autouse=True, scope="session")
+def _temporary_databases(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("databases")
+    paths = history.report_history.path, main.job_queue.path
+    # Both stores open their files lazily, so changing the path before the first test is enough
+    history.report_history.path = str(tmp / "history.sqlite3")
+    main.job_queue.path = str(tmp / "jobs.sqlite3")
+    try:
+        yield tmp
+    finally:
+        history.report_history.close()
+        history.report_history.path, main.job_queue.path = paths
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test script to verify admission control: per-resource limits, the bounded
+FIFO wait queue, queued SSE events and fast 429 rejections
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import httpx
+from diagnostics import main
+from diagnostics.admission import AdmissionRejected, Gate, probe_gate
+from diagnostics.report_cache import report_cache
+from diagnostics.schemas import DiagnosticReport
+
+def test_gate():
+    """Test slot limits, queue positions, hand-off and rejection"""
+
+    print("🧪 Testing Admission Gate")
+    print("=" * 50)
+
+    gate = Gate("test", limit=2, max_queue=2, queue_timeout=5, retry_after=7)
+    first, second = gate.enter(), gate.enter()
+    assert first.granted.is_set() and second.granted.is_set()
+    third, fourth = gate.enter(), gate.enter()
+    assert [gate.position(third), gate.position(fourth)] == [1, 2]
+    try:
+        gate.enter()
+        assert False, "a full queue should reject"
+    except AdmissionRejected as e:
+        assert e.retry_after == 7
+    gate.enter(bounded=False)  # internal callers always queue
+    print("✅ Two slots, two queued, the next bounded request rejected")
+
+    gate.release(first)
+    assert third.granted.is_set() and gate.active == 2 and gate.position(fourth) == 1
+    gate.release(fourth)
+    assert gate.queued == 1
+    gate.release(second)
+    gate.release(second)  # releasing twice is harmless
+    print("✅ Slots hand over in FIFO order and queued waiters can leave")
+
+    gate = Gate("test", limit=1, max_queue=4, queue_timeout=0.2, retry_after=1)
+    holder = gate.enter()
+    waiter = gate.enter()
+    started = time.monotonic()
+    try:
+        list(gate.wait(waiter))
+        assert False, "waiting past the queue timeout should reject"
+    except AdmissionRejected:
+        pass
+    assert 0.15 < time.monotonic() - started < 1 and gate.queued == 0
+    gate.release(holder)
+    assert gate.active == 0
+    print("✅ Waiters give up after the queue timeout")
+
+    gate = Gate("test", limit=3, max_queue=100, queue_timeout=5, retry_after=1)
+    running = []
+    peak = []
+
+    def worker():
+        with gate.slot():
+            running.append(1)
+            peak.append(len(running))
+            time.sleep(0.02)
+            running.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(30)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) <= 3 and gate.active == 0 and gate.queued == 0
+    print(f"✅ 30 threads, at most {max(peak)} holding a slot at once")
+
+class _HookedLock:
+    """Lock that runs a callback once, right after it is next released"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.after_release = None
+
+    def __enter__(self):
+        self._lock.acquire()
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        hook, self.after_release = self.after_release, None
+        if hook is not None:
+            hook()
+
+def test_timeout_during_handoff():
+    """Test a waiter giving up at the same moment the holder hands it the slot"""
+
+    print("\n🧪 Testing Timeout During Hand-off")
+    print("=" * 50)
+
+    gate = Gate("test", limit=1, max_queue=4, queue_timeout=5, retry_after=1)
+    gate._lock = _HookedLock()
+    holder = gate.enter()
+    waiter = gate.enter()
+    rejections = []
+    # The waiter times out just after the holder's release has picked it as successor
+    gate._lock.after_release = lambda: rejections.append(gate._timed_out(waiter))
+    gate.release(holder)
+    assert "granted after the queue timeout" in str(rejections[0])
+    assert gate.active == 0 and gate.queued == 0, gate.stats()
+    assert gate.enter().granted.is_set()
+    print("✅ The slot handed to a waiter that was timing out went back to the gate")
+
+def test_stream_admission():
+    """Test queued events and the 429 for a full queue on /api/diagnose/stream"""
+
+    print("\n🧪 Testing Stream Admission")
+    print("=" * 50)
+
+    async def slow_diagnosis(target):
+        await asyncio.sleep(0.3)
+        return DiagnosticReport(summary=f"report for {target}")
+
+    original = main.run_offline_diagnosis_async, probe_gate.limit, probe_gate.max_queue
+    main.run_offline_diagnosis_async = slow_diagnosis
+    probe_gate.limit, probe_gate.max_queue = 1, 1
+    report_cache.clear()
+    try:
+        async def scenario():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                def post(target):
+                    return client.post("/api/diagnose/stream?mode=offline", json={"target": target})
+                running = asyncio.create_task(post("one.example"))
+                await asyncio.sleep(0.05)
+                queued = asyncio.create_task(post("two.example"))
+                await asyncio.sleep(0.05)
+                rejected = await post("three.example")
+                joined = await asyncio.wait_for(post("one.example"), 2)
+                return await running, await queued, rejected, joined
+
+        running, queued, rejected, joined = asyncio.run(scenario())
+    finally:
+        main.run_offline_diagnosis_async, probe_gate.limit, probe_gate.max_queue = original
+        report_cache.clear()
+
+    assert rejected.status_code == 429 and rejected.headers["retry-after"] == str(probe_gate.retry_after)
+    print(f"✅ Request beyond the queue rejected with 429, Retry-After {rejected.headers['retry-after']}")
+
+    events = [json.loads(line[6:]) for line in queued.text.splitlines() if line.startswith("data: {")]
+    waits = [e for e in events if e["type"] == "queued"]
+    assert waits and waits[0]["position"] == 1 and waits[0]["resource"] == "probes"
+    assert events[-1]["type"] == "result" and events[-1]["data"]["summary"] == "report for two.example"
+    print("✅ Queued request got its position, then its report")
+
+    assert joined.status_code == 200 and "report for one.example" in joined.text
+    assert probe_gate.active == 0 and probe_gate.queued == 0
+    print("✅ Joining a run in progress is never rejected")
+
+def test_slot_reserved_by_handler():
+    """Test that a stream accepted by the handler is not rejected later"""
+
+    print("\n🧪 Testing Slot Reservation")
+    print("=" * 50)
+
+    async def quick_diagnosis(target):
+        await asyncio.sleep(0.01)
+        return DiagnosticReport(summary=f"report for {target}")
+
+    original = main.run_offline_diagnosis_async, probe_gate.limit, probe_gate.max_queue
+    main.run_offline_diagnosis_async = quick_diagnosis
+    probe_gate.limit, probe_gate.max_queue = 1, 1
+    report_cache.clear()
+    try:
+        async def scenario():
+            holder = probe_gate.enter()
+            response = await main.diagnose_streaming(main.DiagnoseRequest(target="reserved.example"), mode="offline")
+            reserved = probe_gate.queued
+            # The queue is now full, so any later arrival is turned away
+            try:
+                probe_gate.enter()
+                assert False, "the queue should be full"
+            except AdmissionRejected:
+                pass
+            probe_gate.release(holder)
+            body = [chunk async for chunk in response.body_iterator]
+            return reserved, body
+
+        reserved, body = asyncio.run(scenario())
+    finally:
+        main.run_offline_diagnosis_async, probe_gate.limit, probe_gate.max_queue = original
+        report_cache.clear()
+
+    events = [json.loads(chunk[6:]) for chunk in body if chunk.startswith("data: {")]
+    assert reserved == 1
+    assert not any(e.get("retry_after") for e in events)
+    assert events[-1]["type"] == "result" and probe_gate.active == 0 and probe_gate.queued == 0
+    print("✅ The handler holds the place in the queue; the stream got its report once the slot freed")
+
+if __name__ == "__main__":
+    test_gate()
+    test_timeout_during_handoff()
+    test_stream_admission()
+    test_slot_reserved_by_handler()
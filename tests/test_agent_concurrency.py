@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that agent tool calls run concurrently while the model stream is read,
+and that speculative probe prefetch answers matching tool calls
+"""
+import sys
+import os
+import time
+import json
+from types import SimpleNamespace as NS
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from concurrent.futures import ThreadPoolExecutor
+from diagnostics import agent
+from diagnostics.config import settings
+from diagnostics.prefetch import ProbePrefetch
+from diagnostics.admission import probe_gate
+
+class FakeResponses:
+    """Replays a tool-calling stream, then a short final answer"""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if len(self.requests) == 1:
+            events = []
+            for i, (name, args) in enumerate(self.calls):
+                item = NS(type="function_call", id=f"fc_{i}", call_id=f"call_{i}", name=name, arguments="")
+                events.append(NS(type="response.output_item.added", item=item))
+                events.append(NS(type="response.function_call_arguments.done", item_id=f"fc_{i}", arguments=json.dumps(args)))
+            events.append(NS(type="response.completed"))
+            return iter(events)
+        return iter([
+            NS(type="response.output_text.delta", delta="## Summary\nAll good"),
+            NS(type="response.completed"),
+        ])
+
+def test_agent_concurrency():
+    """Test that tool latency approaches the slowest tool rather than the sum"""
+
+    print("🧪 Testing Concurrent Agent Tool Calls")
+    print("=" * 50)
+
+    calls = [("dns_lookup", {"domain": "a.com"}), ("http_check", {"url": "https://a.com"}), ("tls_probe", {"host": "a.com"})]
+    responses = FakeResponses(calls)
+
+    def slow_tool(name, args, prefetch=None):
+        time.sleep(0.3)
+        if name == "tls_probe":
+            raise RuntimeError("handshake failed")
+        return {"tool": name}
+
+    original_client, original_execute, original_prefetch = agent._create_client, agent.execute_tool, settings.AGENT_PREFETCH
+    agent._create_client = lambda: NS(responses=responses)
+    agent.execute_tool = slow_tool
+    settings.AGENT_PREFETCH = False
+    try:
+        start = time.perf_counter()
+        updates = list(agent.run_agent_streaming("a.com"))
+        elapsed = time.perf_counter() - start
+    finally:
+        agent._create_client, agent.execute_tool, settings.AGENT_PREFETCH = original_client, original_execute, original_prefetch
+
+    types = [u["type"] for u in updates]
+    assert types.count("tool_result") == 2 and types.count("tool_error") == 1
+    assert elapsed < 0.6, f"tools ran sequentially ({elapsed:.2f}s)"
+    print(f"✅ 3 tools of 0.3s finished in {elapsed:.2f}s")
+
+    outputs = [item for item in responses.requests[1]["input"] if isinstance(item, dict) and item.get("type") == "function_call_output"]
+    assert [o["call_id"] for o in outputs] == ["call_0", "call_1"]
+    assert updates[-1]["type"] == "result" and len(updates[-1]["data"]["tool_data"]) == 2
+    print("✅ Results gathered in call order before the follow-up request")
+
+def test_probe_prefetch():
+    """Test that matching tool calls reuse prefetched probes and others run live"""
+
+    print("\n🧪 Testing Speculative Probe Prefetch")
+    print("=" * 50)
+
+    probes = []
+
+    def fake_dns(domain, record_types):
+        probes.append("dns")
+        return {"domain": domain, "records": {r: [] for r in record_types}}
+
+    def fake_http(url):
+        probes.append("http")
+        time.sleep(0.1)
+        return {"url": url, "status_code": 200}
+
+    def fake_tls(host):
+        probes.append("tls")
+        raise RuntimeError("handshake failed")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        prefetch = ProbePrefetch(executor, fake_dns, fake_http, fake_tls, agent.DEFAULT_RECORD_TYPES)
+        prefetch.start("Example.com", "https://example.com")
+
+        assert prefetch.claim("http_check", {"url": "https://EXAMPLE.com/"})["status_code"] == 200
+        dns = prefetch.claim("dns_lookup", {"domain": "example.com.", "record_types": ["A", "MX"]})
+        assert set(dns["records"]) == {"A", "MX"}
+        # Non-default options, other hosts and failed probes fall back to a live call
+        assert prefetch.claim("http_check", {"url": "https://example.com", "method": "HEAD"}) is None
+        assert prefetch.claim("dns_lookup", {"domain": "other.com"}) is None
+        assert prefetch.claim("tls_probe", {"host": "example.com"}) is None
+        prefetch.discard()
+        assert prefetch.claim("dns_lookup", {"domain": "example.com"}) is None
+
+    assert sorted(probes) == ["dns", "http", "tls"] and prefetch.hits == 2
+    print(f"✅ {prefetch.hits} tool calls answered from {len(probes)} prefetched probes")
+
+def test_prefetch_respects_probe_limit():
+    """Test that prefetched probes take free probe slots and are skipped when there are none"""
+
+    print("\n🧪 Testing Prefetch Under the Probe Limit")
+    print("=" * 50)
+
+    peak = []
+
+    def probe(**kwargs):
+        peak.append(probe_gate.active)
+        return {"ok": True}
+
+    originals = agent.tools.dns_lookup, agent.tools.http_check, agent.tools.tls_probe, probe_gate.limit
+    agent.tools.dns_lookup = agent.tools.http_check = agent.tools.tls_probe = probe
+    probe_gate.limit = 2
+    try:
+        prefetch = agent.start_prefetch("example.com")
+        assert prefetch.claim("http_check", {"url": "https://example.com"}) == {"ok": True}
+        prefetch.discard()
+        assert peak and max(peak) <= 2
+        print(f"✅ Prefetched probes held at most {max(peak)} of {probe_gate.limit} probe slots")
+
+        held = [probe_gate.enter(), probe_gate.enter()]
+        peak.clear()
+        prefetch = agent.start_prefetch("example.com")
+        assert prefetch.claim("http_check", {"url": "https://example.com"}) is None
+        assert prefetch.claim("tls_probe", {"host": "example.com"}) is None
+        prefetch.discard()
+        for slot in held:
+            probe_gate.release(slot)
+        assert peak == [] and probe_gate.active == 0
+        print("✅ With every probe slot taken, prefetch is skipped and tool calls run live")
+    finally:
+        agent.tools.dns_lookup, agent.tools.http_check, agent.tools.tls_probe, probe_gate.limit = originals
+
+if __name__ == "__main__":
+    test_agent_concurrency()
+    test_probe_prefetch()
+    test_prefetch_respects_probe_limit()
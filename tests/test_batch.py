@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script to verify batch diagnosis (bounded concurrency, completion order, NDJSON endpoints)
+"""
+import sys
+import os
+import asyncio
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fastapi.testclient import TestClient
+from diagnostics import batch
+from diagnostics.config import settings
+from diagnostics.main import app
+from diagnostics.schemas import DiagnosticReport
+
+def test_batch_diagnosis():
+    """Test the batch runner and endpoints against a fake offline diagnosis"""
+
+    print("🧪 Testing Batch Diagnosis")
+    print("=" * 50)
+
+    in_flight = 0
+    peak = 0
+
+    async def fake_diagnosis(target):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # Later targets finish first so completion order differs from input order
+        await asyncio.sleep(0.01 * (10 - int(target.split(".")[0][4:])))
+        in_flight -= 1
+        if target.startswith("site3."):
+            raise RuntimeError("boom")
+        return DiagnosticReport(summary=f"ok {target}")
+
+    original = batch.run_offline_diagnosis_async
+    batch.run_offline_diagnosis_async = fake_diagnosis
+    try:
+        targets = [f"site{i}.example" for i in range(10)]
+
+        async def collect():
+            return [line async for line in batch.diagnose_batch(targets, concurrency=3)]
+
+        lines = asyncio.run(collect())
+        assert sorted(line["index"] for line in lines) == list(range(10))
+        assert peak <= 3
+        assert [line["index"] for line in lines] != list(range(10))
+        assert lines[[l["target"] for l in lines].index("site3.example")]["error"] == "boom"
+        print(f"✅ {len(lines)} results in completion order, peak concurrency {peak}")
+
+        with TestClient(app) as client:
+            resp = client.post("/api/diagnose/batch", json={"targets": targets[:4], "concurrency": 2})
+            assert resp.status_code == 200
+            assert resp.headers["content-type"].startswith("application/x-ndjson")
+            rows = [json.loads(line) for line in resp.text.splitlines()]
+            assert {row["target"] for row in rows} == set(targets[:4])
+            print("✅ JSON batch endpoint streams NDJSON")
+
+            upload = "# customer list\nsite1.example\n\n  site2.example  \r\n" + "x" * 5000 + "\nsite4.example"
+            resp = client.post("/api/diagnose/batch/upload", content=upload.encode())
+            rows = [json.loads(line) for line in resp.text.splitlines()]
+            assert len(rows) == 4
+            assert {row["target"] for row in rows if "report" in row} == {"site1.example", "site2.example", "site4.example"}
+            assert any("longer than" in row.get("error", "") for row in rows)
+            print("✅ Uploaded target lists are parsed line by line")
+    finally:
+        batch.run_offline_diagnosis_async = original
+
+def test_batch_closed_midway():
+    """Test that closing the stream early cancels the batch instead of hanging"""
+
+    print("\n🧪 Testing Batch Closed Mid-Stream")
+    print("=" * 50)
+
+    started = []
+
+    async def fast_diagnosis(target):
+        started.append(target)
+        await asyncio.sleep(0)
+        return DiagnosticReport(summary=f"ok {target}")
+
+    original = batch.run_offline_diagnosis_async
+    batch.run_offline_diagnosis_async = fast_diagnosis
+    try:
+        async def read_one_then_close():
+            stream = batch.diagnose_batch([f"site{i}.example" for i in range(100)], concurrency=4)
+            first = await stream.__anext__()
+            # Let every worker finish a diagnosis so the results queue is full
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(stream.aclose(), 2)
+            return first
+
+        first = asyncio.run(read_one_then_close())
+    finally:
+        batch.run_offline_diagnosis_async = original
+
+    assert "report" in first and len(started) < 100
+    print(f"✅ Stream closed after one line; {len(started)} of 100 targets were started")
+
+def test_upload_limit():
+    """Test that uploads over BATCH_MAX_UPLOAD_BYTES are refused with 413"""
+
+    print("\n🧪 Testing Batch Upload Limit")
+    print("=" * 50)
+
+    async def chunks(sizes):
+        for size in sizes:
+            yield b"x" * size
+
+    async def spool(sizes, max_bytes):
+        try:
+            upload = await batch.spool_upload(chunks(sizes), max_bytes)
+        except batch.UploadTooLarge:
+            return None
+        with upload:
+            return len(upload.read())
+
+    assert asyncio.run(spool([60, 40], 100)) == 100
+    assert asyncio.run(spool([60, 41], 100)) is None
+    print("✅ Spooling stops once the upload passes the limit")
+
+    original = settings.BATCH_MAX_UPLOAD_BYTES
+    settings.BATCH_MAX_UPLOAD_BYTES = 1000
+    try:
+        with TestClient(app) as client:
+            resp = client.post("/api/diagnose/batch/upload", content=b"site.example\n" * 100)
+            assert resp.status_code == 413 and "1000 bytes" in resp.json()["detail"]
+            # Without a Content-Length the limit is enforced while reading
+            resp = client.post("/api/diagnose/batch/upload", content=(b"site.example\n" for _ in range(100)))
+            assert resp.status_code == 413
+    finally:
+        settings.BATCH_MAX_UPLOAD_BYTES = original
+    print("✅ Oversized uploads get 413, with or without a Content-Length")
+
+if __name__ == "__main__":
+    test_batch_diagnosis()
+    test_batch_closed_midway()
+    test_upload_limit()
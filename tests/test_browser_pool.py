@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Test script to verify browser pool recycling (by pages served and by the
+current browser's memory) against a fake Playwright driver
+"""
+import sys
+import os
+import time
+import signal
+import asyncio
+import subprocess
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics.tools import browser_pool as pool_module
+from diagnostics.tools.browser_pool import BrowserPool
+
+class FakeContext:
+    async def close(self):
+        pass
+
+class FakeBrowser:
+    def __init__(self, number, args):
+        self.number = number
+        self.args = args
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    async def new_context(self, **options):
+        return FakeContext()
+
+    async def close(self):
+        self.closed = True
+
+class FakeChromium:
+    def __init__(self):
+        self.launched = []
+
+    async def launch(self, headless=True, args=()):
+        browser = FakeBrowser(len(self.launched), list(args))
+        self.launched.append(browser)
+        return browser
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+    async def stop(self):
+        pass
+
+class FakeStarter:
+    def __init__(self, playwright):
+        self.playwright = playwright
+
+    async def start(self):
+        return self.playwright
+
+def _with_fake_playwright(scenario):
+    playwright = FakePlaywright()
+    original = pool_module.async_playwright
+    pool_module.async_playwright = lambda: FakeStarter(playwright)
+    try:
+        return asyncio.run(scenario(playwright.chromium))
+    finally:
+        pool_module.async_playwright = original
+
+def test_recycle_by_pages():
+    """Test that the browser is replaced after recycle_after_pages pages"""
+
+    print("🧪 Testing Recycle by Pages")
+    print("=" * 50)
+
+    async def scenario(chromium):
+        pool = BrowserPool(max_pages=2, recycle_after_pages=3, max_rss_mb=0)
+        await pool.start()
+        held = pool.context()
+        await held.__aenter__()  # still open while its browser is retired
+        for _ in range(5):
+            async with pool.context():
+                pass
+        first_open_while_held = not chromium.launched[0].closed
+        await held.__aexit__(None, None, None)
+        stats = pool.stats()
+        await pool.stop()
+        return chromium.launched, first_open_while_held, stats
+
+    launched, first_open_while_held, stats = _with_fake_playwright(scenario)
+    assert len(launched) == 2 and stats["recycles"] == 1 and stats["pages_served"] == 6
+    assert first_open_while_held and launched[0].closed
+    print(f"✅ 6 pages with recycle_after_pages=3 used {len(launched)} browsers; the old one closed after its last context")
+
+def test_recycle_by_rss():
+    """Test that only the current browser's memory triggers a recycle"""
+
+    print("\n🧪 Testing Recycle by Memory")
+    print("=" * 50)
+
+    # Fake process table: each browser's PID is 1000 + its launch number
+    rss_by_pid = {1000: 2048.0, 1001: 100.0}
+    lookups = []
+
+    def find_pid(marker):
+        lookups.append(marker)
+        return 1000 + len(lookups) - 1
+
+    originals = pool_module._find_browser_pid, pool_module._process_tree_rss_mb
+    pool_module._find_browser_pid = find_pid
+    pool_module._process_tree_rss_mb = lambda pid: rss_by_pid[pid]
+
+    async def scenario(chromium):
+        pool = BrowserPool(max_pages=4, recycle_after_pages=0, max_rss_mb=1024, rss_check_interval=0)
+        await pool.start()
+        held = pool.context()
+        await held.__aenter__()  # the bloated browser keeps draining
+        for _ in range(5):
+            async with pool.context():
+                pass
+        await held.__aexit__(None, None, None)
+        recycles = pool.recycles
+        await pool.stop()
+        return chromium.launched, recycles
+
+    try:
+        launched, recycles = _with_fake_playwright(scenario)
+    finally:
+        pool_module._find_browser_pid, pool_module._process_tree_rss_mb = originals
+
+    assert recycles == 1 and len(launched) == 2
+    assert all(browser.args[0].startswith("--brokensite-pool-browser=") for browser in launched)
+    print("✅ The browser over the limit was recycled once; the draining one did not trigger more launches")
+
+    async def throttled(chromium):
+        pool = BrowserPool(max_pages=4, recycle_after_pages=0, max_rss_mb=1024, rss_check_interval=60)
+        await pool.start()
+        for _ in range(10):
+            async with pool.context():
+                pass
+        await pool.stop()
+        return pool.recycles
+
+    checks = []
+    original = BrowserPool._browser_rss_mb
+    BrowserPool._browser_rss_mb = lambda self, browser: checks.append(browser) or 4096.0
+    try:
+        recycles = _with_fake_playwright(throttled)
+    finally:
+        BrowserPool._browser_rss_mb = original
+    assert checks == [] and recycles == 0
+    print("✅ Memory is checked at most once per rss_check_interval")
+
+def test_process_tree_rss():
+    """Test the /proc reading against a real process tree"""
+
+    print("\n🧪 Testing Process Tree RSS")
+    print("=" * 50)
+
+    marker = "brokensite-test-marker"
+    parent = subprocess.Popen(["sh", "-c", f"sleep 5 & sleep 5; : {marker}"], start_new_session=True)
+    try:
+        time.sleep(0.2)
+        pid = pool_module._find_browser_pid(marker)
+        rss = pool_module._process_tree_rss_mb(parent.pid)
+        children = pool_module._children_by_parent().get(parent.pid, [])
+    finally:
+        os.killpg(parent.pid, signal.SIGKILL)
+        parent.wait()
+    assert pid == parent.pid
+    assert len(children) == 2 and rss is not None and rss > 0
+    assert pool_module._process_tree_rss_mb(parent.pid) is None
+    print(f"✅ Found the marked process and measured {rss:.1f} MB across it and {len(children)} children")
+
+if __name__ == "__main__":
+    test_recycle_by_pages()
+    test_recycle_by_rss()
+    test_process_tree_rss()
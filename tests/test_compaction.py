@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test script to verify token-budgeted compaction of tool results sent back to the model
+"""
+import sys
+import os
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics.compaction import compact_tool_outputs, estimate_tokens
+
+def test_compaction():
+    """Test field selection, budget sharing and truncation markers"""
+
+    print("🧪 Testing Tool Output Compaction")
+    print("=" * 50)
+
+    http = {
+        "url": "https://example.com", "method": "GET", "status_code": 500,
+        "headers": {"server": "nginx", "content-security-policy": "default-src 'self'; " * 40},
+        "body_sample": "<html>" + "x" * 4000,
+    }
+    dns = {"domain": "example.com", "records": {"A": ["93.184.216.34"], "TXT": ["v=spf1 " + "include:a.example " * 30] * 12}}
+    tls = {"host": "example.com", "port": 443, "verified": False, "verification_error": "certificate has expired"}
+    results = [("http_check", http), ("dns_lookup", dns), ("tls_probe", tls)]
+
+    unlimited = [json.loads(o) for o in compact_tool_outputs(results, 0)]
+    assert unlimited[0]["headers"] == {"server": "nginx"} and "method" not in unlimited[0]
+    assert unlimited[0]["body_sample"] == http["body_sample"]
+    print("✅ Irrelevant fields are dropped")
+
+    outputs = compact_tool_outputs(results, 600)
+    assert sum(estimate_tokens(o) for o in outputs) <= 600
+    # Small results are kept whole; large ones are truncated but stay valid JSON
+    assert json.loads(outputs[2]) == tls
+    compacted_http = json.loads(outputs[0])
+    assert compacted_http["status_code"] == 500 and "chars]" in compacted_http["body_sample"]
+    assert json.loads(outputs[1])["records"]["A"] == ["93.184.216.34"]
+    print(f"✅ {sum(estimate_tokens(o) for o in outputs)} tokens within a budget of 600")
+
+    # Results originals are untouched for tool_data
+    assert http["method"] == "GET" and len(http["body_sample"]) == 4006
+
+if __name__ == "__main__":
+    test_compaction()
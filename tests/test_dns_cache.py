@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared DNS cache (TTL, negative caching, LRU eviction)
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics.tools.dns_cache import DNSCache, cached_addresses, addresses_from_records, dns_cache
+
+def test_dns_cache():
+    """Test TTL expiry, negative entries and LRU eviction"""
+    
+    print("🧪 Testing DNS Cache")
+    print("=" * 50)
+    
+    cache = DNSCache(max_entries=2, negative_ttl=0.05)
+    
+    # Positive answers honor the record TTL
+    cache.put("Example.com.", "a", ["93.184.216.34"], ttl=0.05)
+    assert cache.get("example.com", "A") == ["93.184.216.34"]
+    time.sleep(0.06)
+    assert cache.get("example.com", "A") is None
+    print("✅ Entries expire after their TTL")
+    
+    # Negative answers are cached for the negative TTL
+    cache.put_negative("missing.example", "A", {"error": "NXDOMAIN"})
+    assert cache.get("missing.example", "A") == {"error": "NXDOMAIN"}
+    print("✅ Negative answers are cached")
+    
+    # Least recently used entry is evicted first
+    cache.put("a.example", "A", ["10.0.0.1"], ttl=60)
+    cache.put("b.example", "A", ["10.0.0.2"], ttl=60)
+    cache.get("a.example", "A")
+    cache.put("c.example", "A", ["10.0.0.3"], ttl=60)
+    assert cache.get("b.example", "A") is None
+    assert cache.get("a.example", "A") == ["10.0.0.1"]
+    print("✅ LRU eviction keeps recently used entries")
+    
+    # Address helpers used for connection pinning
+    dns_cache.put("pinned.example", "A", ["10.0.0.4"], ttl=60)
+    assert cached_addresses("pinned.example") == ["10.0.0.4"]
+    assert cached_addresses("127.0.0.1") == ["127.0.0.1"]
+    assert addresses_from_records({"records": {"A": ["10.0.0.5"], "AAAA": {"error": "x"}}}) == ["10.0.0.5"]
+    dns_cache.clear()
+    print("✅ Address helpers return pinned addresses")
+
+if __name__ == "__main__":
+    test_dns_cache()
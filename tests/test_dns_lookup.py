@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the parallel DNS lookup: one overall deadline and
+answers served from the shared cache, against a stub resolver
+"""
+import sys
+import os
+import time
+import asyncio
+from types import SimpleNamespace as NS
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import dns.rdatatype
+import dns.resolver
+from diagnostics import tools
+from diagnostics.config import settings
+from diagnostics.offline import run_offline_diagnosis_async
+from diagnostics.tools import dns_tools
+from diagnostics.tools.dns_cache import dns_cache
+
+class StubResolver:
+    """Answers from a table after a per-type delay; records every query"""
+
+    def __init__(self, answers, delays=None):
+        self.answers = answers
+        self.delays = delays or {}
+        self.queries = []
+
+    async def resolve(self, domain, rtype, raise_on_no_answer=True, lifetime=None):
+        self.queries.append((domain, rtype))
+        await asyncio.sleep(self.delays.get(rtype, 0.05))
+        answer = self.answers.get(rtype)
+        if isinstance(answer, Exception):
+            raise answer
+        if answer is None:
+            return NS(rrset=None, response=NS(authority=[_SOA(ttl=300, minimum=30)]))
+        return _Answer(answer, ttl=120)
+
+class _SOA(list):
+    def __init__(self, ttl, minimum):
+        super().__init__([NS(minimum=minimum)])
+        self.rdtype = dns.rdatatype.SOA
+        self.ttl = ttl
+
+class _Answer:
+    def __init__(self, records, ttl):
+        self.rrset = NS(ttl=ttl)
+        self._records = records
+
+    def __iter__(self):
+        return iter(NS(to_text=lambda r=r: r) for r in self._records)
+
+def _with_resolver(resolver, scenario):
+    original = dns_tools.dns.asyncresolver.resolve
+    dns_tools.dns.asyncresolver.resolve = resolver.resolve
+    dns_cache.clear()
+    try:
+        return asyncio.run(scenario())
+    finally:
+        dns_tools.dns.asyncresolver.resolve = original
+        dns_cache.clear()
+
+def test_parallel_lookup_and_deadline():
+    """Test that record types are queried at once under a single deadline"""
+
+    print("🧪 Testing Parallel DNS Lookup")
+    print("=" * 50)
+
+    resolver = StubResolver(
+        {"A": ["192.0.2.1"], "AAAA": ["2001:db8::1"], "MX": ["10 mail.example.com."], "TXT": None, "NS": ["ns1.example.com."]},
+        delays={"A": 0.1, "AAAA": 0.1, "MX": 0.1, "TXT": 0.1, "NS": 5},
+    )
+
+    async def scenario():
+        started = time.monotonic()
+        data = await dns_tools.dns_lookup_async("example.com", ["A", "AAAA", "MX", "TXT", "NS"], deadline=0.3)
+        return data, time.monotonic() - started
+
+    data, elapsed = _with_resolver(resolver, scenario)
+    records = data["records"]
+    assert records["A"] == ["192.0.2.1"] and records["MX"] == ["10 mail.example.com."]
+    assert records["TXT"] == []
+    assert "deadline of 0.3s exceeded" in records["NS"]["error"]
+    assert 0.25 < elapsed < 0.6, elapsed
+    print(f"✅ 5 record types in {elapsed:.2f}s: four answered in parallel, the slow one hit the deadline")
+
+def test_lookup_cache():
+    """Test that answers, empty answers and NXDOMAIN are served from the cache"""
+
+    print("\n🧪 Testing DNS Lookup Cache")
+    print("=" * 50)
+
+    resolver = StubResolver({"A": ["192.0.2.1"], "TXT": None, "MX": dns.resolver.NXDOMAIN()})
+
+    async def scenario():
+        first = await dns_tools.dns_lookup_async("example.com", ["A", "TXT", "MX"], deadline=1)
+        queried = len(resolver.queries)
+        second = await dns_tools.dns_lookup_async("EXAMPLE.com.", ["A", "TXT", "MX"], deadline=1)
+        # Callers get their own copies, so editing a result cannot poison the cache
+        second["records"]["A"].append("203.0.113.9")
+        third = await dns_tools.dns_lookup_async("example.com", ["A"], deadline=1)
+        return first, second, third, queried
+
+    first, second, third, queried = _with_resolver(resolver, scenario)
+    assert queried == 3 and len(resolver.queries) == 3
+    assert first["records"]["MX"]["error"] and first["records"]["TXT"] == []
+    assert second["records"]["MX"] == first["records"]["MX"]
+    assert third["records"]["A"] == ["192.0.2.1"]
+    print("✅ Repeat lookups answered from the cache, including empty and NXDOMAIN answers")
+
+    cache_entries = {}
+
+    async def capture():
+        await dns_tools.dns_lookup_async("example.com", ["TXT"], deadline=1)
+        cache_entries["ttl"] = dns_cache._entries[("example.com", "TXT")][0] - time.monotonic()
+
+    _with_resolver(StubResolver({"TXT": None}), capture)
+    assert 25 < cache_entries["ttl"] <= 30
+    print("✅ Empty answers are cached for the SOA minimum TTL")
+
+def test_offline_resolves_once():
+    """Test that the offline diagnosis shares one A/AAAA lookup with the HTTP/TLS probes"""
+
+    print("\n🧪 Testing Shared Address Resolution")
+    print("=" * 50)
+
+    pinned = {}
+
+    async def fake_http(url, addresses=None):
+        pinned["http"] = addresses
+        await asyncio.sleep(0.1)
+        return {"url": url, "status_code": 200, "final_url": url}
+
+    async def fake_tls(host, port=443, sni=True, addresses=None):
+        pinned["tls"] = addresses
+        await asyncio.sleep(0.1)
+        return {"host": host, "port": port, "days_until_expiry": 90}
+
+    def diagnose(resolver):
+        async def scenario():
+            started = time.monotonic()
+            report = await run_offline_diagnosis_async("example.com")
+            return report, time.monotonic() - started
+        return _with_resolver(resolver, scenario)
+
+    originals = tools.http_check_async, tools.tls_probe_async, settings.DNS_LOOKUP_DEADLINE
+    tools.http_check_async, tools.tls_probe_async, settings.DNS_LOOKUP_DEADLINE = fake_http, fake_tls, 0.3
+    try:
+        answers = {"A": ["192.0.2.1"], "AAAA": None, "CNAME": None, "MX": None, "NS": ["ns1.example.com."], "TXT": None}
+        resolver = StubResolver(answers, delays={"A": 0.1, "AAAA": 0.1})
+        report, elapsed = diagnose(resolver)
+        assert pinned == {"http": ["192.0.2.1"], "tls": ["192.0.2.1"]}
+        assert sorted(resolver.queries) == sorted(("example.com", r) for r in answers)
+        assert report.artifacts.raw_samples["dns"]["records"]["A"] == ["192.0.2.1"]
+        assert elapsed < 0.35, elapsed
+        print(f"✅ Each record type queried once; HTTP/TLS pinned to the answer ({elapsed:.2f}s)")
+
+        resolver = StubResolver(answers, delays={"A": 5, "AAAA": 5})
+        report, elapsed = diagnose(resolver)
+        assert pinned == {"http": None, "tls": None}
+        assert [q for q in resolver.queries if q[1] == "A"] == [("example.com", "A")]
+        assert "deadline" in report.artifacts.raw_samples["dns"]["records"]["A"]["error"]
+        assert elapsed < 0.55, elapsed
+        print(f"✅ A stalled resolver costs one deadline, then HTTP/TLS resolve on their own ({elapsed:.2f}s)")
+    finally:
+        tools.http_check_async, tools.tls_probe_async, settings.DNS_LOOKUP_DEADLINE = originals
+
+if __name__ == "__main__":
+    test_parallel_lookup_and_deadline()
+    test_lookup_cache()
+    test_offline_resolves_once()
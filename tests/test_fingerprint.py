@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared body fingerprint used by the http_tools detectors
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics.tools.fingerprint import fingerprint_body
+from diagnostics.tools.http_tools import (
+    detect_programming_language,
+    detect_domain_expired_page,
+    detect_cms_and_plugins,
+)
+
+def test_fingerprint_detectors():
+    """Test that detectors derive their outputs from one fingerprint"""
+    
+    print("🧪 Testing Body Fingerprint")
+    print("=" * 50)
+    
+    body = (
+        '<html><head><meta name="generator" content="WordPress 6.4.2">'
+        '<link href="/wp-content/themes/astra/style.css"></head>'
+        '<body class="woocommerce">Powered by WordPress & Yoast SEO</body></html>'
+    )
+    fp = fingerprint_body(body)
+    
+    cms = detect_cms_and_plugins(body, fp)
+    assert cms["cms"] == "WordPress"
+    assert cms["version"] == "6.4.2"
+    assert cms["themes"] == ["astra"]
+    assert cms["plugins"] == ["WooCommerce", "Yoast SEO"]
+    print(f"✅ CMS: {cms['cms']} {cms['version']} with {cms['plugins']}")
+    
+    tech = detect_programming_language({"x-powered-by": "PHP/8.2"}, body, fp)
+    assert tech == {"language": "PHP", "framework": "WordPress", "details": ""}
+    print(f"✅ Technology: {tech['language']} / {tech['framework']}")
+    
+    # Detectors still work without a precomputed fingerprint
+    assert detect_cms_and_plugins(body) == cms
+    
+    parked = 'window.onload=function(){window.location.href="/lander"}'
+    status = detect_domain_expired_page(parked, "https://example.com/", fingerprint_body(parked))
+    assert status["is_expired_page"] and status["provider"] == "GoDaddy"
+    print(f"✅ Domain status: {status['details']}")
+
+    # The redirect snippet only counts with its exact casing
+    shouted = parked.upper()
+    assert not detect_domain_expired_page(shouted, "https://example.com/")["is_expired_page"]
+    assert fingerprint_body(shouted).has("window.location.href=\"/lander\"")
+    print("✅ The lander redirect script is matched case-sensitively")
+    
+    # Every pattern is scanned at most once and only registered patterns are allowed
+    assert "wordpress" in fp.matches
+    try:
+        fp.has("not-a-registered-pattern")
+        raise AssertionError("unregistered pattern accepted")
+    except ValueError:
+        print("✅ Unregistered patterns are rejected")
+
+if __name__ == "__main__":
+    test_fingerprint_detectors()
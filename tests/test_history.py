@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the report history store: batched background writes,
+per-domain queries and the issue-category index
+"""
+import sys
+import os
+import time
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fastapi.testclient import TestClient
+from diagnostics import main, history
+from diagnostics.history import ReportHistory, domain_of
+
+def _report(summary, *categories):
+    return {
+        "summary": summary,
+        "issues": [{"id": f"issue_{c.lower()}", "category": c, "severity": "high", "evidence": "", "recommended_fix": ""} for c in categories],
+        "artifacts": {"screenshots": [], "raw_samples": {"tls": {"error": "boom"}}, "timings": {"total_ms": 12.5, "stages": []}},
+    }
+
+def test_history_store():
+    """Test batching, recent-reports queries and domains with issues"""
+
+    print("🧪 Testing Report History")
+    print("=" * 50)
+
+    assert domain_of("HTTPS://Example.com:8443/path") == "example.com" and domain_of("example.com") == "example.com"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ReportHistory(os.path.join(tmp, "history.sqlite3"), batch_size=50, flush_interval=5)
+        started = time.perf_counter()
+        for i in range(500):
+            store.record("offline", f"site{i % 10}.example", _report(f"run {i}", *(["TLS"] if i % 10 == 3 else [])))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        assert store.flush(timeout=10)
+        assert store.stats() == {"pending": 0, "written": 500, "dropped": 0}
+        print(f"✅ 500 reports recorded in {elapsed_ms:.1f}ms without touching the database, then written in batches")
+
+        store.record("openai", "https://site3.example/login", {"summary": "AI Analysis Complete", "details": "...", "timings": {"total_ms": 900}})
+        store.flush(timeout=10)
+        recent = store.recent("site3.example", limit=3)
+        assert [r["summary"] for r in recent] == ["AI Analysis Complete", "run 493", "run 483"]
+        assert recent[0]["mode"] == "openai" and recent[0]["total_ms"] == 900
+        assert recent[1]["report"]["artifacts"]["raw_samples"]["tls"] == {"error": "boom"}
+        assert "report" not in store.recent("site3.example", limit=1, include_report=False)[0]
+        print("✅ Latest reports per domain, newest first, with raw samples and timings")
+
+        tls = store.domains_with_issues("TLS", since=time.time() - 86400)
+        assert [d["domain"] for d in tls] == ["site3.example"] and tls[0]["reports"] == 50
+        assert store.domains_with_issues("TLS", since=time.time() + 60) == []
+        assert store.domains_with_issues("DNS", since=0) == []
+        print("✅ Domains with TLS issues in the last day")
+
+        assert store.purge(time.time() + 1) == 501
+        assert store.recent("site3.example") == [] and store.domains_with_issues("TLS", since=0) == []
+        store.close()
+        print("✅ Purging old reports removes their issues too")
+
+        store = ReportHistory(os.path.join(tmp, "full.sqlite3"), batch_size=1000, flush_interval=5, max_pending=10)
+        for i in range(15):
+            store.record("offline", "busy.example", _report(f"run {i}"))
+        store.close()
+        assert store.stats()["dropped"] == 5
+        assert [r["summary"] for r in ReportHistory(store.path).recent("busy.example", limit=1)] == ["run 14"]
+        print("✅ A backlog beyond max_pending drops the oldest reports; close() writes the rest")
+
+        store = ReportHistory(os.path.join(tmp, "slow.sqlite3"), batch_size=10, flush_interval=5)
+        # The writer holds the open connection for a while before using it
+        connect = store._connect
+        store._connect = lambda: (connect(), time.sleep(0.5))[0]
+        for i in range(3):
+            store.record("offline", "slow.example", _report(f"run {i}"))
+        thread = store._thread
+        store.close(timeout=0.1)
+        assert thread.is_alive() and store.written == 0
+        thread.join(5)
+        assert store.written == 3 and store.dropped == 0 and store._conn is None and store._thread is None
+        assert len(ReportHistory(store.path).recent("slow.example")) == 3
+        print("✅ A close() that times out leaves the writer to finish and close the database itself")
+
+def test_history_endpoints():
+    """Test /api/history and /api/history/issues"""
+
+    print("\n🧪 Testing History Endpoints")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = history.report_history
+        store = history.report_history = main.report_history = ReportHistory(os.path.join(tmp, "history.sqlite3"))
+        try:
+            history.record_report("offline", "example.com", _report("first", "TLS", "HTTP"))
+            history.record_report("offline", "example.org", _report("second"))
+            store.flush(timeout=10)
+            with TestClient(main.app) as client:
+                recent = client.get("/api/history", params={"domain": "https://example.com/"}).json()
+                issues = client.get("/api/history/issues", params={"category": "TLS", "hours": 1}).json()
+        finally:
+            store.close()
+            history.report_history = main.report_history = original
+
+    assert len(recent) == 1 and recent[0]["summary"] == "first" and recent[0]["issue_count"] == 2
+    assert [d["domain"] for d in issues["domains"]] == ["example.com"]
+    print("✅ History and issue queries served over the API")
+
+if __name__ == "__main__":
+    test_history_store()
+    test_history_endpoints()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script to verify byte-capped body reads and early parking-page detection in http_tools
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import httpx
+from diagnostics.tools.http_tools import _BodyReader
+
+def _response(url: str) -> httpx.Response:
+    return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, request=httpx.Request("GET", url))
+
+def test_body_reader():
+    """Test the byte cap, split-chunk snippet matching and lander URL handling"""
+
+    print("🧪 Testing Streamed Body Reader")
+    print("=" * 50)
+
+    # The cap is exact even when a chunk straddles it
+    reader = _BodyReader(_response("https://example.com/"), max_bytes=10)
+    assert reader.feed(b"12345678") is True
+    assert reader.feed(b"90abc") is False
+    assert reader.text() == "1234567890"
+    assert reader.bytes_read == 10 and reader.truncated and reader.stopped_early is None
+    print("✅ Body is capped at max_bytes")
+
+    # A body exactly at the cap is complete; one byte more is truncated
+    reader = _BodyReader(_response("https://example.com/"), max_bytes=10)
+    assert reader.feed(b"1234567890") is True
+    assert reader.bytes_read == 10 and not reader.truncated
+    reader = _BodyReader(_response("https://example.com/"), max_bytes=10)
+    assert reader.feed(b"12345") is True and reader.feed(b"67890") is True
+    assert reader.feed(b"x") is False
+    assert reader.text() == "1234567890" and reader.bytes_read == 10 and reader.truncated
+    reader = _BodyReader(_response("https://example.com/"), max_bytes=10)
+    assert reader.feed(b"1234567890x") is False
+    assert reader.bytes_read == 10 and reader.truncated
+    print("✅ Only bodies longer than max_bytes are marked truncated")
+
+    # A redirect snippet split across chunks still stops the read
+    body = 'aaa <script>window.location.href="/lander"</script> ' + "x" * 100
+    reader = _BodyReader(_response("https://example.com/"), max_bytes=1024)
+    keep_reading = True
+    for i in range(0, len(body), 7):
+        keep_reading = reader.feed(body[i:i + 7].encode())
+        if not keep_reading:
+            break
+    assert not keep_reading and reader.stopped_early == "godaddy_lander_redirect"
+    assert reader.bytes_read < len(body)
+    print(f"✅ Stopped early after {reader.bytes_read} bytes: {reader.stopped_early}")
+
+    # On a /lander URL the redirect snippet alone is not a final verdict
+    reader = _BodyReader(_response("https://example.com/lander"), max_bytes=1024)
+    assert reader.feed(b'window.location.href="/lander"') is True
+    assert reader.feed(b"<img src=//img1.wsimg.com/parking-lander/x.png>") is False
+    assert reader.stopped_early == "godaddy_parking_page"
+    print("✅ Lander URLs wait for the parking page markers")
+
+    # Multi-byte characters split across chunks decode cleanly
+    reader = _BodyReader(_response("https://example.com/"), max_bytes=1024)
+    data = "café".encode()
+    reader.feed(data[:4])
+    reader.feed(data[4:])
+    assert reader.text() == "café"
+    print("✅ Incremental decoding keeps split characters intact")
+
+if __name__ == "__main__":
+    test_body_reader()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the pooled HTTP clients: connections pinned to
+already-resolved addresses, and one async client per event loop that
+run_sync closes with its temporary loop
+"""
+import sys
+import os
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics.tools import http_client
+from diagnostics.tools.http_client import pinned_addresses, get_async_http_client
+from diagnostics.tools.http_tools import http_check, http_check_async
+from diagnostics.tools.dns_cache import dns_cache
+from diagnostics.tools.runtime import run_sync
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f"<html><body>host={self.headers['Host']}</body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_address_pinning():
+    """Test that probes connect to the pinned addresses but keep the URL's host name"""
+
+    print("🧪 Testing Address Pinning")
+    print("=" * 50)
+
+    server = _serve()
+    port = server.server_address[1]
+    # .invalid never resolves, so a successful request proves the pin was used
+    url = f"http://pinned.invalid:{port}/"
+    try:
+        result = http_check(url, addresses=["127.0.0.1"])
+        assert "error" not in result and result["status_code"] == 200, result
+        assert f"host=pinned.invalid:{port}" in result["body_sample"]
+        assert pinned_addresses.get() == {}
+        print("✅ Sync probe connected to the pinned address with the original Host header")
+
+        # 127.0.0.2 is loopback too but nothing listens there, so the next address is tried
+        result = run_sync(http_check_async(url, addresses=["127.0.0.2", "127.0.0.1"]))
+        assert "error" not in result and result["status_code"] == 200, result
+        print("✅ Async probe fell through an unreachable pinned address to the next one")
+
+        dns_cache.put("cached.invalid", "A", ["127.0.0.1"], ttl=60)
+        try:
+            result = http_check(f"http://cached.invalid:{port}/")
+        finally:
+            dns_cache.clear()
+        assert "error" not in result and result["status_code"] == 200, result
+        print("✅ Without a pin, addresses already in the DNS cache are used")
+
+        async def scoped():
+            token = pinned_addresses.set({"outer.invalid": ["127.0.0.1"]})
+            try:
+                # run_sync from inside a loop runs on a helper thread with a copy of the context
+                return run_sync(_pins())
+            finally:
+                pinned_addresses.reset(token)
+
+        async def _pins():
+            return pinned_addresses.get()
+
+        assert asyncio.run(scoped()) == {"outer.invalid": ["127.0.0.1"]}
+        assert pinned_addresses.get() == {}
+        print("✅ Pins follow the caller's context into run_sync and are reset afterwards")
+    finally:
+        server.shutdown()
+        server.server_close()
+        http_client.close_http_clients()
+
+def test_async_client_per_loop():
+    """Test that each event loop gets its own async client, closed by run_sync"""
+
+    print("\n🧪 Testing Per-Loop Async Clients")
+    print("=" * 50)
+
+    async def grab():
+        client = get_async_http_client()
+        assert get_async_http_client() is client
+        return client
+
+    first = run_sync(grab())
+    second = run_sync(grab())
+    assert first is not second
+    assert first.is_closed and second.is_closed
+    assert len(http_client._async_clients) == 0
+    print("✅ Each run_sync loop got its own client and closed it on the way out")
+
+    async def outer():
+        client = get_async_http_client()
+        inner = run_sync(grab())
+        assert inner is not client and inner.is_closed
+        assert not client.is_closed and http_client._async_clients.get(asyncio.get_running_loop()) is client
+        await http_client.aclose_http_clients()
+        return client
+
+    client = asyncio.run(outer())
+    assert client.is_closed and len(http_client._async_clients) == 0
+    print("✅ run_sync inside a running loop leaves that loop's client open until it is closed")
+
+if __name__ == "__main__":
+    test_address_pinning()
+    test_async_client_per_loop()
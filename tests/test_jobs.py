@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test script to verify background diagnosis jobs: the SQLite queue, polling,
+attaching to a job's stream and recovery after a restart
+"""
+import sys
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import httpx
+from diagnostics import main
+from diagnostics.jobs import JobQueue, JobStore
+
+async def fake_offline(target):
+    yield {"type": "status", "message": f"Probing {target}"}
+    await asyncio.sleep(0.2)
+    if target == "broken.example":
+        yield {"type": "error", "message": "probe exploded"}
+        return
+    yield {"type": "result", "data": {"summary": f"report for {target}"}}
+
+def test_job_queue():
+    """Test submit, poll, failure and persistence across a restart"""
+
+    print("🧪 Testing Job Queue")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.sqlite3")
+
+        async def first_run():
+            queue = JobQueue(path, workers=2, runners={"offline": fake_offline})
+            await queue.start()
+            assert not os.path.exists(path), "the database is created on first submit"
+            good = await queue.submit("offline", "good.example")
+            bad = await queue.submit("offline", "broken.example")
+            assert good["status"] == "queued" and good["attempts"] == 0
+            for _ in range(50):
+                if (await queue.get(bad["id"]))["status"] == "failed" and (await queue.get(good["id"]))["status"] == "done":
+                    break
+                await asyncio.sleep(0.05)
+            # A third job is still running when the server stops
+            interrupted = await queue.submit("offline", "slow.example")
+            for _ in range(20):
+                if interrupted["id"] in queue._running:
+                    break
+                await asyncio.sleep(0.005)
+            assert (await queue.get(interrupted["id"]))["status"] == "running"
+            await queue.stop()
+            return good["id"], bad["id"], interrupted["id"]
+
+        good, bad, interrupted = asyncio.run(first_run())
+        store = JobStore(path)
+        assert store.get(good)["status"] == "done" and store.get(good)["result"] == {"summary": "report for good.example"}
+        assert store.get(bad)["status"] == "failed" and store.get(bad)["error"] == "probe exploded"
+        assert store.get(interrupted)["status"] == "queued"
+        store.close()
+        print("✅ Results stored; a job interrupted by shutdown goes back to the queue")
+
+        async def second_run():
+            queue = JobQueue(path, workers=1, runners={"offline": fake_offline})
+            await queue.start()
+            events = [event async for event in queue.follow(interrupted)]
+            job = await queue.get(interrupted)
+            await queue.stop()
+            return events, job
+
+        events, job = asyncio.run(second_run())
+        assert job["status"] == "done" and job["attempts"] == 2
+        assert events[-1] == {"type": "result", "data": {"summary": "report for slow.example"}, "job_id": interrupted}
+        print(f"✅ Restart resumed the interrupted job (attempt {job['attempts']})")
+
+        store = JobStore(path)
+        # Left running by a process that died: its lease has run out
+        store._conn.execute("UPDATE jobs SET status = 'running', attempts = 3, lease_expires_at = 0 WHERE id = ?", (good,))
+        assert store.recover(max_attempts=3) == 0
+        assert store.get(good)["status"] == "failed"
+        assert store.purge(older_than=float("inf")) == 3 and store.get(bad) is None
+        store.close()
+        print("✅ Jobs interrupted too often fail; old jobs are purged")
+
+def test_job_leases():
+    """Test that recovery only takes back jobs whose owner stopped renewing the lease"""
+
+    print("\n🧪 Testing Job Leases")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.sqlite3")
+        worker = JobStore(path, lease_sec=0.3)
+        other = JobStore(path, lease_sec=0.3)
+        job = worker.add("offline", "shared.example")
+        claimed = worker.claim()
+        assert claimed["id"] == job["id"] and claimed["owner"] == worker.owner != other.owner
+
+        # Another process starting up leaves a job with a live lease alone
+        assert other.recover(max_attempts=3) == 0 and other.get(job["id"])["status"] == "running"
+        for _ in range(3):
+            time.sleep(0.15)
+            assert worker.heartbeat() == 1
+        assert other.recover(max_attempts=3) == 0
+        print("✅ A running job with a renewed lease is not requeued by another process")
+
+        time.sleep(0.4)
+        assert other.recover(max_attempts=3) == 1
+        retaken = other.claim()
+        assert retaken["id"] == job["id"] and retaken["owner"] == other.owner and retaken["attempts"] == 2
+        # The original owner comes back too late: its outcome and requeue are ignored
+        assert worker.finish(job["id"], {"summary": "stale"}, None) is False
+        worker.requeue(job["id"])
+        assert other.get(job["id"])["status"] == "running"
+        assert other.finish(job["id"], {"summary": "fresh"}, None) is True
+        assert other.get(job["id"])["result"] == {"summary": "fresh"}
+        worker.close()
+        other.close()
+        print("✅ An expired lease lets another process take the job; the late owner cannot overwrite it")
+
+        # Databases created before leases existed gain the columns on open
+        legacy = os.path.join(tmp, "legacy.sqlite3")
+        conn = sqlite3.connect(legacy)
+        conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, mode TEXT NOT NULL, target TEXT NOT NULL, status TEXT NOT NULL, "
+                     "created_at REAL NOT NULL, started_at REAL, finished_at REAL, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT)")
+        conn.execute("INSERT INTO jobs (id, mode, target, status, created_at, attempts) VALUES ('old', 'offline', 'old.example', 'running', 0, 1)")
+        conn.commit()
+        conn.close()
+        store = JobStore(legacy)
+        assert store.recover(max_attempts=3) == 1 and store.claim()["owner"] == store.owner
+        store.close()
+        print("✅ Older databases are migrated and their running jobs recovered")
+
+def test_job_endpoints():
+    """Test POST /api/jobs, polling and the SSE stream"""
+
+    print("\n🧪 Testing Job Endpoints")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = main.job_queue
+        main.job_queue = JobQueue(os.path.join(tmp, "jobs.sqlite3"), workers=1, runners={"offline": fake_offline})
+        try:
+            async def scenario():
+                transport = httpx.ASGITransport(app=main.app)
+                try:
+                    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                        submitted = await client.post("/api/jobs?mode=offline", json={"target": "good.example"})
+                        job_id = submitted.json()["id"]
+                        stream = await client.get(f"/api/jobs/{job_id}/stream")
+                        polled = await client.get(f"/api/jobs/{job_id}")
+                        missing = await client.get("/api/jobs/nope")
+                        return submitted, stream, polled, missing
+                finally:
+                    await main.job_queue.stop()
+            submitted, stream, polled, missing = asyncio.run(scenario())
+        finally:
+            main.job_queue = original
+
+    assert submitted.status_code == 202 and submitted.json()["status"] == "queued"
+    print(f"✅ Job {submitted.json()['id']} accepted with 202")
+
+    events = [json.loads(line[6:]) for line in stream.text.splitlines() if line.startswith("data: {")]
+    assert {"type": "status", "message": "Probing good.example"} in events
+    assert events[-1]["type"] == "result" and events[-1]["data"]["summary"] == "report for good.example"
+    assert stream.text.rstrip().endswith("data: [DONE]")
+    print(f"✅ Stream attached to the job and delivered {len(events)} events ending in its result")
+
+    assert polled.json()["status"] == "done" and polled.json()["result"]["summary"] == "report for good.example"
+    assert missing.status_code == 404
+    print("✅ Polling returns the stored result; unknown ids get 404")
+
+if __name__ == "__main__":
+    test_job_queue()
+    test_job_leases()
+    test_job_endpoints()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the Prometheus /metrics endpoint and the metric types behind it
+"""
+import sys
+import os
+import asyncio
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fastapi.testclient import TestClient
+from diagnostics import main, metrics
+from diagnostics.report_cache import report_cache
+from diagnostics.schemas import DiagnosticReport
+
+def test_metric_types():
+    """Test exposition format, histogram buckets and concurrent updates"""
+
+    print("🧪 Testing Metric Types")
+    print("=" * 50)
+
+    registry = metrics.Registry()
+    counter = registry.counter("demo_requests_total", "Requests", ["route"])
+    histogram = registry.histogram("demo_seconds", "Latency", ["route"], buckets=[0.1, 1])
+    registry.callback("demo_ratio", "Ratio", "gauge", lambda: [({"cache": 'we"ird'}, 0.5)])
+
+    def hammer():
+        for _ in range(10000):
+            counter.labels("/a").inc()
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.labels("/a").observe(value)
+
+    text = registry.render()
+    assert '# TYPE demo_requests_total counter' in text
+    assert 'demo_requests_total{route="/a"} 40000' in text
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="1.0"} 3' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{route="/a"} 4' in text and 'demo_seconds_sum{route="/a"} 3.65' in text
+    assert 'demo_ratio{cache="we\\"ird"} 0.5' in text
+    print("✅ Counters, cumulative histogram buckets and label escaping")
+
+    try:
+        counter.labels()
+        assert False, "missing labels should raise"
+    except ValueError:
+        pass
+    print("✅ Wrong label count rejected")
+
+def _sample(text, series):
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.split(" ")[-1])
+    return 0.0
+
+def test_metrics_endpoint():
+    """Test that a diagnosis shows up on /metrics"""
+
+    print("\n🧪 Testing /metrics Endpoint")
+    print("=" * 50)
+
+    async def fake_diagnosis(target):
+        await asyncio.sleep(0.01)
+        return DiagnosticReport(summary="measured")
+
+    runs = 'brokensite_diagnosis_duration_seconds_count{mode="offline",outcome="ok"}'
+    hits = 'brokensite_cache_lookups_total{cache="report",result="hit"}'
+    original = main.run_offline_diagnosis_async
+    main.run_offline_diagnosis_async = fake_diagnosis
+    report_cache.clear()
+    try:
+        with TestClient(main.app) as client:
+            before = client.get("/metrics").text
+            for _ in range(2):
+                client.post("/api/diagnose/stream?mode=offline", json={"target": "metrics.example"})
+            text = client.get("/metrics").text
+    finally:
+        main.run_offline_diagnosis_async = original
+        report_cache.clear()
+
+    # Metrics are process-wide, so compare against the scrape taken before
+    assert _sample(text, runs) - _sample(before, runs) == 1
+    assert _sample(text, hits) == 1
+    assert 'brokensite_cache_hit_ratio{cache="report"} 0.5' in text
+    assert 'brokensite_diagnoses_in_flight{mode="offline"} 0' in text
+    assert 'brokensite_streams_open{endpoint="diagnose"} 0' in text
+    assert "# TYPE brokensite_event_loop_lag_seconds gauge" in text
+    print("✅ Diagnosis latency, in-flight gauges and cache hit ratio exported")
+
+if __name__ == "__main__":
+    test_metric_types()
+    test_metrics_endpoint()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the page readiness wait (DOM mutations plus network
+quiet) against a fake Playwright page
+"""
+import sys
+import os
+import time
+import asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from diagnostics.tools.screenshot_tools import _NetworkTracker, wait_for_page_ready
+
+class FakePage:
+    """Fires request events and reports the time since the last DOM mutation"""
+
+    def __init__(self):
+        self.handlers = {}
+        self.last_mutation = time.monotonic()
+        self.navigating_until = 0.0
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event):
+        for handler in self.handlers.get(event, []):
+            handler(object())
+
+    def mutate(self):
+        self.last_mutation = time.monotonic()
+
+    async def evaluate(self, script):
+        if time.monotonic() < self.navigating_until:
+            raise RuntimeError("Execution context was destroyed, most likely because of a navigation")
+        return (time.monotonic() - self.last_mutation) * 1000
+
+async def _mutate_for(page, seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        page.mutate()
+        await asyncio.sleep(0.02)
+
+def test_settles_after_mutations_stop():
+    """Test that readiness waits for the DOM to stop changing"""
+
+    print("🧪 Testing Readiness After DOM Mutations")
+    print("=" * 50)
+
+    async def scenario():
+        page = FakePage()
+        tracker = _NetworkTracker(page)
+        mutations = asyncio.create_task(_mutate_for(page, 0.3))
+        ready = await wait_for_page_ready(page, tracker, quiet_ms=200, max_wait_ms=3000, max_inflight=0)
+        await mutations
+        return ready
+
+    ready = asyncio.run(scenario())
+    assert ready["condition"] == "settled" and 450 <= ready["waited_ms"] < 1500, ready
+    print(f"✅ Settled {ready['waited_ms']}ms in: 300ms of mutations plus 200ms of quiet")
+
+    async def busy():
+        page = FakePage()
+        tracker = _NetworkTracker(page)
+        mutations = asyncio.create_task(_mutate_for(page, 2))
+        try:
+            return await wait_for_page_ready(page, tracker, quiet_ms=200, max_wait_ms=400, max_inflight=0)
+        finally:
+            mutations.cancel()
+
+    ready = asyncio.run(busy())
+    assert ready["condition"] == "max_wait" and 400 <= ready["waited_ms"] < 1000, ready
+    print(f"✅ A page that never stops changing gives up after max_wait ({ready['waited_ms']}ms)")
+
+def test_network_and_navigation():
+    """Test that open requests and navigations hold readiness back"""
+
+    print("\n🧪 Testing Readiness With Network Activity")
+    print("=" * 50)
+
+    async def scenario(max_inflight):
+        page = FakePage()
+        tracker = _NetworkTracker(page)
+        page.emit("request")
+        page.emit("request")
+        page.emit("requestfinished")
+
+        async def finish_later():
+            await asyncio.sleep(0.4)
+            page.emit("requestfailed")
+
+        finisher = asyncio.create_task(finish_later())
+        ready = await wait_for_page_ready(page, tracker, quiet_ms=100, max_wait_ms=3000, max_inflight=max_inflight)
+        finisher.cancel()
+        return ready
+
+    ready = asyncio.run(scenario(max_inflight=0))
+    assert ready["condition"] == "settled" and ready["waited_ms"] >= 450 and ready["inflight_requests"] == 0, ready
+    print(f"✅ Waited for the open request to finish, then for quiet ({ready['waited_ms']}ms)")
+
+    ready = asyncio.run(scenario(max_inflight=1))
+    assert ready["condition"] == "settled" and ready["waited_ms"] < 350 and ready["inflight_requests"] == 1, ready
+    print(f"✅ One long-lived request within max_inflight does not block readiness ({ready['waited_ms']}ms)")
+
+    async def navigating():
+        page = FakePage()
+        page.last_mutation -= 10
+        page.navigating_until = time.monotonic() + 0.3
+        return await wait_for_page_ready(page, _NetworkTracker(page), quiet_ms=100, max_wait_ms=3000, max_inflight=0)
+
+    ready = asyncio.run(navigating())
+    assert ready["condition"] == "settled" and ready["waited_ms"] >= 300, ready
+    print(f"✅ Kept waiting through a navigation ({ready['waited_ms']}ms)")
+
+if __name__ == "__main__":
+    test_settles_after_mutations_stop()
+    test_network_and_navigation()
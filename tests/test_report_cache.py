@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the whole-report cache (normalized keys, TTL, byte-bounded LRU, fresh=true)
+"""
+import sys
+import os
+import json
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fastapi.testclient import TestClient
+from diagnostics import main
+from diagnostics.report_cache import ReportCache, normalize_target, report_cache
+from diagnostics.schemas import DiagnosticReport
+
+def test_report_cache():
+    """Test the cache on its own and through the streaming endpoint"""
+
+    print("🧪 Testing Report Cache")
+    print("=" * 50)
+
+    assert normalize_target("Example.COM") == "https://example.com"
+    assert normalize_target("https://example.com:443/") == "https://example.com"
+    assert normalize_target("http://Example.com:8080/Path?q=1") == "http://example.com:8080/Path?q=1"
+    print("✅ Targets are normalized")
+
+    cache = ReportCache(ttl=0.2, max_bytes=200)
+    cache.put("offline", "a.com", {"summary": "a" * 50})
+    cache.put("offline", "b.com", {"summary": "b" * 50})
+    assert cache.get("offline", "https://A.com/")["summary"] == "a" * 50
+    assert cache.get("openai", "a.com") is None
+    # a.com was used most recently, so b.com is evicted when c.com pushes past max_bytes
+    cache.put("offline", "c.com", {"summary": "c" * 80})
+    assert cache.get("offline", "b.com") is None
+    assert cache.get("offline", "a.com") is not None
+    assert cache.bytes_used <= 200
+    time.sleep(0.25)
+    assert cache.get("offline", "a.com") is None
+    print(f"✅ LRU and TTL eviction: {cache.stats()}")
+
+    calls = []
+
+    async def fake_diagnosis(target):
+        calls.append(target)
+        return DiagnosticReport(summary=f"report {len(calls)}")
+
+    original = main.run_offline_diagnosis_async
+    main.run_offline_diagnosis_async = fake_diagnosis
+    report_cache.clear()
+    try:
+        client = TestClient(main.app)
+
+        def result_of(url):
+            events = [json.loads(line[6:]) for line in client.post(url, json={"target": "Example.com"}).text.splitlines()
+                      if line.startswith("data: {")]
+            return [e for e in events if e["type"] == "result"][0]
+
+        first = result_of("/api/diagnose/stream?mode=offline")
+        second = result_of("/api/diagnose/stream?mode=offline")
+        assert len(calls) == 1 and second.get("cached") is True
+        assert second["data"]["summary"] == first["data"]["summary"]
+        print("✅ Repeat diagnosis served from cache")
+
+        third = result_of("/api/diagnose/stream?mode=offline&fresh=true")
+        assert len(calls) == 2 and "cached" not in third
+        print("✅ fresh=true bypasses the cache")
+    finally:
+        main.run_offline_diagnosis_async = original
+        report_cache.clear()
+
+if __name__ == "__main__":
+    test_report_cache()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script to verify single-flight coalescing of concurrent diagnoses
+"""
+import sys
+import os
+import asyncio
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import httpx
+from diagnostics import main
+from diagnostics.report_cache import report_cache
+from diagnostics.schemas import DiagnosticReport
+from diagnostics.singleflight import SingleFlight
+
+def test_singleflight():
+    """Test replay for late subscribers, cancellation and the streaming endpoint"""
+
+    print("🧪 Testing Single-Flight Diagnoses")
+    print("=" * 50)
+
+    async def scenario():
+        flights = SingleFlight()
+        runs = []
+
+        async def producer():
+            runs.append(1)
+            for i in range(4):
+                yield {"type": "status", "step": i}
+                await asyncio.sleep(0.02)
+
+        async def collect(delay):
+            await asyncio.sleep(delay)
+            return [e["step"] async for e in flights.subscribe("a.com", producer)]
+
+        first, late = await asyncio.gather(collect(0), collect(0.03))
+        assert first == late == [0, 1, 2, 3]
+        assert len(runs) == 1 and flights.stats()["coalesced"] == 1
+        assert flights.stats()["in_flight"] == 0
+        print("✅ Late subscriber replays the shared run")
+
+        cancelled = asyncio.Event()
+
+        async def slow_producer():
+            try:
+                yield {"type": "status"}
+                await asyncio.sleep(10)
+            finally:
+                cancelled.set()
+
+        stream = flights.subscribe("b.com", slow_producer)
+        await stream.__anext__()
+        await stream.aclose()
+        # A request arriving before the cancelled run has wound down starts its own
+        assert not flights.in_flight("b.com")
+        fresh = [e async for e in flights.subscribe("b.com", producer)]
+        assert len(fresh) == 4
+        await asyncio.wait_for(cancelled.wait(), 1)
+        print("✅ Run is cancelled when every subscriber leaves; the next request starts afresh")
+
+    asyncio.run(scenario())
+
+    calls = []
+
+    async def fake_diagnosis(target):
+        calls.append(target)
+        await asyncio.sleep(0.1)
+        return DiagnosticReport(summary="shared")
+
+    original = main.run_offline_diagnosis_async
+    main.run_offline_diagnosis_async = fake_diagnosis
+    report_cache.clear()
+    try:
+        async def concurrent_requests():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*[
+                    client.post("/api/diagnose/stream?mode=offline&fresh=true", json={"target": "down.example"})
+                    for _ in range(5)
+                ])
+
+        responses = asyncio.run(concurrent_requests())
+        assert len(calls) == 1
+        bodies = {r.text for r in responses}
+        assert len(bodies) == 1
+        events = [json.loads(line[6:]) for line in bodies.pop().splitlines() if line.startswith("data: {")]
+        assert events[-1]["type"] == "result" and events[-1]["data"]["summary"] == "shared"
+        print(f"✅ 5 concurrent requests, {len(calls)} diagnosis run")
+    finally:
+        main.run_offline_diagnosis_async = original
+        report_cache.clear()
+
+if __name__ == "__main__":
+    test_singleflight()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the per-stage timing waterfall in offline reports,
+agent results and streamed timing events
+"""
+import sys
+import os
+import time
+import json
+import asyncio
+from types import SimpleNamespace as NS
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fastapi.testclient import TestClient
+from diagnostics import agent, main, timing, tools
+from diagnostics.config import settings
+from diagnostics.offline import run_offline_diagnosis
+from diagnostics.report_cache import report_cache
+
+def test_waterfall():
+    """Test stage offsets, draining and error marking"""
+
+    print("🧪 Testing Timing Waterfall")
+    print("=" * 50)
+
+    waterfall = timing.Waterfall()
+    with waterfall.stage("outer"):
+        time.sleep(0.02)
+        with timing.activate(waterfall), timing.stage("inner"):
+            timing.annotate(prefetched=True)
+            time.sleep(0.02)
+    try:
+        with waterfall.stage("broken"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    drained = waterfall.drain()
+    assert [s["stage"] for s in drained] == ["inner", "outer", "broken"]
+    assert waterfall.drain() == []
+    stages = waterfall.as_dict()["stages"]
+    assert [s["stage"] for s in stages] == ["outer", "inner", "broken"]
+    outer, inner, broken = stages
+    assert outer["duration_ms"] >= 40 and inner["duration_ms"] >= 20
+    assert outer["start_ms"] <= inner["start_ms"] and inner["end_ms"] <= outer["end_ms"]
+    assert inner["prefetched"] is True and broken["error"] == "ValueError"
+    print("✅ Nested stages, attributes and errors recorded")
+
+    with timing.stage("ignored") as span:
+        timing.annotate(ignored=True)
+    assert span == {} and timing.current() is None
+    print("✅ stage() is a no-op outside a diagnosis")
+
+def _patch_probes():
+    async def fake_dns(domain, record_types):
+        await asyncio.sleep(0.01)
+        return {"domain": domain, "records": {r: [] for r in record_types}}
+
+    async def fake_http(url, addresses=None):
+        with timing.stage("http_check.body"):
+            await asyncio.sleep(0.05)
+        return {"url": url, "status_code": 200, "final_url": url}
+
+    async def fake_tls(host, port=443, sni=True, addresses=None):
+        await asyncio.sleep(0.02)
+        return {"host": host, "port": port, "days_until_expiry": 90}
+
+    names = ["dns_lookup_async", "http_check_async", "tls_probe_async"]
+    originals = [getattr(tools, n) for n in names]
+    for name, fake in zip(names, [fake_dns, fake_http, fake_tls]):
+        setattr(tools, name, fake)
+
+    def restore():
+        for name, original in zip(names, originals):
+            setattr(tools, name, original)
+
+    return restore
+
+def test_offline_timings():
+    """Test the offline report waterfall and the streamed timing events"""
+
+    print("\n🧪 Testing Offline Diagnosis Timings")
+    print("=" * 50)
+
+    restore = _patch_probes()
+    report_cache.clear()
+    try:
+        report = run_offline_diagnosis("timed.example")
+        stages = {s["stage"]: s for s in report.artifacts.timings["stages"]}
+        assert set(stages) == {"resolve_addresses", "dns_lookup", "http_check", "http_check.body", "tls_probe", "build_report"}
+        assert stages["http_check.body"]["duration_ms"] >= 50
+        # The probes overlap, so the total stays near the slowest one
+        assert report.artifacts.timings["total_ms"] < 200
+        summary = ", ".join(f"{name} {span['duration_ms']}ms" for name, span in stages.items())
+        print(f"✅ Report waterfall: {summary}")
+
+        body = TestClient(main.app).post("/api/diagnose/stream?mode=offline&fresh=true", json={"target": "timed.example"}).text
+        events = [json.loads(line[6:]) for line in body.splitlines() if line.startswith("data: {")]
+        timings = [e["stage"] for e in events if e["type"] == "timing"]
+        assert len(timings) == 6 and events[-1]["type"] == "result"
+        assert events.index(next(e for e in events if e["type"] == "timing")) < len(events) - 1
+        assert len(events[-1]["data"]["artifacts"]["timings"]["stages"]) == 6
+        print(f"✅ {len(timings)} timing events streamed before the result")
+    finally:
+        restore()
+        report_cache.clear()
+
+class FakeResponses:
+    """One tool call, then a short final answer"""
+
+    def __init__(self):
+        self.requests = 0
+
+    def create(self, **kwargs):
+        self.requests += 1
+        if self.requests == 1:
+            item = NS(type="function_call", id="fc_0", call_id="call_0", name="dns_lookup", arguments="")
+            return iter([
+                NS(type="response.output_item.added", item=item),
+                NS(type="response.function_call_arguments.done", item_id="fc_0", arguments=json.dumps({"domain": "a.com"})),
+                NS(type="response.completed"),
+            ])
+        return iter([
+            NS(type="response.output_text.delta", delta="## Summary\nAll good"),
+            NS(type="response.completed"),
+        ])
+
+def test_agent_timings():
+    """Test that tool calls and both model calls are timed"""
+
+    print("\n🧪 Testing Agent Timings")
+    print("=" * 50)
+
+    def slow_tool(name, args, prefetch=None):
+        time.sleep(0.05)
+        return {"tool": name}
+
+    original_client, original_execute, original_prefetch = agent._create_client, agent.execute_tool, settings.AGENT_PREFETCH
+    agent._create_client = lambda: NS(responses=FakeResponses())
+    agent.execute_tool = slow_tool
+    settings.AGENT_PREFETCH = False
+    try:
+        updates = list(agent.run_agent_streaming("a.com"))
+    finally:
+        agent._create_client, agent.execute_tool, settings.AGENT_PREFETCH = original_client, original_execute, original_prefetch
+
+    timed = [u for u in updates if u["type"] == "timing"]
+    assert [u["stage"] for u in timed] == ["openai.initial", "dns_lookup", "openai.final"]
+    assert all("first_event_ms" in u for u in timed if u["stage"].startswith("openai."))
+    assert timed[1]["duration_ms"] >= 50
+    waterfall = updates[-1]["data"]["timings"]
+    assert [s["stage"] for s in waterfall["stages"]] == ["openai.initial", "dns_lookup", "openai.final"]
+    print(f"✅ Timing events and result waterfall ({waterfall['total_ms']}ms total)")
+
+if __name__ == "__main__":
+    test_waterfall()
+    test_offline_timings()
+    test_agent_timings()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the single-handshake TLS probe against local TLS servers
+(self-signed, expired and CA-issued certificates)
+"""
+import sys
+import os
+import ssl
+import asyncio
+import datetime
+import ipaddress
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from cryptography.x509.verification import Store
+from diagnostics.tools import tls_tools
+
+def _name(common_name):
+    return x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+
+def _certificate(subject, issuer, key, signing_key, days, ca=False):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(_name(subject))
+        .issuer_name(_name(issuer))
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=60))
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(signing_key.public_key()), critical=False)
+    )
+    if ca:
+        builder = (builder
+                   .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+                   .add_extension(x509.KeyUsage(False, False, False, False, False, True, True, False, False), critical=True))
+    else:
+        builder = (builder
+                   .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+                   .add_extension(x509.ExtendedKeyUsage([x509.oid.ExtendedKeyUsageOID.SERVER_AUTH]), critical=False))
+    return builder.sign(signing_key, hashes.SHA256())
+
+def _server_context(tmp, chain, key):
+    cert_path, key_path = os.path.join(tmp, "cert.pem"), os.path.join(tmp, "key.pem")
+    with open(cert_path, "wb") as f:
+        for cert in chain:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert_path, key_path)
+    return ctx
+
+async def _probe(server_ctx):
+    async def handle(reader, writer):
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=server_ctx)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return await tls_tools.tls_probe_async("localhost", port, addresses=["127.0.0.1"])
+    finally:
+        server.close()
+        await server.wait_closed()
+
+def test_tls_probe():
+    """Test certificate details and local verification from one handshake"""
+
+    print("🧪 Testing TLS Probe")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key = ec.generate_private_key(ec.SECP256R1())
+        self_signed = _certificate("localhost", "localhost", key, key, days=30)
+        result = asyncio.run(_probe(_server_context(tmp, [self_signed], key)))
+        assert "error" not in result and result["tls_version"].startswith("TLS")
+        assert result["subject"] == {"commonName": "localhost"} and result["issuer"] == {"commonName": "localhost"}
+        assert result["days_until_expiry"] in (29, 30) and result["chain_length"] == 1
+        assert result["verified"] is False and result["verification_error"]
+        print(f"✅ Self-signed certificate read and rejected: {result['verification_error'][:60]}")
+
+        expired = _certificate("localhost", "localhost", key, key, days=-2)
+        result = asyncio.run(_probe(_server_context(tmp, [expired], key)))
+        assert result["verified"] is False and result["verification_error"]
+        assert result["days_until_expiry"] < 0
+        print(f"✅ Expired certificate still described ({result['days_until_expiry']} days until expiry)")
+
+        ca_key = ec.generate_private_key(ec.SECP256R1())
+        ca = _certificate("Test Root", "Test Root", ca_key, ca_key, days=365, ca=True)
+        leaf = _certificate("localhost", "Test Root", key, ca_key, days=90)
+        original_store = tls_tools._trust_store
+        tls_tools._trust_store = Store([ca])
+        try:
+            result = asyncio.run(_probe(_server_context(tmp, [leaf, ca], key)))
+        finally:
+            tls_tools._trust_store = original_store
+        assert result["issuer"] == {"commonName": "Test Root"} and result["chain_length"] == 2
+        assert result["verified"] is True and "verification_error" not in result
+        print(f"✅ CA-issued certificate verified (chain of {result['chain_length']} from the handshake)")
+
+        closed = asyncio.run(tls_tools.tls_probe_async("localhost", 1, addresses=["127.0.0.1"]))
+        assert closed["error"] and "verified" not in closed
+        print(f"✅ Connection failures are reported as errors: {closed['error'][:60]}")
+
+def test_peer_chain_der():
+    """Test that the presented chain is read from the TLS object"""
+
+    print("\n🧪 Testing Peer Chain Extraction")
+    print("=" * 50)
+
+    class ModernSocket:
+        def get_unverified_chain(self):
+            return [b"leaf", b"intermediate"]
+
+    class NoChainSocket:
+        pass
+
+    assert tls_tools._peer_chain_der(ModernSocket()) == [b"leaf", b"intermediate"]
+    assert tls_tools._peer_chain_der(NoChainSocket()) == []
+    print("✅ Chain read where the runtime exposes it, empty otherwise")
+
+if __name__ == "__main__":
+    test_tls_probe()
+    test_peer_chain_der()